@@ -8,17 +8,23 @@ from functools import update_wrapper
 
 from django import forms
 from django.conf.urls import url
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
 from django.contrib.admin.views.autocomplete import AutocompleteJsonView
 from django.contrib.admin.widgets import AutocompleteSelect
 from django.contrib.auth.decorators import permission_required
 from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.http import Http404, JsonResponse
 from django.urls import path, reverse
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
+from django.utils.timezone import now
+from people.models import Person
 
 from . import conf
+from .choices import STATUS_CHOICES
+from .flags import reconcile_graduate_student_flags
 from .forms import NoUrlFileWidget
 from .mixins import ClassBasedViewsAdminMixin
 from .models import (
@@ -29,7 +35,15 @@ from .models import (
     MilestoneType,
     Paperwork,
 )
-from .views import CurrentTotalFundingReport, FundingReportAdminView, sendfile
+from .views import (
+    CohortImportAdminView,
+    CurrentTotalFundingReport,
+    FundingChecksAdminView,
+    FundingImportAdminView,
+    FundingReportAdminView,
+    FundingTimeSeriesAdminView,
+    sendfile,
+)
 
 #######################################################################
 
@@ -91,6 +105,44 @@ class GraduationDateFilter(admin.SimpleListFilter):
 #######################################################################
 
 
+class FundingTotalFilter(admin.SimpleListFilter):
+
+    title = "total funding"
+    parameter_name = "funding-total"
+
+    # (value, title, lower bound, upper bound)
+    RANGES = [
+        ("none", "None", None, 0),
+        ("under-10k", "Under $10,000", 0, 10000),
+        ("10k-50k", "$10,000 to $50,000", 10000, 50000),
+        ("over-50k", "Over $50,000", 50000, None),
+    ]
+
+    def lookups(self, request, modelAdmin):
+        """
+        Returns a list of tuples (coded-value, title).
+        """
+        return [(value, title) for value, title, low, high in self.RANGES]
+
+    def queryset(self, request, queryset):
+        """
+        Apply the filter to the existing queryset (on the denormalized
+        ``funding_total``).
+        """
+        for value, title, low, high in self.RANGES:
+            if self.value() == value:
+                if low is None:
+                    return queryset.filter(funding_total__lte=high)
+                queryset = queryset.filter(funding_total__gt=low)
+                if high is not None:
+                    queryset = queryset.filter(funding_total__lte=high)
+                return queryset
+        return None
+
+
+#######################################################################
+
+
 class FundingGradStudentFilter(admin.SimpleListFilter):
 
     title = "graduate student"
@@ -236,7 +288,35 @@ class PaperworkInline(admin.TabularInline):
 #######################################################################
 
 
-class GraduateStudentAdmin(admin.ModelAdmin):
+class GraduateStudentActionForm(ActionForm):
+    """
+    The extra inputs for the bulk graduate student actions.
+    """
+
+    status = forms.ChoiceField(
+        choices=[("", "---------")] + list(STATUS_CHOICES), required=False
+    )
+    advisor = forms.ModelChoiceField(
+        queryset=Person.objects.filter(
+            active=True, flags__slug__in=conf.get("advisor_flags")
+        ).distinct(),
+        required=False,
+    )
+
+
+#######################################################################
+
+
+class GraduateStudentAdmin(ClassBasedViewsAdminMixin, admin.ModelAdmin):
+    action_form = GraduateStudentActionForm
+    actions = [
+        "mark_graduated",
+        "confirm_graduation_dates",
+        "set_status",
+        "add_advisor",
+        "remove_advisor",
+        "deactivate",
+    ]
     autocomplete_fields = ["person"]  #'advisor', ]
     # consider using django-select2 for restricted choices...
     # N.B.: Django 2.0 autocomplete fields do not respect limit_choices_to.
@@ -271,6 +351,7 @@ class GraduateStudentAdmin(admin.ModelAdmin):
                 "fields": (
                     ("total_funding", "earliest_funding", "most_recent_funding"),
                     "current_funding",
+                    "funding_by_source",
                 )
             },
         ),
@@ -285,6 +366,7 @@ class GraduateStudentAdmin(admin.ModelAdmin):
         "status",
         "graduation_date",
         "_confirmed_list_display",
+        "funding_total",
     ]
     list_filter = [
         "status",
@@ -292,6 +374,7 @@ class GraduateStudentAdmin(admin.ModelAdmin):
         "start_date",
         GraduationDateFilter,
         "graduation_date_confirmed",
+        FundingTotalFilter,
         "advisor",
         "active",
         "created",
@@ -303,6 +386,7 @@ class GraduateStudentAdmin(admin.ModelAdmin):
         "earliest_funding",
         "most_recent_funding",
         "current_funding",
+        "funding_by_source",
     )
     search_fields = ["person__cn", "thesis_title"]
     ordering = ["person"]
@@ -314,6 +398,31 @@ class GraduateStudentAdmin(admin.ModelAdmin):
     _confirmed_list_display.admin_order_field = "graduation_date_confirmed"
     _confirmed_list_display.boolean = True
 
+    def funding_by_source(self, obj):
+        """
+        The per-source breakdown of the funding summary.
+        (All of the funding summary fields share one query.)
+        """
+        sources = obj.funding_summary().sources
+        if not sources:
+            return self.get_empty_value_display()
+        rows = format_html_join(
+            "",
+            "<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{} &ndash; {}</td></tr>",
+            (
+                (name, s.count, s.total, s.current, s.earliest, s.most_recent)
+                for name, s in sources
+            ),
+        )
+        return format_html(
+            "<table><thead><tr><th>Source</th><th>Records</th><th>Total</th>"
+            "<th>As of today</th><th>Dates</th></tr></thead>"
+            "<tbody>{}</tbody></table>",
+            rows,
+        )
+
+    funding_by_source.short_description = "By source"
+
     def get_readonly_fields(self, request, obj=None):
         """
         Dynamic readonly fields
@@ -342,12 +451,122 @@ class GraduateStudentAdmin(admin.ModelAdmin):
             actions.pop("delete_selected")
         return actions
 
+    # Bulk actions: each is a constant number of queries, no matter how
+    # many students are selected.  Person flags are reconciled (see
+    # ``flags``) for the whole selection at once.
+
+    def _action_pk_list(self, request, queryset):
+        """
+        The selected students that this user can change.
+        (Only superusers can change graduated or completed students.)
+        The selection is fixed first, since the updates can change
+        which students the (filtered) queryset matches.
+        """
+        if not request.user.is_superuser:
+            queryset = queryset.exclude(status__in=["G", "C"])
+        return list(queryset.values_list("pk", flat=True))
+
+    def _update(self, request, queryset, message, message_values=None, **values):
+        """
+        Update the selected students; ``message`` is formatted with the
+        ``count`` and the ``message_values``.
+        """
+        selected = GraduateStudent.objects.filter(
+            pk__in=self._action_pk_list(request, queryset)
+        )
+        count = selected.update(modified=now(), **values)
+        if "status" in values:
+            reconcile_graduate_student_flags(selected)
+        self.message_user(
+            request, message.format(count=count, **(message_values or {}))
+        )
+
+    def mark_graduated(self, request, queryset):
+        self._update(
+            request, queryset, "{count} student(s) marked graduated.", status="G"
+        )
+
+    mark_graduated.short_description = "Mark selected students as graduated"
+    mark_graduated.allowed_permissions = ("change",)
+
+    def confirm_graduation_dates(self, request, queryset):
+        self._update(
+            request,
+            queryset.exclude(graduation_date=None),
+            "{count} graduation date(s) confirmed.",
+            graduation_date_confirmed=True,
+        )
+
+    confirm_graduation_dates.short_description = "Confirm graduation dates"
+    confirm_graduation_dates.allowed_permissions = ("change",)
+
+    def set_status(self, request, queryset):
+        status = request.POST.get("status")
+        if status not in dict(STATUS_CHOICES):
+            self.message_user(request, "Choose a status.", level=messages.WARNING)
+            return
+        self._update(
+            request,
+            queryset,
+            "{count} student(s) set to {label}.",
+            message_values={"label": dict(STATUS_CHOICES)[status]},
+            status=status,
+        )
+
+    set_status.short_description = "Set the status of selected students"
+    set_status.allowed_permissions = ("change",)
+
+    def _get_advisor(self, request):
+        field = self.action_form.base_fields["advisor"]
+        try:
+            advisor = field.clean(request.POST.get("advisor"))
+        except ValidationError:
+            advisor = None
+        if advisor is None:
+            self.message_user(request, "Choose an advisor.", level=messages.WARNING)
+        return advisor
+
+    def add_advisor(self, request, queryset):
+        advisor = self._get_advisor(request)
+        if advisor is None:
+            return
+        pk_list = self._action_pk_list(request, queryset)
+        # one insert for the missing links:
+        advisor.supervisor.add(*pk_list)
+        self.message_user(
+            request,
+            "{} added as an advisor of {} student(s).".format(advisor, len(pk_list)),
+        )
+
+    add_advisor.short_description = "Add an advisor to selected students"
+    add_advisor.allowed_permissions = ("change",)
+
+    def remove_advisor(self, request, queryset):
+        advisor = self._get_advisor(request)
+        if advisor is None:
+            return
+        pk_list = self._action_pk_list(request, queryset)
+        advisor.supervisor.remove(*pk_list)
+        self.message_user(
+            request,
+            "{} removed as an advisor of {} student(s).".format(advisor, len(pk_list)),
+        )
+
+    remove_advisor.short_description = "Remove an advisor from selected students"
+    remove_advisor.allowed_permissions = ("change",)
+
+    def deactivate(self, request, queryset):
+        self._update(request, queryset, "{count} student(s) deactivated.", active=False)
+
+    deactivate.short_description = "Deactivate selected students"
+    deactivate.allowed_permissions = ("change",)
+
     def autocomplete_label_view(self, request):
         return LabelAutocompleteJsonView.as_view(model_admin=self)(request)
 
     def get_urls(self):
         """
-        Add in the paperwork view and download urls
+        Add in the paperwork view and download urls, and the cohort import
         """
         urls = super(GraduateStudentAdmin, self).get_urls()
 
@@ -383,6 +602,21 @@ class GraduateStudentAdmin(admin.ModelAdmin):
                 name="graduatestudents_paperwork_download",
                 kwargs={"download": True},
             ),
+            url(
+                r"^import/$",
+                self.admin_site.admin_view(
+                    permission_required("graduate_students.add_graduatestudent")(
+                        self.cb_changeform_view
+                    )
+                ),
+                kwargs={
+                    "view_class": CohortImportAdminView,
+                    "title": "Import new graduate students",
+                    "add": False,
+                    "original": "Import new graduate students",
+                },
+                name="graduatestudent_cohort_import",
+            ),
         ] + urls
         return urls
 
@@ -448,6 +682,51 @@ class FundingAdmin(ClassBasedViewsAdminMixin, admin.ModelAdmin):
                 },
                 name="graduatestudent_funding_report",
             ),
+            url(
+                r"^timeseries/$",
+                self.admin_site.admin_view(
+                    permission_required("graduate_students.change_funding")(
+                        self.cb_changeform_view
+                    )
+                ),
+                kwargs={
+                    "view_class": FundingTimeSeriesAdminView,
+                    "title": "Funding over time",
+                    "add": False,
+                    "original": "Funding over time",
+                },
+                name="graduatestudent_funding_timeseries",
+            ),
+            url(
+                r"^checks/$",
+                self.admin_site.admin_view(
+                    permission_required("graduate_students.change_funding")(
+                        self.cb_changeform_view
+                    )
+                ),
+                kwargs={
+                    "view_class": FundingChecksAdminView,
+                    "title": "Funding checks",
+                    "add": False,
+                    "original": "Funding checks",
+                },
+                name="graduatestudent_funding_checks",
+            ),
+            url(
+                r"^import/$",
+                self.admin_site.admin_view(
+                    permission_required("graduate_students.add_funding")(
+                        self.cb_changeform_view
+                    )
+                ),
+                kwargs={
+                    "view_class": FundingImportAdminView,
+                    "title": "Import funding",
+                    "add": False,
+                    "original": "Import funding",
+                },
+                name="graduatestudent_funding_import",
+            ),
             url(
                 r"^current-totals/$",
                 self.admin_site.admin_view(
@@ -0,0 +1,122 @@
+"""
+HTTP conditional responses, and optional server side page caching,
+for the public graduate student pages.
+
+A page's *version* is computed from one cheap aggregate per queryset
+the page depends on: the ``Max()`` of the modification times, and the
+number of rows and (optionally) of related rows, so that deletions
+change the version too.
+Changes to advisors bump the student's ``modified`` time (see
+``signals.graduatestudent_advisor_m2m_changed``).
+"""
+from __future__ import print_function, unicode_literals
+
+import hashlib
+from functools import wraps
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+
+from . import conf
+
+##########################################################################
+
+
+def get_version(dependencies):
+    """
+    ``dependencies`` is a list of (queryset, [datetime field names]) pairs,
+    or (queryset, [datetime field names], [related names to count]).
+    Returns (last_modified, version), where last_modified may be None.
+    """
+    last_modified = None
+    parts = []
+    for dependency in dependencies:
+        queryset, field_list = dependency[:2]
+        count_list = dependency[2] if len(dependency) > 2 else []
+        aggregates = {"count": Count("pk", distinct=True)}
+        for i, field in enumerate(count_list):
+            aggregates["count_{}".format(i)] = Count(field, distinct=True)
+        for i, field in enumerate(field_list):
+            aggregates["modified_{}".format(i)] = Max(field)
+        result = queryset.order_by().aggregate(**aggregates)
+        for key, value in sorted(result.items()):
+            parts.append("{}={}".format(key, value))
+            if not key.startswith("count") and value is not None:
+                if last_modified is None or value > last_modified:
+                    last_modified = value
+    version = hashlib.md5(";".join(parts).encode("utf-8")).hexdigest()
+    return last_modified, version
+
+
+##########################################################################
+
+
+def versioned_page(dependencies_func, cache_name=None):
+    """
+    View decorator: ETag and Last-Modified support (i.e., 304 responses)
+    for views whose content only depends on the querysets returned by
+    ``dependencies_func(request, *args, **kwargs)``.
+
+    When ``cache_name`` has a timeout in the ``page_cache_timeouts``
+    setting, rendered pages for anonymous users are also cached on the
+    server, keyed on the version.
+    """
+
+    def _get_version(request, *args, **kwargs):
+        if not hasattr(request, "_graduate_students_version"):
+            last_modified, version = get_version(
+                dependencies_func(request, *args, **kwargs)
+            )
+            # Pages show different links to different users:
+            user = getattr(request, "user", None)
+            if user is not None and user.is_authenticated:
+                etag = "{}-{}".format(version, user.pk)
+            else:
+                etag = version
+            request._graduate_students_version = (last_modified, version, etag)
+        return request._graduate_students_version
+
+    def etag_func(request, *args, **kwargs):
+        return _get_version(request, *args, **kwargs)[2]
+
+    def last_modified_func(request, *args, **kwargs):
+        return _get_version(request, *args, **kwargs)[0]
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def _cached_view(request, *args, **kwargs):
+            timeout = conf.get("page_cache_timeouts").get(cache_name)
+            user = getattr(request, "user", None)
+            if (
+                not timeout
+                or request.method != "GET"
+                or (user is not None and user.is_authenticated)
+            ):
+                return view_func(request, *args, **kwargs)
+            version = _get_version(request, *args, **kwargs)[1]
+            path = hashlib.md5(request.get_full_path().encode("utf-8")).hexdigest()
+            key = "graduate_students:page:{}:{}:{}".format(cache_name, path, version)
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+            response = view_func(request, *args, **kwargs)
+            if hasattr(response, "render") and callable(response.render):
+                response.render()
+            if response.status_code == 200:
+                cache.set(key, (response.content, response["Content-Type"]), timeout)
+            return response
+
+        return vary_on_cookie(
+            condition(etag_func=etag_func, last_modified_func=last_modified_func)(
+                _cached_view
+            )
+        )
+
+    return decorator
+
+
+##########################################################################
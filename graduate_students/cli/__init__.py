@@ -1,5 +1,7 @@
 from __future__ import print_function, unicode_literals
 
+import sys
+
 from django.conf import settings
 from django.utils.encoding import force_text
 
@@ -87,3 +89,30 @@ def print_object(obj):
 
 
 #######################################################################
+
+
+def import_spreadsheet(importer_class, options, verbose_name_plural):
+    """
+    Run an import (see ``importing``) of the ``filename`` option's file,
+    for the import commands.  Row errors are printed to stderr.
+    """
+    from ..importing import read_rows
+
+    verbosity = int(options["verbosity"])
+    filename = options["filename"]
+    with open(filename, "rb") as fileobj:
+        rows = read_rows(fileobj, filename)
+    object_list, errors = importer_class().run(rows, dry_run=options["dry_run"])
+    for error in errors:
+        print("Row {}: {}".format(error.row, error.message), file=sys.stderr)
+    if errors:
+        print("Nothing was imported", file=sys.stderr)
+        sys.exit(1)
+    if verbosity > 0:
+        if options["dry_run"]:
+            print("{} rows checked; no errors".format(len(object_list)))
+        else:
+            print("Imported {} {}".format(len(object_list), verbose_name_plural))
+
+
+#######################################################################
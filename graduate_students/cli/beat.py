@@ -1,7 +1,9 @@
 from __future__ import print_function, unicode_literals
 
+from django.db import transaction
 from django.utils.timezone import now
 
+from ..flags import flag_current_graduate_students
 from ..models import GraduateStudent
 
 #######################################################################
@@ -22,28 +24,28 @@ def main(options, args):
     gradstudent_list = GraduateStudent.objects.active().filter(
         graduation_date__lte=now(), graduation_date_confirmed=True
     )
-    for gradstudent in gradstudent_list:
-        if verbosity > 2:
-            print("Considering for graduation", gradstudent)
-        gradstudent.status = "G"  # graduated.
-        gradstudent.clean()  # person flag changes.
-        gradstudent.save()
-        if verbosity > 0:
-            print(
-                "{0} ({1}) {2}".format(
-                    gradstudent,
-                    gradstudent.get_program_display(),
-                    gradstudent.get_status_display(),
+    # (person flag changes are made in one batch, on commit)
+    with transaction.atomic():
+        for gradstudent in gradstudent_list:
+            if verbosity > 2:
+                print("Considering for graduation", gradstudent)
+            gradstudent.status = "G"  # graduated.
+            gradstudent.save()
+            if verbosity > 0:
+                print(
+                    "{0} ({1}) {2}".format(
+                        gradstudent,
+                        gradstudent.get_program_display(),
+                        gradstudent.get_status_display(),
+                    )
                 )
-            )
+    for gradstudent in flag_current_graduate_students():
+        if verbosity > 0:
+            print(gradstudent, "added missing gradstudent flag!")
     gradstudent_list = GraduateStudent.objects.active(status="S")
     for gradstudent in gradstudent_list:
         if verbosity > 2:
             print("Cross-checking current student", gradstudent)
-        if "gradstudent" not in gradstudent.person.flags.active().slugs():
-            gradstudent.person.add_flag_by_name("gradstudent")
-            if verbosity > 0:
-                print(gradstudent, "added missing gradstudent flag!")
         if not gradstudent.person.username:
             print(
                 gradstudent,
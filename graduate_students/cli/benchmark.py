@@ -0,0 +1,301 @@
+"""
+Benchmark the funding reports and pages against a synthetic department.
+
+The department is generated in a throwaway (test) database, which is
+destroyed afterwards; your data is never touched.  The results (median
+and 95th percentile wall times, query counts and peak memory) are
+written as JSON, so that releases can be compared.
+"""
+from __future__ import print_function, unicode_literals
+
+import json
+import math
+import platform
+import sys
+import time
+
+import django
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.urls import NoReverseMatch, reverse
+from spreadsheet import sheetWriter
+
+from .. import conf
+from ..forms import FundingReportForm
+from ..models import Funding, FundingSource, GraduateStudent
+from ..proration import get_engine
+from ..utils import (
+    FundingDataset,
+    fiscal_year_range,
+    funding_report_table,
+    funding_table,
+)
+from ..utils.synthetic import make_department
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+#######################################################################
+
+# The synthetic department starts in this year, and spans this many years:
+START_YEAR = 2010
+YEARS = 8
+
+timer = getattr(time, "perf_counter", time.time)
+
+HELP_TEXT = __doc__.strip()
+USE_ARGPARSE = True
+DJANGO_COMMAND = "main"
+OPTION_LIST = (
+    (["--students"], dict(type=int, default=200, help="Number of students [200]")),
+    (["--sources"], dict(type=int, default=8, help="Number of funding sources [8]")),
+    (["--funding"], dict(type=int, default=5, help="Funding records per student [5]")),
+    (["--milestones"], dict(type=int, default=3, help="Milestones per student [3]")),
+    (["--advisors"], dict(type=int, default=20, help="Number of advisors [20]")),
+    (["--seed"], dict(type=int, default=0, help="Random seed [0]")),
+    (["--repeat"], dict(type=int, default=5, help="Timed runs of each operation [5]")),
+    (
+        ["--fiscal-year"],
+        dict(
+            type=int,
+            default=START_YEAR + YEARS // 2,
+            help="The fiscal year to report on [{}]".format(START_YEAR + YEARS // 2),
+        ),
+    ),
+    (
+        ["-f", "--format"],
+        dict(
+            default=",".join(f for f, desc in conf.get("spreadsheet_formats")),
+            help="A comma separated list of spreadsheet formats to time",
+        ),
+    ),
+    (
+        ["--engine"],
+        dict(
+            choices=["auto", "python", "numpy"],
+            default=None,
+            help="The proration engine [the funding:engine setting]",
+        ),
+    ),
+    (["--no-views"], dict(action="store_true", help="Do not time the pages")),
+    (
+        ["-o", "--output"],
+        dict(default=None, help="Write the JSON results to this file [stdout]"),
+    ),
+)
+
+#######################################################################
+
+
+def percentile(values, percent):
+    """
+    The nearest-rank percentile of the values.
+    """
+    values = sorted(values)
+    rank = int(math.ceil(percent / 100.0 * len(values)))
+    return values[max(rank, 1) - 1]
+
+
+def measure(func, repeat):
+    """
+    Time ``repeat`` runs of ``func()``; then count the queries and
+    peak memory of one more (untimed) run.
+    """
+    times = []
+    for i in range(repeat):
+        start = timer()
+        func()
+        times.append(timer() - start)
+    result = {
+        "runs": repeat,
+        "min": min(times),
+        "median": percentile(times, 50),
+        "p95": percentile(times, 95),
+        "peak_memory": None,
+    }
+    if tracemalloc is not None:
+        tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        if tracemalloc is not None:
+            result["peak_memory"] = tracemalloc.get_traced_memory()[1]
+    finally:
+        if tracemalloc is not None:
+            tracemalloc.stop()
+    result["queries"] = len(queries)
+    return result
+
+
+#######################################################################
+
+
+def get_operations(options, department):
+    """
+    Return a list of (name, callable) pairs to benchmark.
+    """
+    date_range = fiscal_year_range(options["fiscal_year"])
+    engine = get_engine(options["engine"])
+    source_list = list(FundingSource.objects.active())
+    student_qs = GraduateStudent.objects.in_range(date_range, grad_date_adjustment=60)
+    student_list = list(student_qs)
+    formats = [f.strip() for f in options["format"].split(",") if f.strip()]
+
+    def _funding_report_table():
+        # (what the report form and the funding_report command run)
+        dataset = FundingDataset([date_range], engine=engine)
+        return funding_report_table(date_range[0], date_range[1], dataset=dataset)
+
+    def _funding_report_form():
+        form = FundingReportForm(
+            data={
+                "start_date": date_range[0],
+                "end_date": date_range[1],
+                "format_": formats[0],
+                "extra_formats": formats[1:],
+            }
+        )
+        form.is_valid()
+        return form.get_result_data()
+
+    table = _funding_report_table()
+    operations = [
+        ("in_range:graduatestudent", lambda: list(student_qs.all())),
+        ("in_range:funding", lambda: list(Funding.objects.in_range(date_range))),
+        (
+            "funding_table",
+            lambda: funding_table(date_range, student_list, source_list),
+        ),
+        ("funding_report_table", _funding_report_table),
+    ]
+    if formats:
+        operations.append(("funding_report_form", _funding_report_form))
+    for format_ in formats:
+        operations.append(
+            (
+                "sheetWriter:" + format_,
+                lambda format_=format_: sheetWriter(table, format_),
+            )
+        )
+    if not options["no_views"]:
+        operations += get_view_operations(department)
+    return operations
+
+
+def get_view_operations(department):
+    """
+    The pages, fetched through the test client (as a superuser).
+    Pages which are not in the site's urls are skipped.
+    """
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+
+    User = get_user_model()
+    user = User.objects.create_superuser("benchmark", "benchmark@example.com", "x")
+    client = Client()
+    client.force_login(user)
+    student = department.students[0]
+    funding = Funding.objects.filter(graduate_student=student).first()
+    pages = [
+        ("gradstudent-list", []),
+        ("gradstudent-alumni-list", []),
+        ("gradstudent-advisor-list", []),
+        ("gradstudent-detail", [student.pk]),
+        ("admin:graduate_students_graduatestudent_changelist", []),
+        ("admin:graduate_students_graduatestudent_change", [student.pk]),
+        ("admin:graduate_students_funding_changelist", []),
+        ("admin:graduatestudent_funding_current_total", []),
+    ]
+    if funding is not None:
+        pages.append(("admin:graduate_students_funding_change", [funding.pk]))
+    operations = []
+    for name, args in pages:
+        try:
+            url = reverse(name, args=args)
+        except NoReverseMatch:
+            continue
+        operations.append(("view:" + name, lambda url=url: client.get(url)))
+    return operations
+
+
+#######################################################################
+
+
+def run(options, verbosity):
+    """
+    Generate the department and run the benchmarks.
+    """
+    start = timer()
+    department = make_department(
+        students=options["students"],
+        sources=options["sources"],
+        funding_per_student=options["funding"],
+        milestones_per_student=options["milestones"],
+        advisors=options["advisors"],
+        seed=options["seed"],
+        start_year=START_YEAR,
+        years=YEARS,
+    )
+    if verbosity > 1:
+        print(
+            "Generated the synthetic department in {:.2f}s".format(timer() - start),
+            file=sys.stderr,
+        )
+    results = {}
+    for name, func in get_operations(options, department):
+        if verbosity > 1:
+            print("Timing", name, file=sys.stderr)
+        results[name] = measure(func, options["repeat"])
+    return results
+
+
+def main(options, args):
+    verbosity = int(options["verbosity"])
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(
+        verbosity=max(verbosity - 1, 0), autoclobber=True, serialize=False
+    )
+    try:
+        results = run(options, verbosity)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=max(verbosity - 1, 0))
+        teardown_test_environment()
+
+    report = {
+        "parameters": dict(
+            (key, options[key])
+            for key in [
+                "students",
+                "sources",
+                "funding",
+                "milestones",
+                "advisors",
+                "seed",
+                "repeat",
+                "fiscal_year",
+            ]
+        ),
+        "environment": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "engine": get_engine(options["engine"]).name,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if options["output"]:
+        with open(options["output"], "w") as fp:
+            fp.write(output + "\n")
+    else:
+        print(output)
+
+
+#######################################################################
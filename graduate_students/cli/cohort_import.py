@@ -0,0 +1,36 @@
+"""
+Onboard a cohort of new graduate students from a CSV or XLSX file.
+
+The columns are: name and start_date, and optionally person (the slug or
+id of an existing person), given_name, sn, program, status and advisors
+(names, slugs or ids, separated by semicolons).  People are created as
+needed, and the person flags are updated once for the whole cohort.
+When any row has an error, nothing is imported.
+"""
+from __future__ import print_function, unicode_literals
+
+from ..importing import CohortImporter
+from . import import_spreadsheet
+
+#######################################################################
+
+HELP_TEXT = "Onboard new graduate students from a CSV or XLSX file"
+USE_ARGPARSE = True
+DJANGO_COMMAND = "main"
+OPTION_LIST = (
+    (["filename"], {"help": "The CSV or XLSX file to import"}),
+    (
+        ["--dry-run"],
+        dict(action="store_true", help="Only check the file; do not import anything"),
+    ),
+)
+ARGS_USAGE = "filename"
+
+#######################################################################
+
+
+def main(options, args):
+    import_spreadsheet(CohortImporter, options, "graduate students")
+
+
+#######################################################################
@@ -0,0 +1,60 @@
+"""
+Check the funding of the whole department: gaps between a student's
+funding periods, overlapping funding from the same source, and one-time
+payments outside of a student's program.
+
+Exits with status 1 when there are problems.
+"""
+from __future__ import print_function, unicode_literals
+
+import csv
+import sys
+
+from .. import funding_checks
+from ..models import GraduateStudent
+
+#######################################################################
+
+HELP_TEXT = "Check for gaps, overlaps and stray payments in graduate student funding"
+USE_ARGPARSE = True
+DJANGO_COMMAND = "main"
+OPTION_LIST = (
+    (
+        ["--gap-days"],
+        dict(
+            type=int,
+            default=None,
+            help="Report gaps longer than this many days "
+            "(default: the funding:gap_days setting)",
+        ),
+    ),
+    (
+        ["--all"],
+        dict(
+            action="store_true",
+            help="Check every active student, not only current students",
+        ),
+    ),
+    (["--csv"], dict(action="store_true", help="Write the problems as CSV")),
+)
+
+#######################################################################
+
+
+def main(options, args):
+    verbosity = int(options["verbosity"])
+    students = GraduateStudent.objects.active(status=None if options["all"] else "S")
+    problems = funding_checks.check_funding(students, gap_days=options["gap_days"])
+    table = funding_checks.problem_table(problems)
+    if options["csv"]:
+        csv.writer(sys.stdout).writerows(table)
+    else:
+        for row in table[1:]:
+            print("\t".join("{}".format(cell) for cell in row))
+    if verbosity > 0:
+        print("{} problems found".format(len(problems)), file=sys.stderr)
+    if problems:
+        sys.exit(1)
+
+
+#######################################################################
@@ -0,0 +1,35 @@
+"""
+Import funding records from a CSV or XLSX file.
+
+The columns are: student (the person's name, or the graduate student id),
+source (the funding source name, or id), amount, start_date, and
+optionally end_date and comments.  When any row has an error, nothing is
+imported.
+"""
+from __future__ import print_function, unicode_literals
+
+from ..importing import FundingImporter
+from . import import_spreadsheet
+
+#######################################################################
+
+HELP_TEXT = "Import funding records from a CSV or XLSX file"
+USE_ARGPARSE = True
+DJANGO_COMMAND = "main"
+OPTION_LIST = (
+    (["filename"], {"help": "The CSV or XLSX file to import"}),
+    (
+        ["--dry-run"],
+        dict(action="store_true", help="Only check the file; do not import anything"),
+    ),
+)
+ARGS_USAGE = "filename"
+
+#######################################################################
+
+
+def main(options, args):
+    import_spreadsheet(FundingImporter, options, "funding records")
+
+
+#######################################################################
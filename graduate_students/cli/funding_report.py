@@ -1,90 +1,166 @@
-#!/usr/bin/env python
+"""
+Generate funding reports for graduate students.
+"""
 from __future__ import print_function, unicode_literals
 
 import datetime
 import os
 import sys
-from pprint import pprint
-
-from graduate_students.utils import make_funding_spreadsheet
-from spreadsheet import SUPPORTED_FORMATS
-
-"""
-generate a funding report for graduate students
-"""
-
-##############################################################################
-
-
-def setup_django(settings_file):
-    def real_path_of_file(filename):
-        if filename.endswith(".pyc"):
-            fn = os.path.abspath(filename[:-1])
-        else:
-            fn = os.path.abspath(filename)
-
-        while os.path.islink(fn):
-            fn = os.path.abspath(os.readlink(fn))
-
-        return os.path.dirname(fn)
-
-    sys.path.insert(0, real_path_of_file(settings_file))
-    os.environ["DJANGO_SETTINGS_MODULE"] = os.path.splitext(
-        os.path.basename(settings_file)
-    )[0]
-
-
-setup_django("../../gradstudents_demo_site/settings.py")
 
-##############################################################################
-# DJANGO IMPORTS:
+from .. import conf
+from ..proration import get_engine
+from ..utils import (
+    FundingDataset,
+    fiscal_year_range,
+    funding_report_table,
+    make_bundle,
+    render_spreadsheets,
+    spreadsheet_executor,
+)
 
+#######################################################################
 
-def main(start_string, end_string, format_):
-    start_date = datetime.datetime.strptime(start_string, "%Y-%m-%d").date()
-    end_date = datetime.datetime.strptime(end_string, "%Y-%m-%d").date()
 
-    return make_funding_spreadsheet(start_date, end_date, format_)
-
-
-if __name__ == "__main__":
-    usage = """usage: %prog [options] start_date end_date
-    
-    start_date and end_date are in the format YYYY-MM-DD
+def date_range_type(value):
     """
-    parser = optparse.OptionParser(usage=usage)
-
-    parser.add_option(
-        "-f",
-        "--format",
-        dest="format",
-        help="Specifiy the output format.  One of: %s." % ", ".join(SUPPORTED_FORMATS),
-    )
-
-    parser.add_option(
-        "-o",
-        "--outfile",
-        dest="outfile",
-        help="Specifiy the output filename.  If this is not given, the spreadsheet will be dumped to stdout.",
-    )
-
-    (options, args) = parser.parse_args()
-
-    if len(args) != 2:
-        print("You must specify a start_date and end_date.")
-        sys.exit(1)
-
-    start_date, end_date = args
-
-    format_ = options.format
-    if not format_ and options.outfile:
-        format_ = os.path.splitext(options.outfile)[-1].lstrip(".")
-    if not format_:
-        format_ = "csv"
-
-    data = main(start_date, end_date, format_)
+    Parse a ``YYYY-MM-DD:YYYY-MM-DD`` date range.
+    """
+    try:
+        start_string, end_string = value.split(":")
+        start_date = datetime.datetime.strptime(start_string, "%Y-%m-%d").date()
+        end_date = datetime.datetime.strptime(end_string, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError("Not a valid date range: {!r}".format(value))
+    return [start_date, end_date]
 
-    fp = open(options.outfile, "wb") if options.outfile else sys.stdout
-    fp.write(data)
 
-#
+def year_range_type(value):
+    """
+    Parse a ``FIRST:LAST`` (inclusive) range of years.
+    """
+    if ":" not in value:
+        value = value + ":" + value
+    first, last = [int(y) for y in value.split(":")]
+    return list(range(first, last + 1))
+
+
+#######################################################################
+
+HELP_TEXT = __doc__.strip()
+USE_ARGPARSE = True
+DJANGO_COMMAND = "main"
+OPTION_LIST = (
+    (
+        ["-r", "--range"],
+        dict(
+            action="append",
+            dest="date_ranges",
+            type=date_range_type,
+            default=[],
+            metavar="START:END",
+            help="A report date range, e.g., 2017-09-01:2018-08-31.  "
+            + "This option can be given more than once.",
+        ),
+    ),
+    (
+        ["--fiscal-years"],
+        dict(
+            type=year_range_type,
+            default=[],
+            metavar="FIRST:LAST",
+            help="Generate a report for each fiscal year, e.g., 2015:2026.  "
+            + "Fiscal years are named by the year they start in.",
+        ),
+    ),
+    (
+        ["-f", "--format"],
+        dict(
+            default=conf.get("default_spreadsheet_format"),
+            help="A comma separated list of output formats, e.g., csv,xlsx,ods",
+        ),
+    ),
+    (
+        ["-o", "--output-dir"],
+        dict(default=".", help="The directory to write the reports into"),
+    ),
+    (
+        ["--bundle"],
+        dict(
+            action="store_true",
+            help="Write a single zip file (of every format) for each date range.",
+        ),
+    ),
+    (
+        ["--engine"],
+        dict(
+            choices=["auto", "python", "numpy"],
+            default=None,
+            help="The proration engine [the funding:engine setting]",
+        ),
+    ),
+    (
+        ["--grad-date-adjustment"],
+        dict(
+            type=int,
+            default=60,
+            help="Include graduates up to this many days after the range [60]",
+        ),
+    ),
+)
+
+#######################################################################
+
+
+def write_file(output_dir, filename, stream, verbosity):
+    """
+    Write the data stream to the output directory.
+    """
+    path = os.path.join(output_dir, filename)
+    if not isinstance(stream, bytes):
+        stream = stream.encode("utf-8")
+    with open(path, "wb") as fp:
+        fp.write(stream)
+    if verbosity > 0:
+        print(path)
+
+
+#######################################################################
+
+
+def main(options, args):
+    verbosity = int(options["verbosity"])
+    output_dir = options["output_dir"]
+    formats = [f.strip() for f in options["format"].split(",") if f.strip()]
+    date_ranges = list(options["date_ranges"])
+    date_ranges += [fiscal_year_range(year) for year in options["fiscal_years"]]
+    if not date_ranges:
+        print("Specify at least one --range or --fiscal-years", file=sys.stderr)
+        return
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    # All of the ranges share one preloaded set of funding, and one
+    # process pool for the spreadsheets:
+    dataset = FundingDataset(date_ranges, engine=get_engine(options["engine"]))
+    executor = spreadsheet_executor(len(formats))
+    try:
+        for start_date, end_date in date_ranges:
+            if verbosity > 2:
+                print("Generating report for", start_date, "to", end_date)
+            basename = "funding-report_{}_{}".format(start_date, end_date)
+            table = funding_report_table(
+                start_date, end_date, options["grad_date_adjustment"], dataset=dataset
+            )
+            streams = render_spreadsheets(table, formats, executor=executor)
+            if options["bundle"]:
+                stream = make_bundle(streams, basename)
+                write_file(output_dir, basename + ".zip", stream, verbosity)
+            else:
+                for format_, stream in streams.items():
+                    write_file(output_dir, basename + "." + format_, stream, verbosity)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+#######################################################################
@@ -0,0 +1,54 @@
+"""
+Verify (or rebuild) the denormalized funding totals of graduate students.
+
+The totals are kept up to date when funding is saved or deleted; bulk
+changes (e.g., loading fixtures, or queryset updates) do not update them.
+"""
+from __future__ import print_function, unicode_literals
+
+import sys
+
+from .. import funding_totals
+from ..models import GraduateStudent
+
+#######################################################################
+
+HELP_TEXT = "Verify or rebuild the funding totals of graduate students"
+USE_ARGPARSE = True
+DJANGO_COMMAND = "main"
+OPTION_LIST = (
+    (
+        ["--rebuild"],
+        dict(action="store_true", help="Recompute the totals of every student"),
+    ),
+)
+
+#######################################################################
+
+
+def main(options, args):
+    verbosity = int(options["verbosity"])
+    if options["rebuild"]:
+        count = funding_totals.rebuild(GraduateStudent.objects.all())
+        if verbosity > 0:
+            print("Rebuilt the funding totals of {} students".format(count))
+        return
+
+    errors = funding_totals.verify(GraduateStudent.objects.all())
+    for pk, stored, correct in errors:
+        print(
+            "Graduate student {}: {} should be {}".format(
+                pk,
+                ", ".join("{}={}".format(k, stored[k]) for k in funding_totals.FIELDS),
+                ", ".join("{}={}".format(k, correct[k]) for k in funding_totals.FIELDS),
+            ),
+            file=sys.stderr,
+        )
+    if errors:
+        print("Run with --rebuild to fix these", file=sys.stderr)
+        sys.exit(1)
+    if verbosity > 0:
+        print("The funding totals are correct")
+
+
+#######################################################################
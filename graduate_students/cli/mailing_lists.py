@@ -0,0 +1,85 @@
+"""
+Export the graduate student mailing lists (email aliases).
+
+For a mail server sync that polls: with --version-file, nothing is
+written when the lists have not changed since the version saved in the
+file (this costs one query); otherwise, the lists are written and the
+new version is saved.
+"""
+from __future__ import print_function, unicode_literals
+
+import io
+import os
+from collections import OrderedDict
+
+from ..mailing_lists import FORMATS, get_mailing_lists, get_version
+
+#######################################################################
+
+HELP_TEXT = "Export the graduate student mailing lists"
+USE_ARGPARSE = True
+DJANGO_COMMAND = "main"
+OPTION_LIST = (
+    (
+        ["-f", "--format"],
+        dict(choices=list(FORMATS), default="aliases", help="Output format [aliases]"),
+    ),
+    (
+        ["--alias"],
+        dict(
+            action="append",
+            default=None,
+            help="Only export this alias (may be repeated) [all]",
+        ),
+    ),
+    (
+        ["-o", "--output"],
+        dict(default=None, help="Write the lists to this file [stdout]"),
+    ),
+    (
+        ["--version-file"],
+        dict(
+            default=None,
+            help="Only write the lists when their version differs from the "
+            + "version in this file (which is then updated)",
+        ),
+    ),
+)
+
+#######################################################################
+
+
+def main(options, args):
+    verbosity = int(options["verbosity"])
+    version = get_version()
+    version_file = options["version_file"]
+    if version_file and os.path.exists(version_file):
+        with io.open(version_file, encoding="utf-8") as fp:
+            if fp.read().strip() == version:
+                if verbosity > 1:
+                    print("The mailing lists have not changed")
+                return
+
+    mailing_lists = get_mailing_lists(version)
+    if options["alias"]:
+        unknown = set(options["alias"]) - set(mailing_lists)
+        if unknown:
+            raise SystemExit("Unknown alias(es): " + ", ".join(sorted(unknown)))
+        mailing_lists = OrderedDict(
+            (alias, addresses)
+            for alias, addresses in mailing_lists.items()
+            if alias in options["alias"]
+        )
+    output = FORMATS[options["format"]](mailing_lists)
+    if options["output"]:
+        with io.open(options["output"], "w", encoding="utf-8") as fp:
+            fp.write(output)
+    else:
+        print(output, end="")
+
+    if version_file:
+        with io.open(version_file, "w", encoding="utf-8") as fp:
+            fp.write(version + "\n")
+
+
+#######################################################################
@@ -0,0 +1,36 @@
+"""
+Resynchronize the person flags of all graduate students.
+
+People with a graduated student record get the alumni flag; people
+without a pending or current student record lose the graduate student
+flag; and current students who are missing the graduate student flag
+get it.
+"""
+from __future__ import print_function, unicode_literals
+
+from django.db import transaction
+
+from ..flags import flag_current_graduate_students, reconcile_graduate_student_flags
+from ..models import GraduateStudent
+
+#######################################################################
+
+HELP_TEXT = "Resynchronize the person flags of all graduate students"
+USE_ARGPARSE = True
+DJANGO_COMMAND = "main"
+OPTION_LIST = ()
+
+#######################################################################
+
+
+def main(options, args):
+    verbosity = int(options["verbosity"])
+    with transaction.atomic():
+        reconcile_graduate_student_flags(GraduateStudent.objects.all())
+        flagged = flag_current_graduate_students()
+    if verbosity > 0:
+        for gradstudent in flagged:
+            print(gradstudent, "added missing gradstudent flag!")
+
+
+#######################################################################
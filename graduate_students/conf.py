@@ -39,6 +39,12 @@ DEFAULT = {
         ("xlsx", "Microsoft Excel XML"),  # warning: xlsx has issues with formulas.
         ("ods", "OpenOffice Spreadsheet"),
     ),
+    # The number of worker processes used by the funding_report command to
+    # generate several spreadsheet formats at once.  None means one per CPU;
+    # 1 disables the process pool.  (The admin funding report always
+    # renders its formats serially, in the web server's process.)
+    # (optional)
+    "spreadsheet_workers": None,
     # Extra graduate student fields to include in the funding report
     "spreadsheet_extra_fields": ["get_program_display", "start_date"],
     # Define the default spreadsheet format in the form.
@@ -68,6 +74,45 @@ DEFAULT = {
     # Note that sendfile is disabled when DEBUG == True.
     # (optional; default: False)
     "use_sendfile": False,
+    # The proration engine for multi-range funding computations:
+    # "python", "numpy", or "auto" (numpy, when it is installed).
+    # (optional)
+    "funding:engine": "auto",
+    # The funding checks (see ``funding_checks``) report gaps between a
+    # student's funding periods longer than this many days.
+    # (optional)
+    "funding:gap_days": 30,
+    # The number of alumni per page in the public alumni list,
+    # and whether to group them by graduation year ("year" or None).
+    # (optional)
+    "alumni:paginate_by": 50,
+    "alumni:group_by": None,
+    # Server side caching of the public pages (for anonymous users).
+    # Map url names (e.g., "gradstudent-list", "gradstudent-alumni-list",
+    # "gradstudent-advisor-list", "gradstudent-detail") to a timeout in
+    # seconds.  Pages are keyed on their content version, so a long
+    # timeout is fine.
+    # (optional; default: no page caching)
+    "page_cache_timeouts": {},
+    # Record stage timings and query counts for the funding reports, and
+    # log them (to the "graduate_students.instrumentation" logger).
+    # This is read when the app loads; when it is off, nothing is wrapped.
+    # (optional)
+    "instrumentation": False,
+    # Also send the instrumented stages in a ``Server-Timing`` header.
+    # (optional)
+    "instrumentation:server_timing": False,
+    # Mailing lists (see ``mailing_lists``): the domain of the list
+    # addresses, the LDAP base DN for LDIF output (None: "ou=Aliases" in the
+    # domain's DN), and how long to cache the lists (in seconds; the cache
+    # keys are versioned on the students' (and their people's) modification
+    # times and counts, and on signals, so this only limits staleness after
+    # bulk changes that do neither, e.g., queryset updates of email
+    # addresses that have no modification time).
+    # (optional)
+    "mailing_lists:domain": "stats.umanitoba.ca",
+    "mailing_lists:ldap_base": None,
+    "mailing_lists:cache_timeout": 3600,
     # Experimental features
     "funding:allow-historical": False,
 }
@@ -0,0 +1,177 @@
+"""
+Set based maintenance of person flags for graduate students.
+
+The rules: people with a graduated student record are alumni, and people
+without a pending or current student record do not keep the graduate
+student flag.  These functions apply the rules to any number of people
+with a constant number of queries.  Flags are added and removed through
+the flag's side of the many to many relation, so the ``m2m_changed``
+signals are still sent (once, with the whole set of people).
+
+Saving a graduate student does not change flags right away: the person
+is queued, and the queued people are reconciled in one batch when the
+transaction commits (see ``reconcile_flags_on_commit()``).
+"""
+from __future__ import print_function, unicode_literals
+
+import threading
+
+from django.db import transaction
+from people.models import Person
+
+##########################################################################
+
+# flag slug: pk; see ``get_flag_pk()``.
+_flag_pks = {}
+
+# the people queued for ``reconcile_flags_on_commit()``
+_local = threading.local()
+
+##########################################################################
+
+
+def get_flag(slug):
+    """
+    Return the person flag with the given slug, or None.
+    """
+    field = Person._meta.get_field("flags")
+    return field.remote_field.model._default_manager.filter(slug=slug).first()
+
+
+def get_flag_pk(slug):
+    """
+    The (cached) pk of the person flag with the given slug, or None.
+    The cache is cleared whenever a flag is saved or deleted.  A missing
+    flag is not cached: it may be created by another process.
+    """
+    if slug not in _flag_pks:
+        flag = get_flag(slug)
+        if flag is None:
+            return None
+        _flag_pks[slug] = flag.pk
+    return _flag_pks[slug]
+
+
+def clear_flag_pk_cache(**kwargs):
+    """
+    Signal receiver: flags were saved or deleted.
+    """
+    _flag_pks.clear()
+
+
+def _flagged_people(flag):
+    """
+    The related manager for the people with this flag.
+    """
+    field = Person._meta.get_field("flags")
+    return getattr(flag, field.remote_field.get_accessor_name())
+
+
+##########################################################################
+
+
+def add_flag(slug, person_ids):
+    """
+    Add the flag to each of the people (by pk) who do not already have it.
+    """
+    person_ids = set(person_ids)
+    if not person_ids:
+        return
+    flag = get_flag(slug)
+    if flag is None:
+        # let the people app create the flag, as it usually does:
+        first = Person.objects.get(pk=person_ids.pop())
+        first.add_flag_by_name(slug)
+        flag = get_flag(slug)
+        if flag is None or not person_ids:
+            return
+    _flagged_people(flag).add(*person_ids)
+
+
+def remove_flag(slug, person_ids):
+    """
+    Remove the flag from each of the people (by pk).
+    """
+    person_ids = set(person_ids)
+    if not person_ids:
+        return
+    flag = get_flag(slug)
+    if flag is not None:
+        _flagged_people(flag).remove(*person_ids)
+
+
+##########################################################################
+
+
+def reconcile_person_flags(person_ids):
+    """
+    Apply the flag rules to the people (by pk), based on all of their
+    graduate student records.
+    """
+    from .models import GraduateStudent
+
+    person_ids = set(person_ids)
+    if not person_ids:
+        return
+    students = GraduateStudent.objects.filter(person_id__in=person_ids).order_by()
+    add_flag("alumni", students.filter(status="G").values_list("person_id", flat=True))
+    current = students.filter(status__in=["P", "S"]).values("person_id")
+    remove_flag(
+        "gradstudent",
+        students.exclude(person_id__in=current).values_list("person_id", flat=True),
+    )
+
+
+def reconcile_graduate_student_flags(queryset):
+    """
+    Apply the flag rules to the people of the graduate students in the
+    queryset.
+    """
+    reconcile_person_flags(queryset.order_by().values_list("person_id", flat=True))
+
+
+def flag_current_graduate_students():
+    """
+    Add the graduate student flag to the people of active, current
+    students who are missing it.  Returns those students.
+    """
+    from .models import GraduateStudent
+
+    students = list(
+        GraduateStudent.objects.active(status="S").exclude(
+            person__flags__slug="gradstudent"
+        )
+    )
+    add_flag("gradstudent", [s.person_id for s in students])
+    return students
+
+
+##########################################################################
+
+
+def _pending_person_ids():
+    if not hasattr(_local, "person_ids"):
+        _local.person_ids = set()
+    return _local.person_ids
+
+
+def _reconcile_pending():
+    person_ids = _pending_person_ids()
+    _local.person_ids = set()
+    reconcile_person_flags(person_ids)
+
+
+def reconcile_flags_on_commit(person_ids):
+    """
+    Queue the people (by pk) to have their flags reconciled when the
+    current transaction commits (or right away, outside of one).
+    Everyone queued before the commit is reconciled in one batch; later
+    callbacks for the same commit find the queue empty.  (People queued
+    in a transaction that is rolled back are reconciled with the next
+    batch, which is harmless.)
+    """
+    _pending_person_ids().update(person_ids)
+    transaction.on_commit(_reconcile_pending)
+
+
+##########################################################################
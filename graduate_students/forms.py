@@ -2,6 +2,7 @@ from __future__ import print_function, unicode_literals
 
 import datetime
 import mimetypes
+from decimal import Decimal
 
 from django import forms
 from django.conf import settings
@@ -9,10 +10,13 @@ from django.contrib.admin import widgets
 from django.forms import FileInput
 from django.http import HttpResponse
 from django.urls import reverse_lazy
+from spreadsheet import sheetWriter
 
-from . import conf
-from .models import GraduateStudent
-from .utils import make_funding_spreadsheet
+from . import conf, funding_checks
+from .choices import PROGRAM_CHOICES, STATUS_CHOICES
+from .importing import CohortImporter, FundingImporter, read_rows
+from .models import Funding, GraduateStudent
+from .utils import make_funding_bundle, make_funding_spreadsheet
 
 """
 Forms for the Graduate Students app
@@ -24,6 +28,24 @@ Forms for the Graduate Students app
 SPREADSHEET_DOWNLOAD_FORMATS = conf.get("spreadsheet_formats")
 DEFAULT_SPREADSHEET_FORMAT = conf.get("default_spreadsheet_format")
 
+TIMESERIES_FREQUENCY_CHOICES = (
+    ("month", "Monthly"),
+    ("quarter", "Quarterly"),
+    ("year", "Yearly"),
+)
+TIMESERIES_GROUP_CHOICES = (
+    ("source", "Funding source"),
+    ("program", "Program"),
+    ("student", "Graduate student"),
+    ("none", "Totals only"),
+)
+TIMESERIES_GROUP_FIELDS = {
+    "source": ["source__name"],
+    "program": ["graduate_student__program"],
+    "student": ["graduate_student__person__cn"],
+    "none": [],
+}
+
 #######################################################################
 
 
@@ -41,6 +63,14 @@ class FundingReportForm(forms.Form):
         required=True,
         initial=DEFAULT_SPREADSHEET_FORMAT,
     )
+    extra_formats = forms.MultipleChoiceField(
+        choices=SPREADSHEET_DOWNLOAD_FORMATS,
+        label="Also include",
+        required=False,
+        widget=forms.CheckboxSelectMultiple,
+        help_text="Selecting additional formats downloads a zip file "
+        + "with the report in every selected format.",
+    )
 
     class Media:
         css = {"all": ("admin/css/widgets.css",)}
@@ -54,12 +84,39 @@ class FundingReportForm(forms.Form):
         self.fields["start_date"].widget = widgets.AdminDateWidget()
         self.fields["end_date"].widget = widgets.AdminDateWidget()
 
-    def get_result_data(self):
+    def get_formats(self):
+        """
+        Assumed that is_valid() has been checked and is True.
+
+        Returns the list of requested formats, the primary format first.
+        """
+        formats = [self.cleaned_data["format_"]]
+        for format_ in self.cleaned_data.get("extra_formats", []):
+            if format_ not in formats:
+                formats.append(format_)
+        return formats
+
+    def get_basename(self):
+        return "funding-report_%s" % datetime.date.today()
+
+    def get_result_data(self, basename=None):
         """
         Assumed that is_valid() has been checked and is True.
         
-        Returns the data stream for the spreadsheet.
+        Returns the data stream for the spreadsheet, or for a zip file
+        (of ``basename.format`` files) when more than one format was
+        requested.
         """
+        if basename is None:
+            basename = self.get_basename()
+        formats = self.get_formats()
+        if len(formats) > 1:
+            return make_funding_bundle(
+                self.cleaned_data["start_date"],
+                self.cleaned_data["end_date"],
+                formats,
+                basename,
+            )
         return make_funding_spreadsheet(
             self.cleaned_data["start_date"],
             self.cleaned_data["end_date"],
@@ -70,10 +127,13 @@ class FundingReportForm(forms.Form):
         """
         Assumed that is_valid() has been checked and is True.
         """
-        filename = "funding-report_%s" % datetime.date.today()
-        filename += "." + self.cleaned_data["format_"]
+        basename = self.get_basename()
+        if len(self.get_formats()) > 1:
+            filename = basename + ".zip"
+        else:
+            filename = basename + "." + self.cleaned_data["format_"]
         content_type, encoding = mimetypes.guess_type(filename)
-        stream = self.get_result_data()
+        stream = self.get_result_data(basename)
         response = HttpResponse(content_type=content_type)
         response["Content-Disposition"] = "attachment; filename=" + filename
         response.write(stream)
@@ -83,6 +143,218 @@ class FundingReportForm(forms.Form):
 #######################################################################
 
 
+class FundingTimeSeriesForm(forms.Form):
+    """
+    Funding time series input form.
+    """
+
+    start_date = forms.DateField(required=True)
+    end_date = forms.DateField(required=True)
+    freq = forms.ChoiceField(
+        choices=TIMESERIES_FREQUENCY_CHOICES,
+        label="Frequency",
+        required=True,
+        initial="month",
+    )
+    group_by = forms.ChoiceField(
+        choices=TIMESERIES_GROUP_CHOICES,
+        label="Group by",
+        required=True,
+        initial="source",
+    )
+
+    class Media:
+        css = {"all": ("admin/css/widgets.css",)}
+
+    def __init__(self, *args, **kwargs):
+        super(FundingTimeSeriesForm, self).__init__(*args, **kwargs)
+        self.fields["start_date"].widget = widgets.AdminDateWidget()
+        self.fields["end_date"].widget = widgets.AdminDateWidget()
+
+    def clean(self):
+        cleaned_data = super(FundingTimeSeriesForm, self).clean()
+        start_date = cleaned_data.get("start_date")
+        end_date = cleaned_data.get("end_date")
+        if start_date and end_date and end_date < start_date:
+            raise forms.ValidationError("The end date must be after the start date")
+        return cleaned_data
+
+    def _group_label(self, group):
+        if self.cleaned_data["group_by"] == "program":
+            return dict(PROGRAM_CHOICES).get(group[0], group[0])
+        if not group:
+            return "Funding"
+        return " ".join("{}".format(g) for g in group)
+
+    def get_table(self):
+        """
+        Assumed that is_valid() has been checked and is True.
+
+        Returns the time series as a list of rows: a header row, one row per
+        group and a final row of totals.
+        """
+        freq = self.cleaned_data["freq"]
+        series = (
+            Funding.objects.active()
+            .filter(source__active=True)
+            .timeseries(
+                self.cleaned_data["start_date"],
+                self.cleaned_data["end_date"],
+                freq=freq,
+                group_by=TIMESERIES_GROUP_FIELDS[self.cleaned_data["group_by"]],
+            )
+        )
+        if freq == "month":
+            headers = [b[0].strftime("%Y-%m") for b in series]
+        elif freq == "quarter":
+            headers = [
+                "{} Q{}".format(b[0].year, (b[0].month + 2) // 3) for b in series
+            ]
+        else:
+            headers = [b[0].strftime("%Y") for b in series]
+        group_list = set()
+        for bucket_start, bucket_end, totals in series:
+            group_list.update(totals.keys())
+        zero = Decimal("0.00")
+        table = [[""] + headers + ["Total"]]
+        for label, group in sorted((self._group_label(g), g) for g in group_list):
+            row = [totals.get(group, zero) for b_start, b_end, totals in series]
+            table.append([label] + row + [sum(row, zero)])
+        totals_row = [sum(totals.values(), zero) for b_start, b_end, totals in series]
+        table.append(["Total"] + totals_row + [sum(totals_row, zero)])
+        return table
+
+    def on_success(self):
+        """
+        Assumed that is_valid() has been checked and is True.
+
+        Returns the time series as a CSV download.
+        """
+        filename = "funding-timeseries_%s.csv" % datetime.date.today()
+        response = HttpResponse(content_type="text/csv")
+        response["Content-Disposition"] = "attachment; filename=" + filename
+        response.write(sheetWriter(self.get_table(), "csv"))
+        return response
+
+
+#######################################################################
+
+
+class FundingChecksForm(forms.Form):
+    """
+    Funding checks (gaps, overlaps, payments outside of the program)
+    input form.
+    """
+
+    status = forms.ChoiceField(
+        choices=[("", "All students")] + list(STATUS_CHOICES),
+        label="Students",
+        required=False,
+        initial="S",
+    )
+    gap_days = forms.IntegerField(
+        label="Report gaps longer than", min_value=0, help_text="days",
+    )
+
+    def get_problems(self):
+        """
+        Assumed that is_valid() has been checked and is True.
+        """
+        students = GraduateStudent.objects.active(
+            status=self.cleaned_data["status"] or None
+        )
+        return funding_checks.check_funding(
+            students, gap_days=self.cleaned_data["gap_days"]
+        )
+
+    def get_table(self):
+        """
+        Assumed that is_valid() has been checked and is True.
+
+        Returns the problems as a list of rows, with a header row.
+        """
+        return funding_checks.problem_table(self.get_problems())
+
+    def on_success(self):
+        """
+        Assumed that is_valid() has been checked and is True.
+
+        Returns the problems as a CSV download.
+        """
+        filename = "funding-checks_%s.csv" % datetime.date.today()
+        response = HttpResponse(content_type="text/csv")
+        response["Content-Disposition"] = "attachment; filename=" + filename
+        response.write(sheetWriter(self.get_table(), "csv"))
+        return response
+
+
+#######################################################################
+
+
+class ImportForm(forms.Form):
+    """
+    Spreadsheet import input form; subclasses set the importer.
+    """
+
+    importer_class = None
+    columns_help = ""
+
+    file = forms.FileField()
+    dry_run = forms.BooleanField(
+        required=False, help_text="Only check the file; do not import anything."
+    )
+
+    def __init__(self, *args, **kwargs):
+        super(ImportForm, self).__init__(*args, **kwargs)
+        self.fields["file"].help_text = self.columns_help
+
+    def clean_file(self):
+        upload = self.cleaned_data["file"]
+        try:
+            self.rows = read_rows(upload, upload.name)
+        except Exception as e:  # any file that cannot be read.
+            raise forms.ValidationError("Could not read the file: {}".format(e))
+        return upload
+
+    def run(self):
+        """
+        Assumed that is_valid() has been checked and is True.
+
+        Returns (imported list, row errors); nothing is saved when there
+        are errors.
+        """
+        importer = self.importer_class()
+        return importer.run(self.rows, dry_run=self.cleaned_data["dry_run"])
+
+
+class FundingImportForm(ImportForm):
+    """
+    Funding import input form.
+    """
+
+    importer_class = FundingImporter
+    columns_help = (
+        "A CSV or XLSX file with the columns: student (name or id), "
+        + "source (name or id), amount, start_date, end_date, comments."
+    )
+
+
+class CohortImportForm(ImportForm):
+    """
+    New graduate students (cohort onboarding) import input form.
+    """
+
+    importer_class = CohortImporter
+    columns_help = (
+        "A CSV or XLSX file with the columns: name, start_date, person "
+        + "(slug or id, for an existing person), given_name, sn, program, "
+        + "status, advisors (separated by semicolons)."
+    )
+
+
+#######################################################################
+
+
 class GraduateStudentForm(forms.ModelForm):
     """
     Form for a graduate student record.
@@ -0,0 +1,196 @@
+"""
+Funding checks, for the whole department at once:
+
+* gaps (longer than the ``funding:gap_days`` setting) between a
+  student's funding periods,
+* overlapping funding from the same source (often, duplicate rows), and
+* one-time payments outside of the student's program.
+
+The students and their active funding are loaded with one query each;
+then each student's funding is sorted by start date and checked with a
+single sweep, i.e., in O(n log n) time per student.
+"""
+from __future__ import print_function, unicode_literals
+
+import datetime
+from collections import namedtuple
+
+from . import conf
+from .models import Funding
+
+##########################################################################
+
+GAP = "gap"
+OVERLAP = "overlap"
+OUTSIDE_PROGRAM = "outside-program"
+
+KIND_LABELS = {
+    GAP: "Gap in funding",
+    OVERLAP: "Overlapping funding",
+    OUTSIDE_PROGRAM: "Payment outside of program",
+}
+
+ONE_DAY = datetime.timedelta(days=1)
+
+StudentRow = namedtuple(
+    "StudentRow", ["pk", "name", "program", "start_date", "graduation_date"]
+)
+
+FundingRow = namedtuple(
+    "FundingRow", ["pk", "source_id", "source", "amount", "start_date", "end_date"]
+)
+
+Problem = namedtuple(
+    "Problem", ["kind", "student", "start_date", "end_date", "funding", "description"]
+)
+
+##########################################################################
+
+
+def find_gaps(student, funding_list, gap_days):
+    """
+    Gaps longer than ``gap_days`` between the (sorted) funding periods.
+    One-time payments do not cover any period.
+    """
+    covered_until = None
+    last = None
+    for funding in funding_list:
+        if funding.end_date is None:
+            continue
+        if covered_until is not None:
+            days = (funding.start_date - covered_until).days - 1
+            if days > gap_days:
+                yield Problem(
+                    GAP,
+                    student,
+                    covered_until + ONE_DAY,
+                    funding.start_date - ONE_DAY,
+                    [last, funding],
+                    "No funding for {} days".format(days),
+                )
+        if covered_until is None or funding.end_date > covered_until:
+            covered_until = funding.end_date
+            last = funding
+
+
+def find_overlaps(student, funding_list):
+    """
+    Overlapping (sorted) funding from the same source: periods which
+    overlap, or one-time payments on the same day.
+    """
+    # (source, one-time): the funding that reaches the furthest so far
+    furthest = {}
+    for funding in funding_list:
+        key = (funding.source_id, funding.end_date is None)
+        end_date = funding.end_date or funding.start_date
+        previous = furthest.get(key)
+        if previous is not None:
+            previous_end_date = previous.end_date or previous.start_date
+            if funding.start_date <= previous_end_date:
+                yield Problem(
+                    OVERLAP,
+                    student,
+                    funding.start_date,
+                    min(end_date, previous_end_date),
+                    [previous, funding],
+                    "{} funding overlaps".format(funding.source),
+                )
+            if end_date <= previous_end_date:
+                continue
+        furthest[key] = funding
+
+
+def find_outside_program(student, funding_list):
+    """
+    One-time payments before the student started, or after they graduated.
+    """
+    for funding in funding_list:
+        if funding.end_date is not None:
+            continue
+        if funding.start_date < student.start_date:
+            description = "Paid before the program started"
+        elif student.graduation_date and funding.start_date > student.graduation_date:
+            description = "Paid after graduation"
+        else:
+            continue
+        yield Problem(
+            OUTSIDE_PROGRAM, student, funding.start_date, None, [funding], description,
+        )
+
+
+def check_student(student, funding_list, gap_days):
+    """
+    All of the problems with one student's funding.
+    """
+    funding_list = sorted(
+        funding_list, key=lambda f: (f.start_date, f.end_date or f.start_date, f.pk)
+    )
+    problems = list(find_gaps(student, funding_list, gap_days))
+    problems += find_overlaps(student, funding_list)
+    problems += find_outside_program(student, funding_list)
+    return problems
+
+
+##########################################################################
+
+
+def check_funding(student_qs, gap_days=None):
+    """
+    Check the active funding of the graduate students in the queryset.
+    Returns a list of ``Problem``s, by student and date.
+    """
+    if gap_days is None:
+        gap_days = conf.get("funding:gap_days")
+    students = {}
+    for values in student_qs.order_by().values_list(
+        "pk", "person__cn", "program", "start_date", "graduation_date"
+    ):
+        students[values[0]] = StudentRow(*values)
+    funding_by_student = dict((pk, []) for pk in students)
+    for values in (
+        Funding.objects.active()
+        .filter(graduate_student__in=student_qs.order_by().values("pk"))
+        .order_by()
+        .values_list(
+            "graduate_student_id",
+            "pk",
+            "source_id",
+            "source__name",
+            "amount",
+            "start_date",
+            "end_date",
+        )
+    ):
+        funding_by_student[values[0]].append(FundingRow(*values[1:]))
+
+    problems = []
+    for pk, funding_list in funding_by_student.items():
+        problems += check_student(students[pk], funding_list, gap_days)
+    problems.sort(key=lambda p: (p.student.name, p.student.pk, p.start_date))
+    return problems
+
+
+def problem_table(problems):
+    """
+    The problems as a list of rows (with a header row), for display or
+    as a spreadsheet.
+    """
+    table = [["Graduate student", "Problem", "From", "To", "Funding", "Details"]]
+    for problem in problems:
+        table.append(
+            [
+                problem.student.name,
+                KIND_LABELS[problem.kind],
+                problem.start_date,
+                problem.end_date or "",
+                "; ".join(
+                    "#{} {} ${}".format(f.pk, f.source, f.amount)
+                    for f in problem.funding
+                ),
+                problem.description,
+            ]
+        )
+    return table
+
+
+##########################################################################
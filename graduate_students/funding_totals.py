@@ -0,0 +1,180 @@
+"""
+Denormalized funding totals on graduate students.
+
+Each graduate student has the total amount, number, first start date and
+last (end or one-time payment) date of their *active* funding, so that
+lists can show, sort and filter on them without reading the funding.
+
+The totals are kept up to date by the ``Funding`` save and delete
+signals: amounts and counts are changed by ``F()`` deltas, and the dates
+are widened with ``Least()``/``Greatest()`` (or, when funding is removed,
+recomputed by a subquery) -- one ``UPDATE`` per change.
+
+Bulk inserts and updates of funding do not send signals: follow them with
+``rebuild()``.  ``verify()`` reports any students whose totals are wrong.
+"""
+from __future__ import print_function, unicode_literals
+
+from collections import namedtuple
+
+from django.db.models import (
+    Count,
+    DecimalField,
+    F,
+    IntegerField,
+    Max,
+    Min,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce, Greatest, Least
+
+##########################################################################
+
+FIELDS = ["funding_total", "funding_count", "funding_start", "funding_end"]
+
+# The funding values the totals depend on.
+FundingKey = namedtuple(
+    "FundingKey", ["graduate_student_id", "active", "amount", "start_date", "end_date"]
+)
+
+##########################################################################
+
+
+def funding_key(funding):
+    return FundingKey(
+        funding.graduate_student_id,
+        funding.active,
+        funding.amount,
+        funding.start_date,
+        funding.end_date,
+    )
+
+
+def _aggregate(aggregate, output_field=None):
+    """
+    A subquery of an aggregate of the outer student's active funding.
+    """
+    from .models import Funding
+
+    funding = (
+        Funding.objects.filter(graduate_student=OuterRef("pk"), active=True)
+        .order_by()
+        .values("graduate_student")
+    )
+    return Subquery(
+        funding.annotate(value=aggregate).values("value"), output_field=output_field
+    )
+
+
+def _computed():
+    """
+    The expressions for the totals, from the funding.
+    """
+    return {
+        "funding_total": Coalesce(
+            _aggregate(Sum("amount")),
+            Value(0),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        "funding_count": Coalesce(
+            _aggregate(Count("pk"), IntegerField()),
+            Value(0),
+            output_field=IntegerField(),
+        ),
+        "funding_start": _aggregate(Min("start_date")),
+        "funding_end": _aggregate(Max(Coalesce("end_date", "start_date"))),
+    }
+
+
+##########################################################################
+
+
+def _student_qs(student_id):
+    from .models import GraduateStudent
+
+    return GraduateStudent.objects.filter(pk=student_id)
+
+
+def add(key):
+    """
+    Add active funding (a ``FundingKey``) to the student's totals.
+    """
+    if not key.active or key.graduate_student_id is None:
+        return
+    last_date = key.end_date or key.start_date
+    _student_qs(key.graduate_student_id).update(
+        funding_total=F("funding_total") + key.amount,
+        funding_count=F("funding_count") + 1,
+        funding_start=Least(
+            Coalesce("funding_start", Value(key.start_date)), Value(key.start_date)
+        ),
+        funding_end=Greatest(
+            Coalesce("funding_end", Value(last_date)), Value(last_date)
+        ),
+    )
+
+
+def remove(key):
+    """
+    Remove active funding (a ``FundingKey``) from the student's totals.
+    (Call this after the funding has been changed or deleted.)
+    """
+    if not key.active or key.graduate_student_id is None:
+        return
+    computed = _computed()
+    _student_qs(key.graduate_student_id).update(
+        funding_total=F("funding_total") - key.amount,
+        funding_count=F("funding_count") - 1,
+        funding_start=computed["funding_start"],
+        funding_end=computed["funding_end"],
+    )
+
+
+def changed(old, new):
+    """
+    Funding changed from ``old`` to ``new`` (``FundingKey``s, or None).
+    """
+    if old == new:
+        return
+    if old is not None:
+        remove(old)
+    if new is not None:
+        add(new)
+
+
+##########################################################################
+
+
+def rebuild(queryset):
+    """
+    Recompute the totals of the graduate students in the queryset,
+    in one query.
+    """
+    return queryset.order_by().update(**_computed())
+
+
+def verify(queryset):
+    """
+    Returns a list of (student pk, stored totals, correct totals) for the
+    graduate students in the queryset whose totals are wrong.
+    Totals are dictionaries keyed on ``FIELDS``.
+    """
+    computed = dict(("_" + name, value) for name, value in _computed().items())
+    values = (
+        queryset.order_by("pk")
+        .annotate(**computed)
+        .values_list("pk", *(FIELDS + ["_" + name for name in FIELDS]))
+    )
+    errors = []
+    for row in values:
+        stored = dict(zip(FIELDS, row[1 : 1 + len(FIELDS)]))
+        correct = dict(zip(FIELDS, row[1 + len(FIELDS) :]))
+        if stored != correct:
+            errors.append((row[0], stored, correct))
+    return errors
+
+
+##########################################################################
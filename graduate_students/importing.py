@@ -0,0 +1,472 @@
+"""
+Bulk imports from CSV or XLSX spreadsheets.
+
+Every row is validated in memory, against maps of the existing records
+that are loaded up front (one query each), before anything is written.
+When any row has an error, nothing is imported; otherwise all of the
+rows are inserted with ``bulk_create()`` in a single transaction.
+
+Model ``save()`` methods and ``post_save`` signals are not run for the
+imported records.
+
+XLSX support requires ``openpyxl``.
+"""
+from __future__ import print_function, unicode_literals
+
+import csv
+import io
+import os
+from collections import namedtuple
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.template.defaultfilters import slugify
+from people.models import Person
+
+from . import conf, funding_totals, money
+from .choices import PROGRAM_CHOICES, STATUS_CHOICES
+from .flags import add_flag, reconcile_graduate_student_flags
+from .models import Funding, FundingSource, GraduateStudent
+from .signals import autocreate_suspended
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+##########################################################################
+
+RowError = namedtuple("RowError", ["row", "message"])
+
+# A graduate student to onboard: the unsaved record, its person (which may
+# also be unsaved), and the advisors' person ids.
+Intake = namedtuple("Intake", ["student", "person", "advisor_ids"])
+
+##########################################################################
+
+
+def _normalize_header(value):
+    return "{}".format(value or "").strip().lower().replace(" ", "_")
+
+
+def read_rows(fileobj, filename):
+    """
+    Read a spreadsheet (CSV or XLSX, by the filename extension) with a
+    header row; returns a list of dictionaries, keyed on the normalized
+    (lowercase, underscored) headers.  Blank rows are skipped.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".xlsx":
+        if openpyxl is None:
+            raise ValueError("Importing XLSX files requires openpyxl")
+        workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+        rows = list(workbook.active.iter_rows(values_only=True))
+    elif extension == ".csv":
+        data = fileobj.read()
+        if isinstance(data, bytes):
+            data = data.decode("utf-8-sig")
+        rows = list(csv.reader(io.StringIO(data)))
+    else:
+        raise ValueError("Unsupported file type: {!r}".format(extension))
+    if not rows:
+        return []
+    headers = [_normalize_header(h) for h in rows[0]]
+    result = []
+    for row in rows[1:]:
+        if all(cell in (None, "") for cell in row):
+            continue
+        values = dict(zip(headers, row))
+        values = dict(
+            (key, value.strip() if isinstance(value, str) else value)
+            for key, value in values.items()
+        )
+        result.append(values)
+    return result
+
+
+##########################################################################
+
+
+class BaseImporter(object):
+    """
+    Validate rows into unsaved model instances, then save them all,
+    or none of them.
+    """
+
+    model = None
+    required_columns = []
+
+    def __init__(self):
+        self.load()
+
+    def load(self):
+        """
+        Preload whatever the rows refer to.
+        """
+
+    def build(self, values):
+        """
+        Return an unsaved instance for the row values,
+        or raise ``ValidationError``.
+        """
+        raise NotImplementedError
+
+    def validate(self, rows):
+        """
+        Returns (instances, errors); row numbers count the header as 1.
+        """
+        instances = []
+        errors = []
+        if rows:
+            missing = [c for c in self.required_columns if c not in rows[0]]
+            if missing:
+                message = "Missing column(s): {}".format(", ".join(missing))
+                return [], [RowError(1, message)]
+        for number, values in enumerate(rows, start=2):
+            try:
+                instances.append(self.build(values))
+            except ValidationError as e:
+                errors.append(RowError(number, "; ".join(_messages(e))))
+        return instances, errors
+
+    def save(self, instances):
+        self.model.objects.bulk_create(instances)
+
+    def run(self, rows, dry_run=False):
+        """
+        Validate and (unless there are errors, or this is a dry run)
+        save the rows.  Returns (instances, errors).
+        """
+        instances, errors = self.validate(rows)
+        if not errors and not dry_run:
+            with transaction.atomic():
+                self.save(instances)
+        return instances, errors
+
+
+def _messages(error):
+    """
+    Flatten a ``ValidationError`` into a list of messages.
+    """
+    if hasattr(error, "message_dict"):
+        return [
+            "{}: {}".format(field, message) if field != "__all__" else message
+            for field, messages in sorted(error.message_dict.items())
+            for message in messages
+        ]
+    return list(error.messages)
+
+
+def _choice(value, choices, default, label):
+    """
+    The code for a choice, given either the code or its label.
+    """
+    if value in (None, ""):
+        return default
+    text = "{}".format(value).strip().lower()
+    for code, description in choices:
+        if text in (code.lower(), "{}".format(description).lower()):
+            return code
+    raise ValidationError("Unknown {}: {}".format(label, value))
+
+
+def _lookup(mapping, key, label):
+    """
+    Find the (single) record for the key in a map of key: [records].
+    """
+    matches = mapping.get(key, [])
+    if not matches:
+        raise ValidationError("No such {}: {}".format(label, key))
+    if len(matches) > 1:
+        raise ValidationError(
+            "More than one {} matches {!r}; use the id".format(label, key)
+        )
+    return matches[0]
+
+
+def _amount(value):
+    """
+    An amount of money; spreadsheet numbers (floats, e.g., 1234.56) are
+    rounded to the cent, rather than kept to float precision.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return Decimal("{!r}".format(value)).quantize(money.CENT)
+    return value
+
+
+##########################################################################
+
+
+class FundingImporter(BaseImporter):
+    """
+    Columns: ``student`` (the person's name, or the graduate student id),
+    ``source`` (the funding source name, or id), ``amount``,
+    ``start_date``, and optionally ``end_date`` and ``comments``.
+    Dates are YYYY-MM-DD (or spreadsheet dates).
+    """
+
+    model = Funding
+    required_columns = ["student", "source", "amount", "start_date"]
+
+    def load(self):
+        students = GraduateStudent.objects.filter(active=True)
+        if not conf.get("funding:allow-historical"):
+            # as for the funding admin's graduate student choices:
+            students = students.filter(status__in=["P", "S"])
+        self.students_by_id = {}
+        self.students_by_name = {}
+        for pk, name in students.values_list("pk", "person__cn"):
+            self.students_by_id[pk] = [pk]
+            self.students_by_name.setdefault(name.lower(), []).append(pk)
+        self.sources_by_id = {}
+        self.sources_by_name = {}
+        for pk, name in FundingSource.objects.active().values_list("pk", "name"):
+            self.sources_by_id[pk] = [pk]
+            self.sources_by_name.setdefault(name.lower(), []).append(pk)
+
+    def _find(self, value, by_id, by_name, label):
+        if value in (None, ""):
+            raise ValidationError("The {} is required".format(label))
+        text = "{}".format(value).strip()
+        if isinstance(value, float) and value.is_integer():
+            text = "{}".format(int(value))
+        if text.isdigit():
+            return _lookup(by_id, int(text), label)
+        return _lookup(by_name, text.lower(), label)
+
+    def build(self, values):
+        funding = Funding(
+            graduate_student_id=self._find(
+                values.get("student"),
+                self.students_by_id,
+                self.students_by_name,
+                "graduate student",
+            ),
+            source_id=self._find(
+                values.get("source"), self.sources_by_id, self.sources_by_name, "source"
+            ),
+            amount=_amount(values.get("amount")),
+            start_date=values.get("start_date"),
+            end_date=values.get("end_date") or None,
+            comments=values.get("comments") or "",
+        )
+        # (the foreign keys were checked against the preloaded maps)
+        funding.full_clean(
+            exclude=["graduate_student", "source"], validate_unique=False
+        )
+        return funding
+
+    def save(self, instances):
+        super(FundingImporter, self).save(instances)
+        # (``bulk_create()`` does not send the signals that maintain these)
+        funding_totals.rebuild(
+            GraduateStudent.objects.filter(
+                pk__in=set(f.graduate_student_id for f in instances)
+            )
+        )
+
+
+##########################################################################
+
+
+class CohortImporter(BaseImporter):
+    """
+    Onboard a cohort of new graduate students.
+
+    Columns: ``name`` and ``start_date``, and optionally ``person`` (the
+    slug or id of an existing person), ``given_name``, ``sn``,
+    ``program``, ``status`` (codes or labels) and ``advisors`` (names,
+    slugs or ids, separated by semicolons).
+
+    A row is for an existing person when the ``person`` column is given,
+    or when exactly one person has the name; otherwise a person is
+    created.  The graduate student flags are reconciled once, for the
+    whole cohort, and graduate student records are not autocreated
+    (one person at a time) while the people are flagged.
+    """
+
+    model = GraduateStudent
+    required_columns = ["name", "start_date"]
+
+    def load(self):
+        advisors = Person.objects.filter(
+            active=True, flags__slug__in=conf.get("advisor_flags")
+        ).distinct()
+        self.advisors_by_id = {}
+        self.advisors_by_name = {}
+        self.advisors_by_slug = {}
+        for pk, name, slug in advisors.values_list("pk", "cn", "slug"):
+            self.advisors_by_id[pk] = [pk]
+            self.advisors_by_name.setdefault(name.lower(), []).append(pk)
+            self.advisors_by_slug[slug] = [pk]
+
+    def load_people(self, rows):
+        """
+        Preload the people the rows may refer to, the slugs a new person
+        might clash with, and the existing graduate student records.
+        """
+        ids = set()
+        slugs = set()
+        names = set()
+        for values in rows:
+            person = "{}".format(values.get("person") or "").strip()
+            if person.isdigit():
+                ids.add(int(person))
+            elif person:
+                slugs.add(person)
+            elif values.get("name"):
+                names.add("{}".format(values["name"]).strip())
+        self.people_by_id = {}
+        self.people_by_slug = {}
+        self.people_by_name = {}
+        if ids or slugs or names:
+            people = Person.objects.filter(
+                Q(pk__in=ids) | Q(slug__in=slugs) | Q(cn__in=names)
+            )
+            for person in people:
+                self.people_by_id[person.pk] = [person]
+                self.people_by_slug[person.slug] = [person]
+                self.people_by_name.setdefault(person.cn.lower(), []).append(person)
+
+        self.taken_slugs = set()
+        prefixes = set(slugify(name) for name in names if slugify(name))
+        if prefixes:
+            query = Q()
+            for prefix in prefixes:
+                query |= Q(slug__startswith=prefix)
+            self.taken_slugs.update(
+                Person.objects.filter(query).values_list("slug", flat=True)
+            )
+
+        self.enrolled = set(
+            GraduateStudent.objects.filter(person_id__in=self.people_by_id).values_list(
+                "person_id", "program"
+            )
+        )
+        self.new_people = {}
+
+    def validate(self, rows):
+        self.load_people(rows)
+        return super(CohortImporter, self).validate(rows)
+
+    def _new_person(self, name, values):
+        """
+        An unsaved person, with a slug that is not taken.
+        A name repeated in the file is the same new person.
+        """
+        if name.lower() in self.new_people:
+            return self.new_people[name.lower()]
+        given_name, _, sn = name.partition(" ")
+        prefix = slugify(name) or "person"
+        slug = prefix
+        n = 1
+        while slug in self.taken_slugs:
+            n += 1
+            slug = "{}-{}".format(prefix, n)
+        person = Person(
+            cn=name,
+            given_name=values.get("given_name") or given_name,
+            sn=values.get("sn") or sn,
+            slug=slug,
+        )
+        self.taken_slugs.add(slug)
+        self.new_people[name.lower()] = person
+        return person
+
+    def _find_person(self, values):
+        name = "{}".format(values.get("name") or "").strip()
+        if not name:
+            raise ValidationError("The name is required")
+        reference = "{}".format(values.get("person") or "").strip()
+        if reference.isdigit():
+            return _lookup(self.people_by_id, int(reference), "person")
+        if reference:
+            return _lookup(self.people_by_slug, reference, "person")
+        matches = self.people_by_name.get(name.lower(), [])
+        if len(matches) > 1:
+            raise ValidationError(
+                "More than one person is named {!r}; "
+                "give their slug or id in the person column".format(name)
+            )
+        if matches:
+            return matches[0]
+        return self._new_person(name, values)
+
+    def _find_advisor(self, value):
+        if value.isdigit():
+            return _lookup(self.advisors_by_id, int(value), "advisor")
+        if value in self.advisors_by_slug:
+            return self.advisors_by_slug[value][0]
+        return _lookup(self.advisors_by_name, value.lower(), "advisor")
+
+    def build(self, values):
+        person = self._find_person(values)
+        student = GraduateStudent(
+            person=person,
+            program=_choice(values.get("program"), PROGRAM_CHOICES, "M", "program"),
+            status=_choice(values.get("status"), STATUS_CHOICES, "P", "status"),
+            start_date=values.get("start_date"),
+        )
+        # (the person may not be saved yet)
+        student.full_clean(exclude=["person"], validate_unique=False)
+        key = (person.pk or person.slug, student.program)
+        if key in self.enrolled:
+            raise ValidationError(
+                "{} already has a graduate student record for the {} program".format(
+                    person.cn, student.get_program_display()
+                )
+            )
+        advisors = "{}".format(values.get("advisors") or "").split(";")
+        advisor_ids = [self._find_advisor(a.strip()) for a in advisors if a.strip()]
+        self.enrolled.add(key)
+        return Intake(student, person, advisor_ids)
+
+    def save(self, intakes):
+        with autocreate_suspended():
+            new_people = list(self.new_people.values())
+            Person.objects.bulk_create(new_people)
+            # not every database returns primary keys from bulk_create:
+            people = Person.objects.in_bulk(
+                [p.slug for p in new_people], field_name="slug"
+            )
+            for person in new_people:
+                person.pk = people[person.slug].pk
+            for intake in intakes:
+                intake.student.person = intake.person
+
+            GraduateStudent.objects.bulk_create([i.student for i in intakes])
+            student_qs = GraduateStudent.objects.filter(
+                person_id__in=set(i.person.pk for i in intakes)
+            )
+            pks = dict(
+                ((person_id, program), pk)
+                for pk, person_id, program in student_qs.values_list(
+                    "pk", "person_id", "program"
+                )
+            )
+            through = GraduateStudent.advisor.through
+            links = []
+            for intake in intakes:
+                student = intake.student
+                student.pk = pks[(student.person_id, student.program)]
+                for advisor_id in set(intake.advisor_ids):
+                    links.append(
+                        through(graduatestudent_id=student.pk, person_id=advisor_id)
+                    )
+            through.objects.bulk_create(links)
+
+            cohort = GraduateStudent.objects.filter(
+                pk__in=[i.student.pk for i in intakes]
+            )
+            add_flag(
+                "gradstudent",
+                cohort.filter(status__in=["P", "S"]).values_list(
+                    "person_id", flat=True
+                ),
+            )
+            reconcile_graduate_student_flags(cohort)
+
+
+##########################################################################
@@ -0,0 +1,260 @@
+"""
+Optional instrumentation for the funding reports.
+
+A ``record()`` block (e.g., one report request) collects the wall time,
+number of queries and database time of each named ``stage()`` run within
+it.  Queries are counted with ``connection.execute_wrapper()``.
+When the block ends, the stages are logged as one JSON line to the
+``graduate_students.instrumentation`` logger, and can be added to the
+response as a ``Server-Timing`` header.
+
+Stages nest, and their timings are inclusive: e.g., the "proration"
+stage is part of the "funding_report_table" stage.
+
+When the ``instrumentation`` setting is off, ``record()`` returns a
+do-nothing recorder and ``instrumented()`` leaves functions unwrapped;
+and while no recorder is active, ``stage()`` returns a shared do-nothing
+context manager (after checking one module global).
+"""
+from __future__ import print_function, unicode_literals
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.db import connection
+
+from . import conf
+
+##########################################################################
+
+logger = logging.getLogger(__name__)
+
+timer = getattr(time, "perf_counter", time.time)
+
+_local = threading.local()
+
+# The number of active recorders, in any thread.
+_active = 0
+_active_lock = threading.Lock()
+
+##########################################################################
+
+
+class Stage(object):
+    """
+    The totals for all of the runs of a named stage.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.db_seconds = 0.0
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "ms": round(self.seconds * 1000, 3),
+            "queries": self.queries,
+            "db_ms": round(self.db_seconds * 1000, 3),
+        }
+
+
+##########################################################################
+
+
+class Recorder(object):
+    """
+    Collects the stages run (in this thread) while it is active.
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self.stages = OrderedDict()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.seconds = None
+
+    def _execute_wrapper(self, execute, sql, params, many, context):
+        start = timer()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_seconds += timer() - start
+
+    def __enter__(self):
+        global _active
+        with _active_lock:
+            _active += 1
+        self._previous = getattr(_local, "recorder", None)
+        _local.recorder = self
+        self._wrapper = connection.execute_wrapper(self._execute_wrapper)
+        self._wrapper.__enter__()
+        self._start = timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.seconds = timer() - self._start
+        self._wrapper.__exit__(exc_type, exc_value, traceback)
+        _local.recorder = self._previous
+        global _active
+        with _active_lock:
+            _active -= 1
+        logger.info("%s %s", self.label, json.dumps(self.as_dict(), sort_keys=True))
+
+    def add(self, name, seconds, queries, db_seconds):
+        if name not in self.stages:
+            self.stages[name] = Stage(name)
+        stage = self.stages[name]
+        stage.calls += 1
+        stage.seconds += seconds
+        stage.queries += queries
+        stage.db_seconds += db_seconds
+
+    def as_dict(self):
+        return {
+            "label": self.label,
+            "ms": round((self.seconds or 0) * 1000, 3),
+            "queries": self.queries,
+            "db_ms": round(self.db_seconds * 1000, 3),
+            "stages": OrderedDict(
+                (name, stage.as_dict()) for name, stage in self.stages.items()
+            ),
+        }
+
+    def server_timing(self):
+        """
+        The value for a ``Server-Timing`` header.
+        """
+        entries = [
+            'db;dur={:.1f};desc="{} queries"'.format(
+                self.db_seconds * 1000, self.queries
+            )
+        ]
+        for name, stage in self.stages.items():
+            entries.append(
+                '{};dur={:.1f};desc="{} queries"'.format(
+                    name, stage.seconds * 1000, stage.queries
+                )
+            )
+        return ", ".join(entries)
+
+    def add_header(self, response):
+        """
+        Add the ``Server-Timing`` header, if that is enabled.
+        """
+        if conf.get("instrumentation:server_timing"):
+            response["Server-Timing"] = self.server_timing()
+        return response
+
+
+class NullRecorder(object):
+    """
+    The recorder used when instrumentation is off.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def add_header(self, response):
+        return response
+
+
+NULL_RECORDER = NullRecorder()
+
+##########################################################################
+
+
+class StageTimer(object):
+    """
+    Times one run of a stage, for the recorder.
+    """
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self._queries = self.recorder.queries
+        self._db_seconds = self.recorder.db_seconds
+        self._start = timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.recorder.add(
+            self.name,
+            timer() - self._start,
+            self.recorder.queries - self._queries,
+            self.recorder.db_seconds - self._db_seconds,
+        )
+
+
+class NullStage(object):
+    """
+    The stage used when there is no active recorder.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+NULL_STAGE = NullStage()
+
+##########################################################################
+
+
+def record(label):
+    """
+    Returns a recorder (a context manager) for a request or job.
+    """
+    if conf.get("instrumentation"):
+        return Recorder(label)
+    return NULL_RECORDER
+
+
+def stage(name):
+    """
+    Returns a context manager which times a stage of the active recorder,
+    if there is one.
+    """
+    if not _active:
+        return NULL_STAGE
+    recorder = getattr(_local, "recorder", None)
+    if recorder is None:
+        return NULL_STAGE
+    return StageTimer(recorder, name)
+
+
+def instrumented(name):
+    """
+    Decorator: run the function as a ``stage()``.
+    Functions are not wrapped at all when instrumentation is off.
+    """
+
+    def decorator(func):
+        if not conf.get("instrumentation"):
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+##########################################################################
@@ -0,0 +1,187 @@
+"""
+Mailing lists (email aliases) of graduate students, for mail servers.
+
+Each list is computed with one (values only) query.  The lists are
+cached, keyed on a version made of:
+
+* one aggregate query: the latest modification time and the count of
+  the students, and of their people and email addresses, when those
+  have modification times (see ``caching.get_version()``), and
+* a counter in the cache, which is bumped whenever a graduate student,
+  person or email address is saved or deleted (see ``lists_changed()``).
+
+So polling for changes costs a single aggregate query.  The aggregate
+is the same in every process; the counter only adds changes seen by
+processes sharing the cache (e.g., edits to models without modification
+times).
+"""
+from __future__ import print_function, unicode_literals
+
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from people.models import Person
+
+from . import caching, conf
+from .models import GraduateStudent
+
+##########################################################################
+
+COUNTER_KEY = "graduate_students:mailing_lists:counter"
+
+##########################################################################
+
+
+def _phd_students():
+    return GraduateStudent.objects.phd_filter()
+
+
+def _msc_students():
+    return GraduateStudent.objects.msc_filter()
+
+
+# alias: function returning the students on the list
+STUDENT_LISTS = OrderedDict(
+    [("phd-students", _phd_students), ("msc-students", _msc_students)]
+)
+
+# alias: the (student list) aliases on the list
+LIST_GROUPS = OrderedDict([("grad-students", ["phd-students", "msc-students"])])
+
+##########################################################################
+
+
+def lists_changed(**kwargs):
+    """
+    Signal receiver: a graduate student, person or email address was
+    saved or deleted.
+    """
+    cache.add(COUNTER_KEY, 0, None)
+    try:
+        cache.incr(COUNTER_KEY)
+    except ValueError:  # evicted in between
+        cache.set(COUNTER_KEY, 1, None)
+
+
+def _modified_fields():
+    """
+    The students' modification time fields, and their people's and email
+    addresses', when they have one.
+    """
+    fields = ["modified"]
+    Email = Person._meta.get_field("email").remote_field.model
+    for prefix, model in [("person__", Person), ("person__email__", Email)]:
+        try:
+            model._meta.get_field("modified")
+        except FieldDoesNotExist:
+            continue
+        fields.append(prefix + "modified")
+    return fields
+
+
+def get_version():
+    """
+    The current version of the mailing lists.
+    """
+    students = caching.get_version(
+        [(GraduateStudent.objects.all(), _modified_fields(), ["person__email"])]
+    )[1]
+    return "{}-{}".format(students, cache.get(COUNTER_KEY, 0))
+
+
+def get_addresses(queryset):
+    """
+    The (distinct, sorted) email addresses of the students' people.
+    """
+    return list(
+        queryset.exclude(person__email__address__isnull=True)
+        .exclude(person__email__address="")
+        .order_by("person__email__address")
+        .values_list("person__email__address", flat=True)
+        .distinct()
+    )
+
+
+def get_mailing_lists(version=None):
+    """
+    Returns an ordered dictionary of alias: [addresses].
+    """
+    if version is None:
+        version = get_version()
+    key = "graduate_students:mailing_lists:{}".format(version)
+    result = cache.get(key)
+    if result is None:
+        result = OrderedDict()
+        for alias, students in STUDENT_LISTS.items():
+            result[alias] = get_addresses(students())
+        domain = conf.get("mailing_lists:domain")
+        for alias, members in LIST_GROUPS.items():
+            result[alias] = [
+                "{}@{}".format(member, domain) if domain else member
+                for member in members
+            ]
+        cache.set(key, result, conf.get("mailing_lists:cache_timeout"))
+    return result
+
+
+##########################################################################
+
+
+def as_aliases(mailing_lists):
+    """
+    An aliases(5) file.
+    """
+    return "".join(
+        "{}: {}\n".format(alias, ", ".join(addresses))
+        for alias, addresses in mailing_lists.items()
+        if addresses
+    )
+
+
+def as_json(mailing_lists):
+    return json.dumps(mailing_lists, indent=2) + "\n"
+
+
+def _ldif_line(attribute, value):
+    try:
+        value.encode("ascii")
+    except UnicodeError:
+        pass
+    else:
+        if value[:1] not in (" ", ":", "<") and value[-1:] != " ":
+            return "{}: {}\n".format(attribute, value)
+    encoded = base64.b64encode(value.encode("utf-8")).decode("ascii")
+    return "{}:: {}\n".format(attribute, encoded)
+
+
+def get_ldap_base():
+    base = conf.get("mailing_lists:ldap_base")
+    if base is None:
+        domain = conf.get("mailing_lists:domain") or ""
+        parts = ["ou=Aliases"] + ["dc=" + dc for dc in domain.split(".") if dc]
+        base = ",".join(parts)
+    return base
+
+
+def as_ldif(mailing_lists):
+    """
+    ``nisMailAlias`` entries (RFC 2307).
+    """
+    base = get_ldap_base()
+    entries = []
+    for alias, addresses in mailing_lists.items():
+        entry = _ldif_line("dn", "cn={},{}".format(alias, base))
+        entry += "objectClass: top\nobjectClass: nisMailAlias\n"
+        entry += _ldif_line("cn", alias)
+        for address in addresses:
+            entry += _ldif_line("rfc822MailMember", address)
+        entries.append(entry)
+    return "\n".join(entries)
+
+
+FORMATS = OrderedDict([("aliases", as_aliases), ("json", as_json), ("ldif", as_ldif)])
+
+##########################################################################
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("graduate_students", "0006_auto_20170927_1540")]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="graduatestudent",
+            index=models.Index(
+                fields=["status", "-graduation_date", "id"],
+                name="gradstudent_alumni_keyset",
+            ),
+        )
+    ]
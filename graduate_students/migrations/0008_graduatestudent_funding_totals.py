@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def rebuild_funding_totals(apps, schema_editor):
+    GraduateStudent = apps.get_model("graduate_students", "GraduateStudent")
+    Funding = apps.get_model("graduate_students", "Funding")
+
+    def aggregate(expression, output_field=None):
+        funding = (
+            Funding.objects.filter(graduate_student=OuterRef("pk"), active=True)
+            .order_by()
+            .values("graduate_student")
+        )
+        return Subquery(
+            funding.annotate(value=expression).values("value"),
+            output_field=output_field,
+        )
+
+    GraduateStudent.objects.update(
+        funding_total=Coalesce(
+            aggregate(Sum("amount")),
+            Value(0),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        ),
+        funding_count=Coalesce(
+            aggregate(Count("pk"), models.IntegerField()),
+            Value(0),
+            output_field=models.IntegerField(),
+        ),
+        funding_start=aggregate(Min("start_date")),
+        funding_end=aggregate(Max(Coalesce("end_date", "start_date"))),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("graduate_students", "0007_gradstudent_alumni_keyset")]
+
+    operations = [
+        migrations.AddField(
+            model_name="graduatestudent",
+            name="funding_total",
+            field=models.DecimalField(
+                db_index=True,
+                decimal_places=2,
+                default=0,
+                editable=False,
+                max_digits=12,
+                verbose_name="total funding",
+            ),
+        ),
+        migrations.AddField(
+            model_name="graduatestudent",
+            name="funding_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="graduatestudent",
+            name="funding_start",
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="graduatestudent",
+            name="funding_end",
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(rebuild_funding_totals, migrations.RunPython.noop),
+    ]
@@ -7,6 +7,39 @@ from django.utils.translation import ugettext as _
 
 ##########################################################################
 
+# view class -> admin subclass; see ``admin_view_class()``.
+_admin_view_classes = {}
+
+##########################################################################
+
+
+def admin_view_class(view_class):
+    """
+    Return a subclass of ``view_class`` which adds its ``admin_context``
+    (an ``as_view()`` initkwarg) to the context data.
+
+    The subclass is created once per view class, so nothing is modified
+    per request, and the context of one request never leaks into another.
+    """
+    try:
+        return _admin_view_classes[view_class]
+    except KeyError:
+        pass
+
+    class AdminView(view_class):
+        admin_context = None
+
+        def get_context_data(self, **kwargs):
+            data = super(AdminView, self).get_context_data(**kwargs)
+            if self.admin_context:
+                data.update(self.admin_context)
+            return data
+
+    AdminView.__name__ = str("Admin" + view_class.__name__)
+    # Two threads may race to create the subclass; either result is fine.
+    return _admin_view_classes.setdefault(view_class, AdminView)
+
+
 ##########################################################################
 
 
@@ -99,15 +132,7 @@ class ClassBasedViewsAdminMixin(object):
             }
         )
 
-        original_get_context_data = view_class.get_context_data
-
-        def _monkey_patch_get_context_data(instance, *args, **kwargs):
-            data = original_get_context_data(instance, *args, **kwargs)
-            data.update(context)
-            return data
-
-        view_class.get_context_data = _monkey_patch_get_context_data
-        return view_class.as_view()(request)
+        return admin_view_class(view_class).as_view(admin_context=context)(request)
 
 
 ##########################################################################
@@ -1,5 +1,57 @@
 from __future__ import print_function, unicode_literals
 
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Exists, OuterRef
+from django.db.models.constants import LOOKUP_SEP
+
+##########################################################################
+
+
+def is_multivalued_lookup(model, lookup):
+    """
+    Does the lookup (e.g., "advisor__username") span a multi-valued
+    relation (many to many, or a reverse foreign key)?  Filtering on such
+    a lookup joins, and so can duplicate, rows.
+    """
+    opts = model._meta
+    for name in lookup.split(LOOKUP_SEP):
+        try:
+            field = opts.get_field(name)
+        except FieldDoesNotExist:
+            return False  # a transform or lookup, e.g., "in".
+        if not field.is_relation:
+            return False
+        if field.many_to_many or field.one_to_many:
+            return True
+        opts = field.related_model._meta
+    return False
+
+
+def restrict_queryset(queryset, lookups):
+    """
+    Filter the queryset by the lookups (a dictionary), without duplicating
+    rows: single-valued lookups are plain filters, while multi-valued
+    lookups are tested (together) with an ``Exists()`` subquery.
+    """
+    single = {}
+    multiple = {}
+    for lookup, value in lookups.items():
+        if is_multivalued_lookup(queryset.model, lookup):
+            multiple[lookup] = value
+        else:
+            single[lookup] = value
+    if single:
+        queryset = queryset.filter(**single)
+    if multiple:
+        # Django 2.x can only filter on an Exists() through an annotation.
+        name = "_restricted_{}".format(len(queryset.query.annotations))
+        matches = queryset.model._default_manager.filter(
+            pk=OuterRef("pk"), **multiple
+        ).values("pk")
+        queryset = queryset.annotate(**{name: Exists(matches)}).filter(**{name: True})
+    return queryset
+
+
 ##########################################################################
 
 
@@ -22,6 +74,16 @@ class RestrictedBaseMixin(object):
         """
         return not user.is_superuser and self.is_restricted_user(user)
 
+    def _restrict_queryset(self, queryset, user):
+        """
+        Restrict the queryset for the (restricted) user.
+        """
+        if self.restricted_user_filter:
+            queryset = restrict_queryset(queryset, {self.restricted_user_filter: user})
+        if self.restricted_extra_filters:
+            queryset = restrict_queryset(queryset, self.restricted_extra_filters)
+        return queryset
+
 
 ##########################################################################
 
@@ -39,11 +101,8 @@ class RestrictedAdminMixin(RestrictedBaseMixin):
         qs = super(RestrictedAdminMixin, self).get_queryset(request)
         # If super-user, show all; otherwise restrict to future by conf setting:
         if self._should_restrict(request.user):
-            if self.restricted_user_filter:
-                qs = qs.filter(**{self.restricted_user_filter: request.user})
-            if self.restricted_extra_filters:
-                qs = qs.filter(**self.restricted_extra_filters)
-        return qs.distinct()
+            qs = self._restrict_queryset(qs, request.user)
+        return qs
 
     def get_fields(self, request, obj=None):
         """
@@ -67,7 +126,7 @@ class RestrictedAdminMixin(RestrictedBaseMixin):
                 fk_restrict = {
                     self.restricted_foreign_key_fields[db_field.name]: request.user
                 }
-                field.queryset = field.queryset.filter(**fk_restrict)
+                field.queryset = restrict_queryset(field.queryset, fk_restrict)
         return field
 
 
@@ -91,8 +150,8 @@ class RestrictedFormViewMixin(RestrictedBaseMixin):
                     fk_restrict = {
                         self.restricted_foreign_key_fields[f]: self.request.user
                     }
-                    form.fields[f].queryset = form.fields[f].queryset.filter(
-                        **fk_restrict
+                    form.fields[f].queryset = restrict_queryset(
+                        form.fields[f].queryset, fk_restrict
                     )
                     # if restricted to one fk, preselect it:
         #                     if form.fields[f].queryset.count() == 1:
@@ -106,13 +165,10 @@ class RestrictedFormViewMixin(RestrictedBaseMixin):
 
 class RestrictedQuerysetMixin(RestrictedBaseMixin):
     def get_queryset(self, *args, **kwargs):
-        qs = super(RestrictedFormViewMixin, self).get_queryset(*args, **kwargs)
+        qs = super(RestrictedQuerysetMixin, self).get_queryset(*args, **kwargs)
         if self._should_restrict(self.request.user):
-            if self.restricted_user_filter:
-                qs = qs.filter(**{self.restricted_user_filter: self.request.user})
-            if self.restricted_extra_filters:
-                qs = qs.filter(**self.restricted_extra_filters)
-        return qs.distinct()
+            qs = self._restrict_queryset(qs, self.request.user)
+        return qs
 
 
 ##########################################################################
@@ -29,16 +29,28 @@ class SingleFKBaseMixin(object):
         self._single_fk = None
         return result
 
-    def _resolve_initial_value(self, key):
+    def _get_single_fk(self, queryset):
+        """
+        Returns the only object in the queryset, or None when there
+        are zero or several.  (This is a single query.)
+        """
+        options = list(queryset[:2])
+        if len(options) == 1:
+            return options[0]
+        return None
+
+    def _resolve_initial_value(self, key, single_fk=None):
         """
         Returns None when this key cannot be resolved to an initial value.
         """
-        if self._single_fk is not None and key in self.single_fk_initial:
+        if single_fk is None:
+            single_fk = self._single_fk
+        if single_fk is not None and key in self.single_fk_initial:
             initial = self.single_fk_initial[key]
             if callable(initial):
-                initial = initial(self._single_fk)
-            elif hasattr(self._single_fk, initial):
-                initial = getattr(self._single_fk, initial)
+                initial = initial(single_fk)
+            elif hasattr(single_fk, initial):
+                initial = getattr(single_fk, initial)
             return initial
 
 
@@ -58,27 +70,30 @@ class SingleFKAdminMixin(SingleFKBaseMixin):
     def formfield_for_dbfield(self, db_field, **kwargs):
         """
         Modify formfields if necessary.
+
+        The model admin is shared by every request (and thread), so the
+        single foreign key is remembered on the request.
         """
         field = super(SingleFKAdminMixin, self).formfield_for_dbfield(
             db_field, **kwargs
         )
-        # Capture the _single_fk:
+        request = kwargs.get("request", None)
+        if field is None or request is None or "initial" in kwargs:
+            return field
+        memo = request.__dict__.setdefault("_single_fk", {})
+        # Capture the single fk (once per request):
         if db_field.name == self.single_fk_src:
-            if field.queryset.count() == 1:
-                self._single_fk = field.queryset.get()
-            if "initial" not in kwargs:
-                kwargs["initial"] = self._single_fk
-                field = super(SingleFKAdminMixin, self).formfield_for_dbfield(
-                    db_field, **kwargs
-                )
+            if self.__class__ not in memo:
+                memo[self.__class__] = self._get_single_fk(field.queryset)
+            if memo[self.__class__] is not None:
+                field.initial = memo[self.__class__]
+            return field
         # Give initial data to fields:
-        if "initial" not in kwargs:
-            initial = self._resolve_initial_value(db_field.name)
-            if initial is not None:
-                kwargs["initial"] = initial
-                field = super(SingleFKAdminMixin, self).formfield_for_dbfield(
-                    db_field, **kwargs
-                )
+        initial = self._resolve_initial_value(
+            db_field.name, memo.get(self.__class__, None)
+        )
+        if initial is not None:
+            field.initial = initial
         return field
 
 
@@ -96,8 +111,8 @@ class SingleFKFormViewMixin(SingleFKBaseMixin):
         form = super(SingleFKFormViewMixin, self).get_form(*args, **kwargs)
         for f in form.fields:
             if f == self.single_fk_src:
-                if form.fields[f].queryset.count() == 1:
-                    self._single_fk = form.fields[f].queryset.get()
+                self._single_fk = self._get_single_fk(form.fields[f].queryset)
+                if self._single_fk is not None:
                     form.fields[f].initial = self._single_fk
             # handle single value fk.
             if form.fields[f].initial is None:
@@ -5,16 +5,14 @@ from __future__ import print_function, unicode_literals
 
 import os
 from datetime import date
-from decimal import Decimal
 
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import DatabaseError, models
 from django.urls import reverse
 from django.utils.encoding import python_2_unicode_compatible
-from django.utils.timezone import localtime, now
 from people.models import Person
 
-from . import conf, signals
+from . import conf, flags, funding_totals, money, signals
 from .choices import (
     MSC_PROGRAM_CHOICES,
     PHD_PROGRAM_CHOICES,
@@ -106,28 +104,68 @@ class GraduateStudent(GSBaseModel):
         blank=True, help_text="(Optional) a link to the thesis."
     )
 
+    # The totals of the active funding; maintained by ``funding_totals``.
+    funding_total = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        editable=False,
+        db_index=True,
+        verbose_name="total funding",
+    )
+    funding_count = models.PositiveIntegerField(default=0, editable=False)
+    funding_start = models.DateField(blank=True, null=True, editable=False)
+    funding_end = models.DateField(blank=True, null=True, editable=False)
+
     objects = GraduateStudentManager()
 
     class Meta:
         ordering = ("-program", "-status", "person")
         base_manager_name = "objects"
+        indexes = [
+            # keyset pagination of the alumni list:
+            models.Index(
+                fields=["status", "-graduation_date", "id"],
+                name="gradstudent_alumni_keyset",
+            )
+        ]
 
     def __str__(self):
         return "{}".format(self.person)
 
-    def clean(self, *args, **kwargs):
+    def save(self, *args, **kwargs):
         """
-        Update the person's group, based on program and status.
+        The funding totals are only written by ``funding_totals``: saving
+        an existing student (which may have been loaded before its funding
+        changed) leaves them alone.
         """
-        try:
-            if self.status == "G":
-                self.person.add_flag_by_name("alumni")
-            if self.status not in ["P", "S"]:
-                self.person.remove_flag_by_name("gradstudent")
-        except Person.DoesNotExist:
-            # This happens for certain improperly submitted forms.
-            pass
-        return super(GraduateStudent, self).clean(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = [
+                name for name in update_fields if name not in funding_totals.FIELDS
+            ]
+        elif (
+            not self._state.adding
+            and not kwargs.get("force_insert")
+            and not self.get_deferred_fields()
+        ):
+            fields = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in funding_totals.FIELDS
+            ]
+            try:
+                return super(GraduateStudent, self).save(
+                    *args, **dict(kwargs, update_fields=fields)
+                )
+            except DatabaseError as error:
+                # "did not affect any rows": the row is gone, so insert it,
+                # as a plain save would.
+                if type(error) is not DatabaseError:
+                    raise
+                if type(self)._base_manager.filter(pk=self.pk).exists():
+                    raise
+        return super(GraduateStudent, self).save(*args, **kwargs)
 
     def get_absolute_url(self):
         return reverse("gradstudent-detail", kwargs={"pk": self.pk})
@@ -138,25 +176,43 @@ class GraduateStudent(GSBaseModel):
     def is_phd(self):
         return self.program in [e[0] for e in PHD_PROGRAM_CHOICES]
 
+    def funding_summary(self):
+        """
+        The summary of this student's active funding, with a per-source
+        breakdown (see ``FundingQuerySet.summary()``).
+        This is a single query, done once per instance.
+        """
+        if not hasattr(self, "_funding_summary"):
+            if self.pk is None:
+                self._funding_summary = Funding.objects.none().summary()
+            else:
+                self._funding_summary = self.funding_set.active().summary()
+        return self._funding_summary
+
     def total_funding(self):
-        return self.funding_set.active().sum()
+        return self.funding_total
 
     # total_funding.short_description = "Total funding"
 
     def current_funding(self):
-        funding_list = self.funding_set.active()
-        date_range = [self.earliest_funding(), localtime(now()).date()]
-        return funding_list.sum_for_range(date_range)
+        summary = self.funding_summary()
+        if summary.earliest is None:
+            raise Funding.DoesNotExist("No funding")
+        return summary.current
 
     current_funding.help = "Funding payed out as of today"
 
     def earliest_funding(self):
-        return self.funding_set.active().earliest_start_date()
+        if not self.funding_count:
+            raise Funding.DoesNotExist("No funding")
+        return self.funding_start
 
     earliest_funding.short_description = "Started on"
 
     def most_recent_funding(self):
-        return self.funding_set.active().latest_end_date()
+        if not self.funding_count:
+            raise Funding.DoesNotExist("No funding")
+        return self.funding_end
 
     most_recent_funding.short_description = "Up to"
 
@@ -166,6 +222,25 @@ if conf.get("autocreate_on_gradstudent_flag"):
         signals.person_m2m_changed_autocreate_graduatestudent,
         sender=Person.flags.through,
     )
+    for signal in [models.signals.post_save, models.signals.post_delete]:
+        signal.connect(
+            flags.clear_flag_pk_cache,
+            sender=Person._meta.get_field("flags").remote_field.model,
+        )
+
+models.signals.m2m_changed.connect(
+    signals.graduatestudent_advisor_m2m_changed, sender=GraduateStudent.advisor.through
+)
+models.signals.post_save.connect(
+    signals.graduatestudent_post_save_reconcile_flags, sender=GraduateStudent
+)
+for signal in [models.signals.post_save, models.signals.post_delete]:
+    for sender in [
+        GraduateStudent,
+        Person,
+        Person._meta.get_field("email").remote_field.model,
+    ]:
+        signal.connect(signals.mailing_lists_changed, sender=sender)
 
 #######################################################################
 
@@ -236,6 +311,14 @@ class Funding(GSBaseModel):
         verbose_name_plural = "funding"
         base_manager_name = "objects"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Funding, cls).from_db(db, field_names, values)
+        # the loaded values, for the funding totals signal receivers:
+        if not instance.get_deferred_fields():
+            instance._funding_totals_key = funding_totals.funding_key(instance)
+        return instance
+
     def __str__(self):
         return "$%2.2d for %s from %s" % (
             self.amount,
@@ -257,24 +340,15 @@ class Funding(GSBaseModel):
         """
         Compute the amount of funding for the given date range.
         """
-        dt_start, dt_end = date_range
-        if self.end_date is None:
-            # one time funding... is it in the date range or not?
-            if dt_start <= self.start_date <= dt_end:
-                return self.amount
-            else:
-                return Decimal("0.00")
-        # ongoing funding -- compute daily amount
-        days = (self.end_date - self.start_date).days + 1  # always inclusive
-        assert days != 0, "this makes no sense"  # should not happen w/ valid inst
-        daily_amount = self.amount / days
-        # compute the number of days of overlap:
-        overlap_start = max([dt_start, self.start_date])
-        overlap_end = min([dt_end, self.end_date])
-        overlap_days = (overlap_end - overlap_start).days + 1  # always inclusive
-        # compute!
-        return (overlap_days * daily_amount).quantize(Decimal(".01"))
+        cents = money.for_range(
+            money.to_cents(self.amount), self.start_date, self.end_date, date_range
+        )
+        return money.from_cents(cents)
+
 
+models.signals.pre_save.connect(signals.funding_pre_save_totals, sender=Funding)
+models.signals.post_save.connect(signals.funding_post_save_totals, sender=Funding)
+models.signals.post_delete.connect(signals.funding_post_delete_totals, sender=Funding)
 
 #######################################################################
 
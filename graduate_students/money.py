@@ -0,0 +1,94 @@
+"""
+Funding arithmetic in integer cents.
+
+Funding amounts are stored with two decimal places, so they can be
+represented exactly as an integer number of cents.  Prorating and
+summing integers is several times faster than doing the same with
+``Decimal``; amounts are only converted back to ``Decimal`` at the
+output edge (``from_cents()``).
+
+Rounding rule:
+    The prorated amount for ``overlap_days`` of funding spread evenly
+    over ``days`` is ``cents * overlap_days / days``, rounded to the
+    nearest cent, with exact half cent ties rounded to even.
+    This is what ``(overlap_days * (amount / days)).quantize(Decimal(".01"))``
+    computes, *except* for exact ties where ``amount / days`` does not
+    terminate: the 28 digit rounding of the daily amount then decides the
+    tie.  So that results always match the historical computation to the
+    cent, exact ties (which are rare) are computed the historical way.
+"""
+from __future__ import print_function, unicode_literals
+
+from decimal import Decimal
+
+#######################################################################
+
+CENT = Decimal(".01")
+
+#######################################################################
+
+
+def to_cents(amount):
+    """
+    Convert a ``Decimal`` amount into an integer number of cents.
+    """
+    return int(amount.quantize(CENT).scaleb(2))
+
+
+def from_cents(cents):
+    """
+    Convert an integer number of cents into a ``Decimal`` amount
+    (with two decimal places).
+    """
+    return Decimal(cents).scaleb(-2)
+
+
+#######################################################################
+
+
+def _decimal_prorate(cents, days, overlap_days):
+    """
+    The historical ``Decimal`` computation; used to break exact ties.
+    """
+    daily_amount = from_cents(cents) / days
+    return to_cents((overlap_days * daily_amount).quantize(CENT))
+
+
+def prorate(cents, days, overlap_days):
+    """
+    The amount, in cents, for ``overlap_days`` of ``cents`` spread evenly
+    over ``days``.  See the module documentation for the rounding rule.
+    """
+    numerator = cents * overlap_days
+    quotient, remainder = divmod(abs(numerator), days)
+    if 2 * remainder == days:
+        return _decimal_prorate(cents, days, overlap_days)
+    if 2 * remainder > days:
+        quotient += 1
+    if numerator < 0:
+        return -quotient
+    return quotient
+
+
+def for_range(cents, start_date, end_date, date_range):
+    """
+    Compute the amount of funding, in cents, for the given date range.
+    ``end_date`` is None for one time funding.
+    (See ``Funding.for_range()``.)
+    """
+    dt_start, dt_end = date_range
+    if end_date is None:
+        # one time funding... is it in the date range or not?
+        if dt_start <= start_date <= dt_end:
+            return cents
+        return 0
+    # ongoing funding
+    days = (end_date - start_date).days + 1  # always inclusive
+    assert days != 0, "this makes no sense"  # should not happen w/ valid inst
+    overlap_start = max(dt_start, start_date)
+    overlap_end = min(dt_end, end_date)
+    overlap_days = (overlap_end - overlap_start).days + 1  # always inclusive
+    return prorate(cents, days, overlap_days)
+
+
+#######################################################################
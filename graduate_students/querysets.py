@@ -1,13 +1,17 @@
 from __future__ import print_function, unicode_literals
 
 import datetime
+import heapq
 import operator
+from collections import OrderedDict
 from functools import reduce
 
 # from django.core.exceptions import ValidationError
 from django.db.models import Q
 from django.db.models.query import QuerySet
+from django.utils.timezone import localtime, now
 
+from . import money
 from .choices import MSC_PROGRAM_CHOICES, PHD_PROGRAM_CHOICES
 
 """
@@ -102,6 +106,7 @@ class GraduateStudentQuerySet(BaseCustomQuerySet):
     * active
     * phd_filter
     * msc_filter
+    * supervised_by
     * alumni_filter
     * graduates
 
@@ -123,6 +128,14 @@ class GraduateStudentQuerySet(BaseCustomQuerySet):
         qs = qs.filter(program__in=[e[0] for e in MSC_PROGRAM_CHOICES])
         return qs
 
+    def supervised_by(self, advisors, status="S"):
+        """
+        The students of any of the advisors (a queryset or list of people),
+        in one joined query.
+        """
+        qs = self.active(status=status).filter(advisor__in=advisors)
+        return qs.select_related("person").distinct()
+
     def in_range(self, date_range, grad_date_adjustment=0):
         """
         Case 1: student start date in date range
@@ -191,6 +204,38 @@ class GraduateStudentQuerySet(BaseCustomQuerySet):
         return qs
 
 
+#######################################################################
+
+TIMESERIES_FREQUENCIES = {"month": 1, "quarter": 3, "year": 12}
+
+
+def date_buckets(start, end, freq="month"):
+    """
+    Split the date range [start, end] into consecutive (inclusive)
+    [bucket_start, bucket_end] ranges of calendar months, quarters or
+    years.  The first and last buckets are clipped to the range.
+    """
+    try:
+        months = TIMESERIES_FREQUENCIES[freq]
+    except KeyError:
+        raise ValueError("Unknown time series frequency: {!r}".format(freq))
+    buckets = []
+    # the first day of the calendar bucket containing ``start``:
+    month = start.month - (start.month - 1) % months
+    bucket_start = datetime.date(start.year, month, 1)
+    while bucket_start <= end:
+        month = bucket_start.month - 1 + months
+        next_start = datetime.date(bucket_start.year + month // 12, month % 12 + 1, 1)
+        buckets.append(
+            [
+                max(bucket_start, start),
+                min(next_start - datetime.timedelta(days=1), end),
+            ]
+        )
+        bucket_start = next_start
+    return buckets
+
+
 #######################################################################
 
 
@@ -203,6 +248,50 @@ class FundingSourceQuerySet(BaseCustomQuerySet):
 #######################################################################
 
 
+class FundingSummary(object):
+    """
+    Running totals for a group of funding records; see
+    ``FundingQuerySet.summaries()``.
+    """
+
+    def __init__(self, as_of):
+        self.as_of = as_of
+        self.count = 0
+        self.total_cents = 0
+        self.current_cents = 0
+        self.earliest = None
+        self.most_recent = None
+        # per-source breakdown: a list of (source name, FundingSummary);
+        # see ``FundingQuerySet.summary()``.
+        self.sources = []
+
+    def add(self, cents, start_date, end_date):
+        self.count += 1
+        self.total_cents += cents
+        if start_date <= self.as_of:
+            # this is ``current_funding()``: the range starts at the
+            # earliest funding, so it never cuts into this funding's start.
+            self.current_cents += money.for_range(
+                cents, start_date, end_date, [start_date, self.as_of]
+            )
+        last_date = end_date or start_date
+        if self.earliest is None or start_date < self.earliest:
+            self.earliest = start_date
+        if self.most_recent is None or last_date > self.most_recent:
+            self.most_recent = last_date
+
+    @property
+    def total(self):
+        return money.from_cents(self.total_cents)
+
+    @property
+    def current(self):
+        return money.from_cents(self.current_cents)
+
+
+#######################################################################
+
+
 class FundingQuerySet(BaseCustomQuerySet):
     """
     Custom QuerySet for Funding objects.
@@ -237,7 +326,105 @@ class FundingQuerySet(BaseCustomQuerySet):
         Return the sum of all amounts in the current QuerySet; but only
         over the given date range.
         """
-        return sum((f.for_range(date_range) for f in self.in_range(date_range)))
+        # (the pk keeps identical funding rows distinct)
+        values_list = self.in_range(date_range).values_list(
+            "pk", "amount", "start_date", "end_date"
+        )
+        cents = sum(
+            money.for_range(money.to_cents(amount), start_date, end_date, date_range)
+            for pk, amount, start_date, end_date in values_list
+        )
+        return money.from_cents(cents)
+
+    def timeseries(self, start, end, freq="month", group_by=("source",)):
+        """
+        Return the funding in the current QuerySet over [start, end],
+        split into ``freq`` ("month", "quarter" or "year") buckets and
+        grouped by the ``group_by`` fields (e.g., "source__name" or
+        "graduate_student__program").
+
+        The result is a list of (bucket_start, bucket_end, totals) where
+        totals is a dictionary of {group: amount}; group is the tuple of
+        ``group_by`` values.  Each bucket matches ``sum_for_range()``.
+
+        This is one query, followed by a single sweep over the funding
+        sorted by start date: funding enters when its bucket starts and
+        leaves once it has ended.
+        """
+        group_by = list(group_by)
+        buckets = date_buckets(start, end, freq)
+        # (the pk keeps identical funding rows distinct)
+        values_list = self.in_range([start, end]).values_list(
+            "pk", "amount", "start_date", "end_date", *group_by
+        )
+        # rows are: (start date, last date, end date, cents, group...)
+        rows = sorted(
+            (
+                (v[2], v[3] or v[2], v[3], money.to_cents(v[1])) + tuple(v[4:])
+                for v in values_list
+            ),
+            key=operator.itemgetter(0),
+        )
+        result = []
+        ending = []  # heap of (last date, row index)
+        active = {}
+        next_row = 0
+        for bucket_start, bucket_end in buckets:
+            # funding which has started...
+            while next_row < len(rows) and rows[next_row][0] <= bucket_end:
+                heapq.heappush(ending, (rows[next_row][1], next_row))
+                active[next_row] = rows[next_row]
+                next_row += 1
+            # ...less funding which has ended:
+            while ending and ending[0][0] < bucket_start:
+                active.pop(heapq.heappop(ending)[1])
+            totals = {}
+            for row in active.values():
+                group = row[4:]
+                totals[group] = totals.get(group, 0) + money.for_range(
+                    row[3], row[0], row[2], [bucket_start, bucket_end]
+                )
+            totals = dict((k, money.from_cents(v)) for k, v in totals.items())
+            result.append((bucket_start, bucket_end, totals))
+        return result
+
+    def summaries(self, key="graduate_student_id", as_of=None):
+        """
+        Return a dictionary of {key value: FundingSummary} for the
+        funding in the current QuerySet, in a single query.
+        ``as_of`` (default: today) is the date for the current totals.
+        """
+        if as_of is None:
+            as_of = localtime(now()).date()
+        result = {}
+        values_list = self.values_list(key, "amount", "start_date", "end_date")
+        for value, amount, start_date, end_date in values_list:
+            if value not in result:
+                result[value] = FundingSummary(as_of)
+            result[value].add(money.to_cents(amount), start_date, end_date)
+        return result
+
+    def summary(self, as_of=None):
+        """
+        Return a FundingSummary of the funding in the current QuerySet,
+        with a per-source breakdown (``sources``), in a single query.
+        ``as_of`` (default: today) is the date for the current totals.
+        """
+        if as_of is None:
+            as_of = localtime(now()).date()
+        summary = FundingSummary(as_of)
+        sources = OrderedDict()
+        values_list = self.order_by(
+            "source__ordering", "source__name", "source_id"
+        ).values_list("source_id", "source__name", "amount", "start_date", "end_date")
+        for source_id, name, amount, start_date, end_date in values_list:
+            cents = money.to_cents(amount)
+            summary.add(cents, start_date, end_date)
+            if source_id not in sources:
+                sources[source_id] = (name, FundingSummary(as_of))
+            sources[source_id][1].add(cents, start_date, end_date)
+        summary.sources = list(sources.values())
+        return summary
 
     def earliest_start_date(self):
         """
@@ -251,9 +438,14 @@ class FundingQuerySet(BaseCustomQuerySet):
         (If the latest funding was a one off, this will be a start date,
         not an end date.)
         """
-        start = self.latest("start_date").end_date
-        end = self.exclude(end_date=None).latest("end_date").end_date
-        return max([start, end])
+        latest = self.latest("start_date")
+        dates = [latest.end_date or latest.start_date]
+        dates += (
+            self.exclude(end_date=None)
+            .order_by("-end_date")
+            .values_list("end_date", flat=True)[:1]
+        )
+        return max(dates)
 
 
 #######################################################################
@@ -1,5 +1,8 @@
 from __future__ import print_function, unicode_literals
 
+import threading
+from contextlib import contextmanager
+
 from django.utils.timezone import is_aware, localtime, now
 
 """
@@ -8,6 +11,8 @@ Receiver functions for signals.
 
 ################################################################
 
+_local = threading.local()
+
 ################################################################
 
 
@@ -26,23 +31,183 @@ def person_m2m_changed_autocreate_graduatestudent(
     sender, instance, action, reverse, model, pk_set, **kwargs
 ):
     """
-    This could be better, but works for now.
-    
     ``action``s:
-    * ``post_add`` Create a graduate student record, if one does not exist
-        if ``gradstudent`` was one of the flags added.
-        
+    * ``post_add`` Create a graduate student record, for each person
+        who does not have one, if ``gradstudent`` was one of the flags
+        added.
+
+    Flags can be added to one person (``person.flags.add(...)``) or, in
+    reverse, to any number of people (``flag.person_set.add(...)``);
+    either way, the missing records are created with one
+    ``bulk_create()``.  Changes to other flags return without a query.
+
     This *will not* create duplicate graduate students.
     """
-    if action == "post_add":
-        flag_qs = model.objects.filter(pk__in=pk_set)
-        if flag_qs.filter(slug="gradstudent").exists():
-            if not instance.graduatestudent_set.all().exists():
-                from .models import GraduateStudent
+    from .flags import get_flag_pk
+
+    if action != "post_add" or not pk_set:
+        return
+    if getattr(_local, "autocreate_suspended", False):
+        return
+    flag_pk = get_flag_pk("gradstudent")
+    if flag_pk is None:
+        return
+    if reverse:
+        if instance.pk != flag_pk:
+            return
+        person_ids = set(pk_set)
+    else:
+        if flag_pk not in pk_set:
+            return
+        person_ids = set([instance.pk])
+    autocreate_graduatestudents(person_ids)
+
+
+def autocreate_graduatestudents(person_ids):
+    """
+    Create a graduate student record for each of the people (by pk) who
+    do not have one.
+    """
+    from .models import GraduateStudent
+
+    existing = GraduateStudent.objects.filter(person_id__in=person_ids).values_list(
+        "person_id", flat=True
+    )
+    start_date = today()
+    GraduateStudent.objects.bulk_create(
+        [
+            GraduateStudent(person_id=person_id, start_date=start_date)
+            for person_id in sorted(set(person_ids) - set(existing))
+        ]
+    )
+
+
+@contextmanager
+def autocreate_suspended():
+    """
+    Do not autocreate graduate student records (in this thread) within
+    this block; e.g., while importing graduate students in bulk.
+    """
+    previous = getattr(_local, "autocreate_suspended", False)
+    _local.autocreate_suspended = True
+    try:
+        yield
+    finally:
+        _local.autocreate_suspended = previous
+
+
+################################################################
+
+
+def graduatestudent_post_save_reconcile_flags(sender, instance, raw=False, **kwargs):
+    """
+    Update the person's flags, based on status, when the transaction
+    commits.  (Only a status other than pending or current can change
+    the flags.)
+    """
+    from .flags import reconcile_flags_on_commit
+
+    if raw or instance.status in ["P", "S"]:
+        return
+    reconcile_flags_on_commit([instance.person_id])
+
+
+################################################################
+
+
+def graduatestudent_advisor_m2m_changed(
+    sender, instance, action, reverse, model, pk_set, **kwargs
+):
+    """
+    Bump the modification time of graduate students whose advisors
+    change, so that the versions of their public pages change.
+    (See ``caching``.)
+    """
+    from .models import GraduateStudent
+
+    if action not in ["post_add", "post_remove", "pre_clear"]:
+        return
+    if not reverse:
+        queryset = GraduateStudent.objects.filter(pk=instance.pk)
+    elif action == "pre_clear":
+        queryset = GraduateStudent.objects.filter(advisor=instance)
+    else:
+        queryset = GraduateStudent.objects.filter(pk__in=pk_set)
+    queryset.update(modified=now())
+
+
+################################################################
+
+
+def _refresh_funding_totals(funding):
+    """
+    Refresh the totals of the funding's graduate student instance, if it
+    is in memory.
+    """
+    from .funding_totals import FIELDS
+
+    if not funding.__class__.graduate_student.is_cached(funding):
+        return
+    student = funding.graduate_student
+    values = (
+        student.__class__.objects.filter(pk=student.pk).values(*FIELDS).first() or {}
+    )
+    for name, value in values.items():
+        setattr(student, name, value)
+    student.__dict__.pop("_funding_summary", None)
+
+
+def funding_pre_save_totals(sender, instance, raw=False, **kwargs):
+    """
+    Note the funding's values as they are in the database (when they
+    were not loaded with the instance).
+    """
+    from .funding_totals import funding_key
+
+    if raw or instance._state.adding:
+        instance._funding_totals_key = None
+    elif not hasattr(instance, "_funding_totals_key"):
+        old = sender.objects.filter(pk=instance.pk).first()
+        instance._funding_totals_key = funding_key(old) if old is not None else None
+
+
+def funding_post_save_totals(sender, instance, raw=False, **kwargs):
+    """
+    Update the graduate student's funding totals (see ``funding_totals``).
+    """
+    from .funding_totals import changed, funding_key
+
+    if raw:
+        return
+    new = funding_key(instance)
+    if instance._funding_totals_key != new:
+        changed(instance._funding_totals_key, new)
+        _refresh_funding_totals(instance)
+    instance._funding_totals_key = new
+
+
+def funding_post_delete_totals(sender, instance, **kwargs):
+    """
+    Update the graduate student's funding totals (see ``funding_totals``).
+    """
+    from .funding_totals import funding_key, remove
+
+    key = getattr(instance, "_funding_totals_key", None) or funding_key(instance)
+    remove(key)
+    _refresh_funding_totals(instance)
+
+
+################################################################
+
+
+def mailing_lists_changed(sender, **kwargs):
+    """
+    A graduate student, person or email address changed: the mailing lists
+    need to be regenerated.
+    """
+    from .mailing_lists import lists_changed
 
-                GraduateStudent.objects.get_or_create(
-                    person=instance, defaults={"start_date": today()}
-                )
+    lists_changed()
 
 
 ################################################################
@@ -1,12 +1,22 @@
 #######################
 from __future__ import print_function, unicode_literals
 
+import threading
+
 from django import template
+from django.core.exceptions import EmptyResultSet
+from django.core.signals import request_finished, request_started
+from django.db.models import Prefetch
+from django.db.models.query import QuerySet
 
 from ..models import GraduateStudent
 
 #######################
 
+# (advisors, status): graduate students, memoized for the current request.
+# ``memo`` is None outside of requests.
+_local = threading.local()
+
 #####################################################################
 
 register = template.Library()
@@ -14,18 +24,171 @@ register = template.Library()
 #####################################################################
 
 
+def _start_memo(**kwargs):
+    _local.memo = {}
+
+
+def _end_memo(**kwargs):
+    _local.memo = None
+
+
+request_started.connect(_start_memo, dispatch_uid="gradstudents_tags_memo_start")
+request_finished.connect(_end_memo, dispatch_uid="gradstudents_tags_memo_end")
+
+
+def _memo_key(person_qs, status):
+    """
+    Equal querysets (or lists of the same people) have the same key.
+    """
+    if isinstance(person_qs, QuerySet):
+        sql, params = person_qs.values("pk").query.sql_with_params()
+        return (sql, tuple(params), status)
+    return (tuple(getattr(p, "pk", p) for p in person_qs), status)
+
+
+#####################################################################
+
+
+def supervised_attr(status):
+    """
+    The attribute ``prefetch_graduate_students()`` sets on each person.
+    """
+    return "supervised_graduatestudent_list_{}".format(status)
+
+
+def prefetch_graduate_students(person_qs, status="S"):
+    """
+    For pages which render many advisors: prefetch (in one query) the
+    graduate students of each person in the queryset, for use by
+    ``get_graduate_students``.
+    """
+    return person_qs.prefetch_related(
+        Prefetch(
+            "supervisor",
+            queryset=GraduateStudent.objects.active(status=status),
+            to_attr=supervised_attr(status),
+        )
+    )
+
+
+def _prefetched(person_qs, status):
+    """
+    The people, when they have all been fetched with their students.
+    """
+    if isinstance(person_qs, QuerySet):
+        people = person_qs._result_cache
+    else:
+        people = person_qs
+    if people is None:
+        return None
+    attr = supervised_attr(status)
+    if all(hasattr(person, attr) for person in people):
+        return people
+    return None
+
+
+def prefetch_active_graduatestudents(person_qs):
+    """
+    For pages which render many people (e.g., with the
+    ``includes/profile.html`` template): prefetch (in one query) each
+    person's own active graduate student records, for use by
+    ``active_graduatestudents``.
+    """
+    return person_qs.prefetch_related(
+        Prefetch(
+            "graduatestudent_set",
+            queryset=GraduateStudent.objects.active(),
+            to_attr="active_graduatestudent_list",
+        )
+    )
+
+
+def _ordering(model, prefix=""):
+    """
+    The model's ``Meta.ordering`` as (attribute path, descending) pairs;
+    relations are expanded to their model's ordering, as the database
+    orders them.
+    """
+    result = []
+    for name in model._meta.ordering or ["pk"]:
+        descending = name.startswith("-")
+        name = name.lstrip("-")
+        field = model._meta.pk if name == "pk" else model._meta.get_field(name)
+        if field.is_relation:
+            for path, related_descending in _ordering(
+                field.related_model, prefix + name + "."
+            ):
+                result.append((path, related_descending != descending))
+        else:
+            result.append((prefix + field.attname, descending))
+    return result
+
+
+def _sorted(students):
+    """
+    The students in the order of ``GraduateStudent.objects.supervised_by()``.
+    """
+    students = list(students)
+    # (stable sorts, least significant first)
+    for path, descending in reversed(_ordering(GraduateStudent)):
+
+        def key(student, path=path):
+            value = student
+            for attr in path.split("."):
+                value = getattr(value, attr)
+            return (value is not None, value)
+
+        students.sort(key=key, reverse=descending)
+    return students
+
+
+#####################################################################
+
+
+@register.filter
+def active_graduatestudents(person):
+    """
+    The person's active graduate student records; prefetched by
+    ``prefetch_active_graduatestudents()``, or else queried.
+    """
+    if hasattr(person, "active_graduatestudent_list"):
+        return person.active_graduatestudent_list
+    return person.graduatestudent_set.active()
+
+
 @register.filter
 def get_graduate_students(person_qs, status=None):
     """
-    Get a queryset of graduate students from a queryset of
-    supervisors.
+    Get the graduate students of a queryset (or list) of supervisors,
+    as a list, in the order of ``GraduateStudent.objects.supervised_by()``.
+
+    Students are fetched in one joined query, which is memoized for the
+    rest of the request; or are taken from the people, when they were
+    fetched with ``prefetch_graduate_students()``.
     """
     if status is None:
         status = "S"  # current students
 
-    supervisor_values = person_qs.values_list("supervisor", flat=True)
-    grad_qs = GraduateStudent.objects.active(status=status)
-    return grad_qs.filter(pk__in=supervisor_values)
+    people = _prefetched(person_qs, status)
+    if people is not None:
+        students = {}
+        for person in people:
+            for student in getattr(person, supervised_attr(status)):
+                students.setdefault(student.pk, student)
+        return _sorted(students.values())
+
+    memo = getattr(_local, "memo", None)
+    if memo is None:
+        return list(GraduateStudent.objects.supervised_by(person_qs, status=status))
+    try:
+        key = _memo_key(person_qs, status)
+    except EmptyResultSet:  # e.g., ``Person.objects.none()``
+        return []
+    if key not in memo:
+        memo[key] = list(
+            GraduateStudent.objects.supervised_by(person_qs, status=status)
+        )
+    return memo[key]
 
 
 #####################################################################
@@ -1,7 +1,65 @@
 from __future__ import print_function, unicode_literals
 
-from django.test import TestCase
+import datetime
+import io
+import zipfile
+from collections import OrderedDict
+from decimal import Decimal
+from unittest import skipIf
 
+from django.conf.urls import include, url
+from django.contrib import admin
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.template import Context, Template
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from people.models import Person
+
+from . import (
+    conf,
+    funding_checks,
+    funding_totals,
+    instrumentation,
+    mailing_lists,
+    money,
+    proration,
+    utils,
+)
+from .admin import GraduateStudentAdmin
+from .caching import get_version
+from .cli import benchmark
+from .flags import _flagged_people, get_flag, get_flag_pk
+from .forms import FundingReportForm
+from .importing import CohortImporter, FundingImporter, read_rows
+from .mixins.cbv_admin import admin_view_class
+from .mixins.restricted_forms import is_multivalued_lookup, restrict_queryset
+from .mixins.single_fk import SingleFKAdminMixin
+from .models import (
+    Funding,
+    FundingSource,
+    GraduateStudent,
+    Milestone,
+    MilestoneType,
+)
+from .querysets import date_buckets
+from .templatetags import gradstudents_tags
+from .utils import load_funding_rows, make_funding_bundle, make_funding_spreadsheet
+from .utils.synthetic import make_department, make_person
+from .views import (
+    FundingReportAdminView,
+    GraduateStudentAlumniListView,
+    GraduateStudentDetailView,
+    graduate_student_detail_dependencies,
+)
 
 """
 This file demonstrates writing tests using the unittest module. These will pass
@@ -17,3 +75,1536 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+#######################################################################
+
+
+class MoneyTest(SimpleTestCase):
+    def _decimal_for_range(self, amount, start_date, end_date, date_range):
+        """
+        The historical Decimal proration from ``Funding.for_range()``.
+        """
+        days = (end_date - start_date).days + 1
+        daily_amount = amount / days
+        overlap_start = max([date_range[0], start_date])
+        overlap_end = min([date_range[1], end_date])
+        overlap_days = (overlap_end - overlap_start).days + 1
+        return (overlap_days * daily_amount).quantize(Decimal(".01"))
+
+    def test_cents_round_trip(self):
+        for amount in ["0.00", "0.01", "-12.50", "999999.99"]:
+            self.assertEqual(
+                money.from_cents(money.to_cents(Decimal(amount))), Decimal(amount)
+            )
+
+    def test_prorate_matches_decimal(self):
+        start_date = datetime.date(2017, 9, 1)
+        for amount in ["0.01", "0.05", "1.00", "333.33", "17500.00", "-250.00"]:
+            for length in [1, 2, 5, 6, 29, 364]:
+                end_date = start_date + datetime.timedelta(days=length)
+                for overlap in range(0, length + 1, max(1, length // 7)):
+                    date_range = [
+                        start_date + datetime.timedelta(days=overlap),
+                        end_date + datetime.timedelta(days=30),
+                    ]
+                    expected = self._decimal_for_range(
+                        Decimal(amount), start_date, end_date, date_range
+                    )
+                    cents = money.for_range(
+                        money.to_cents(Decimal(amount)),
+                        start_date,
+                        end_date,
+                        date_range,
+                    )
+                    self.assertEqual(money.from_cents(cents), expected)
+
+    def test_one_time_funding(self):
+        date_range = [datetime.date(2018, 1, 1), datetime.date(2018, 1, 31)]
+        self.assertEqual(
+            money.for_range(500, datetime.date(2018, 1, 31), None, date_range), 500
+        )
+        self.assertEqual(
+            money.for_range(500, datetime.date(2018, 2, 1), None, date_range), 0
+        )
+
+
+#######################################################################
+
+
+class ProrationEngineTest(SimpleTestCase):
+    class Row(object):
+        def __init__(self, gs_id, source_id, cents, start_date, end_date):
+            self.graduate_student_id = gs_id
+            self.source_id = source_id
+            self.cents = cents
+            self.start_date = start_date
+            self.end_date = end_date
+
+    def setUp(self):
+        start = datetime.date(2016, 9, 1)
+        self.rows = []
+        for i in range(60):
+            start_date = start + datetime.timedelta(days=17 * i)
+            end_date = None if i % 7 == 0 else start_date + datetime.timedelta(i * 5)
+            self.rows.append(
+                self.Row(i % 5, i % 3, 100001 * i + 1, start_date, end_date)
+            )
+        self.periods = [
+            [datetime.date(y, m, 1), datetime.date(y, m, 28)]
+            for y in [2016, 2017, 2018]
+            for m in range(1, 13)
+        ]
+
+    def test_python_engine_matches_for_range(self):
+        results = proration.PythonEngine().prorate(self.rows, self.periods)
+        for period, result in zip(self.periods, results):
+            expected = {}
+            for row in self.rows:
+                if not proration._overlaps(row, period):
+                    continue
+                key = (row.graduate_student_id, row.source_id)
+                expected[key] = expected.get(key, 0) + money.for_range(
+                    row.cents, row.start_date, row.end_date, period
+                )
+            expected = dict((k, v) for k, v in expected.items() if v)
+            self.assertEqual(result, expected)
+
+    @skipIf(proration.numpy is None, "NumPy is not installed")
+    def test_numpy_engine_matches_python_engine(self):
+        self.assertEqual(
+            proration.NumpyEngine().prorate(self.rows, self.periods),
+            proration.PythonEngine().prorate(self.rows, self.periods),
+        )
+
+
+#######################################################################
+
+
+class DateBucketsTest(SimpleTestCase):
+    def test_monthly_buckets_are_clipped(self):
+        buckets = date_buckets(
+            datetime.date(2017, 9, 15), datetime.date(2017, 11, 3), "month"
+        )
+        self.assertEqual(
+            buckets,
+            [
+                [datetime.date(2017, 9, 15), datetime.date(2017, 9, 30)],
+                [datetime.date(2017, 10, 1), datetime.date(2017, 10, 31)],
+                [datetime.date(2017, 11, 1), datetime.date(2017, 11, 3)],
+            ],
+        )
+
+    def test_quarters_span_years(self):
+        buckets = date_buckets(
+            datetime.date(2017, 11, 1), datetime.date(2018, 4, 1), "quarter"
+        )
+        self.assertEqual(
+            [b[0] for b in buckets],
+            [
+                datetime.date(2017, 11, 1),
+                datetime.date(2018, 1, 1),
+                datetime.date(2018, 4, 1),
+            ],
+        )
+
+
+#######################################################################
+
+
+class GraduateStudentDetailViewTest(TestCase):
+    def make_student(self, name, n_advisors, n_milestones):
+        student = GraduateStudent.objects.create(
+            person=make_person(name), start_date=datetime.date(2017, 9, 1), status="S"
+        )
+        for i in range(n_advisors):
+            student.advisor.add(make_person("{} Advisor{}".format(name, i)))
+        milestone_type = MilestoneType.objects.get_or_create(
+            slug="candidacy", defaults={"name": "Candidacy"}
+        )[0]
+        for i in range(n_milestones):
+            Milestone.objects.create(graduate_student=student, type=milestone_type)
+        return student
+
+    def count_queries(self, student):
+        """
+        Count the queries for the view, and for using everything the
+        template uses.
+        """
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        with CaptureQueriesContext(connection) as queries:
+            response = GraduateStudentDetailView.as_view()(request, pk=student.pk)
+            context = response.context_data
+            "{}".format(context["graduatestudent"].person.email)
+            [("{}".format(adv), url) for adv, url in context["advisor_list"]]
+            ["{}".format(m.type) for m in context["milestone_list"]]
+        return len(queries)
+
+    def test_query_budget(self):
+        small = self.count_queries(self.make_student("Ada Small", 1, 1))
+        large = self.count_queries(self.make_student("Bea Large", 6, 9))
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 5)
+
+
+#######################################################################
+
+
+class PageVersionTest(TestCase):
+    def test_advisor_change_changes_version(self):
+        student = GraduateStudent.objects.create(
+            person=make_person("Cy Version"), start_date=datetime.date(2017, 9, 1)
+        )
+        dependencies = [(GraduateStudent.objects.all(), ["modified"])]
+        before = get_version(dependencies)[1]
+        self.assertEqual(before, get_version(dependencies)[1])
+        student.advisor.add(make_person("Di Advisor"))
+        self.assertNotEqual(before, get_version(dependencies)[1])
+
+    def test_deleted_milestone_changes_version(self):
+        student = GraduateStudent.objects.create(
+            person=make_person("Ed Version"), start_date=datetime.date(2017, 9, 1)
+        )
+        milestone_type = MilestoneType.objects.create(name="Proposal", slug="proposal")
+        older, newer = [
+            Milestone.objects.create(graduate_student=student, type=milestone_type)
+            for i in range(2)
+        ]
+        Milestone.objects.filter(pk=newer.pk).update(
+            modified=older.modified + datetime.timedelta(days=1)
+        )
+
+        def version():
+            return get_version(graduate_student_detail_dependencies(None, student.pk))
+
+        before = version()
+        older.delete()
+        self.assertNotEqual(before[1], version()[1])
+
+
+#######################################################################
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "mailing-lists-test",
+        }
+    }
+)
+class MailingListsTest(TestCase):
+    def make_student(self, name, program, status="S", address=None):
+        person = make_person(name)
+        if address is not None:
+            EmailAddress = Person._meta.get_field("email").remote_field.model
+            person.email = EmailAddress.objects.create(address=address)
+            person.save()
+        return GraduateStudent.objects.create(
+            person=person,
+            program=program,
+            status=status,
+            start_date=datetime.date(2018, 9, 1),
+        )
+
+    def test_mailing_lists(self):
+        phd = self.make_student("Phil Doc", "P", address="phil@example.com")
+        self.make_student("Mia Sci", "M", address="mia@example.com")
+        self.make_student("Gus Grad", "P", status="G", address="gus@example.com")
+        self.make_student("Ned None", "M")
+        lists = mailing_lists.get_mailing_lists()
+        self.assertEqual(lists["phd-students"], ["phil@example.com"])
+        self.assertEqual(lists["msc-students"], ["mia@example.com"])
+        domain = conf.get("mailing_lists:domain")
+        self.assertEqual(
+            lists["grad-students"],
+            ["phd-students@" + domain, "msc-students@" + domain],
+        )
+        # polling only checks the version:
+        with self.assertNumQueries(1):
+            self.assertEqual(mailing_lists.get_mailing_lists(), lists)
+
+        # student and person changes change the lists:
+        phd.status = "VW"
+        phd.save()
+        self.assertEqual(mailing_lists.get_mailing_lists()["phd-students"], [])
+        email = GraduateStudent.objects.get(person__cn="Mia Sci").person.email
+        email.address = "mia.sci@example.com"
+        email.save()
+        self.assertEqual(
+            mailing_lists.get_mailing_lists()["msc-students"], ["mia.sci@example.com"]
+        )
+
+    def test_version(self):
+        student = self.make_student("Vi Version", "M", address="vi@example.com")
+        cache.clear()  # e.g., a new process, with its own local memory cache
+        with self.assertNumQueries(1):
+            version = mailing_lists.get_version()
+        cache.clear()
+        self.assertEqual(mailing_lists.get_version(), version)
+        email = student.person.email
+        email.address = "vi.version@example.com"
+        email.save()
+        self.assertNotEqual(mailing_lists.get_version(), version)
+        version = mailing_lists.get_version()
+        student.status = "G"
+        student.save()
+        self.assertNotEqual(mailing_lists.get_version(), version)
+
+    def test_formats(self):
+        lists = OrderedDict([("phd-students", ["a@example.com", "b@example.com"])])
+        self.assertEqual(
+            mailing_lists.as_aliases(lists),
+            "phd-students: a@example.com, b@example.com\n",
+        )
+        ldif = mailing_lists.as_ldif(lists)
+        self.assertIn("dn: cn=phd-students,", ldif)
+        self.assertIn("rfc822MailMember: b@example.com\n", ldif)
+        self.assertEqual(mailing_lists._ldif_line("cn", "Zoë"), "cn:: Wm/Dqw==\n")
+
+
+#######################################################################
+
+
+class GraduateStudentsFilterTest(TestCase):
+    def setUp(self):
+        self.advisors = [make_person("Ava Advisor"), make_person("Bo Advisor")]
+        self.students = []
+        for name, status, advisors in [
+            ("Cal Student", "S", self.advisors[:1]),
+            ("Dee Student", "S", self.advisors),
+            ("Eve Student", "G", self.advisors[1:]),
+        ]:
+            student = GraduateStudent.objects.create(
+                person=make_person(name),
+                status=status,
+                start_date=datetime.date(2018, 9, 1),
+            )
+            student.advisor.set(advisors)
+            self.students.append(student)
+
+    def advisor_qs(self):
+        return Person.objects.filter(pk__in=[a.pk for a in self.advisors])
+
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            students = list(gradstudents_tags.get_graduate_students(self.advisor_qs()))
+            self.assertEqual(
+                sorted(s.person.cn for s in students), ["Cal Student", "Dee Student"]
+            )
+        graduates = gradstudents_tags.get_graduate_students(self.advisor_qs(), "G")
+        self.assertEqual([s.pk for s in graduates], [self.students[2].pk])
+
+    def test_memoized_per_request(self):
+        gradstudents_tags._start_memo()
+        try:
+            list(gradstudents_tags.get_graduate_students(self.advisor_qs()))
+            with self.assertNumQueries(0):
+                list(gradstudents_tags.get_graduate_students(self.advisor_qs()))
+        finally:
+            gradstudents_tags._end_memo()
+        with self.assertNumQueries(1):
+            list(gradstudents_tags.get_graduate_students(self.advisor_qs()))
+
+    def test_no_advisors(self):
+        gradstudents_tags._start_memo()
+        try:
+            for person_qs in [Person.objects.none(), Person.objects.filter(pk__in=[])]:
+                students = gradstudents_tags.get_graduate_students(person_qs)
+                self.assertEqual(list(students), [])
+        finally:
+            gradstudents_tags._end_memo()
+
+    def test_prefetched(self):
+        people = list(gradstudents_tags.prefetch_graduate_students(self.advisor_qs()))
+        with self.assertNumQueries(0):
+            students = gradstudents_tags.get_graduate_students(people)
+            self.assertEqual(
+                sorted(s.pk for s in students), [s.pk for s in self.students[:2]]
+            )
+
+    def test_same_order_on_every_path(self):
+        for name, program in [("Fia Student", "P"), ("Abe Student", "M")]:
+            student = GraduateStudent.objects.create(
+                person=make_person(name),
+                program=program,
+                status="S",
+                start_date=datetime.date(2018, 9, 1),
+            )
+            student.advisor.set(self.advisors)
+        expected = [
+            s.pk for s in GraduateStudent.objects.supervised_by(self.advisor_qs(), "S")
+        ]
+        people = list(gradstudents_tags.prefetch_graduate_students(self.advisor_qs()))
+        prefetched = gradstudents_tags.get_graduate_students(people)
+        queried = gradstudents_tags.get_graduate_students(self.advisor_qs())
+        self.assertIsInstance(prefetched, list)
+        self.assertIsInstance(queried, list)
+        self.assertEqual([s.pk for s in prefetched], expected)
+        self.assertEqual([s.pk for s in queried], expected)
+
+
+#######################################################################
+
+
+class ProfileIncludeTest(TestCase):
+    def test_prefetched_profiles(self):
+        people = []
+        for name in ["Fay Profile", "Gil Profile", "Hana Profile"]:
+            student = GraduateStudent.objects.create(
+                person=make_person(name), start_date=datetime.date(2018, 9, 1)
+            )
+            people.append(student.person)
+        make_person("Ian Staff")
+        template = Template(
+            "{% for person in people %}"
+            + '{% include "graduate_students/includes/profile.html" %}'
+            + "{% endfor %}"
+        )
+        queryset = gradstudents_tags.prefetch_active_graduatestudents(
+            Person.objects.all()
+        )
+        with self.assertNumQueries(2):
+            content = template.render(Context({"people": queryset}))
+        self.assertEqual(content.count("Graduate Student Information"), 3)
+        # and without the prefetch:
+        with self.assertNumQueries(1 + Person.objects.count()):
+            template.render(Context({"people": Person.objects.all()}))
+
+
+#######################################################################
+
+
+class AlumniKeysetPaginationTest(TestCase):
+    class View(GraduateStudentAlumniListView):
+        def get_page_size(self):
+            return 2
+
+    def test_pages_cover_all_alumni_once(self):
+        for i, day in enumerate([3, 3, 3, 2, 1, None, None]):
+            GraduateStudent.objects.create(
+                person=make_person("Alum Number{}".format(i)),
+                start_date=datetime.date(2010, 9, 1),
+                graduation_date=datetime.date(2015, 6, day) if day else None,
+                graduation_date_confirmed=bool(day),
+                status="G",
+            )
+        seen = []
+        url = "/"
+        while url is not None:
+            request = RequestFactory().get(url)
+            request.user = AnonymousUser()
+            context = self.View.as_view()(request).context_data
+            seen += [gs.pk for gs in context["object_list"]]
+            if "next_cursor" in context:
+                url = "/?after=" + context["next_cursor"]
+            else:
+                url = None
+        dated = GraduateStudent.objects.filter(graduation_date__isnull=False)
+        undated = GraduateStudent.objects.filter(graduation_date__isnull=True)
+        expected = list(
+            dated.order_by("-graduation_date", "pk").values_list("pk", flat=True)
+        ) + list(undated.order_by("pk").values_list("pk", flat=True))
+        # (including the alumni without a graduation date)
+        self.assertEqual(len(expected), 7)
+        self.assertEqual(seen, expected)
+
+
+#######################################################################
+
+
+class AdminViewClassTest(TestCase):
+    def test_context_is_per_request(self):
+        view_class = admin_view_class(FundingReportAdminView)
+        self.assertIs(view_class, admin_view_class(FundingReportAdminView))
+        self.assertNotIn("get_context_data", FundingReportAdminView.__dict__)
+        for title in ["First", "Second"]:
+            request = RequestFactory().get("/")
+            view = view_class.as_view(admin_context={"title": title})
+            self.assertEqual(view(request).context_data["title"], title)
+        request = RequestFactory().get("/")
+        response = FundingReportAdminView.as_view()(request)
+        self.assertNotIn("title", response.context_data)
+
+
+#######################################################################
+
+
+class RestrictQuerysetTest(TestCase):
+    def test_multivalued_lookups(self):
+        self.assertTrue(is_multivalued_lookup(GraduateStudent, "advisor__slug"))
+        self.assertTrue(is_multivalued_lookup(GraduateStudent, "funding__amount"))
+        self.assertFalse(is_multivalued_lookup(GraduateStudent, "person__slug"))
+        self.assertFalse(is_multivalued_lookup(GraduateStudent, "status__in"))
+
+    def test_no_duplicates_without_distinct(self):
+        student = GraduateStudent.objects.create(
+            person=make_person("Eve Restricted"), start_date=datetime.date(2017, 9, 1)
+        )
+        advisors = [make_person("Fay Advisor"), make_person("Gil Advisor")]
+        student.advisor.add(*advisors)
+        queryset = restrict_queryset(
+            GraduateStudent.objects.all(), {"advisor__in": advisors}
+        )
+        self.assertFalse(queryset.query.distinct)
+        self.assertEqual([gs.pk for gs in queryset], [student.pk])
+
+
+#######################################################################
+
+
+class SingleFKAdminTest(TestCase):
+    class FundingAdmin(SingleFKAdminMixin, admin.ModelAdmin):
+        single_fk_src = "graduate_student"
+        single_fk_initial = {"start_date": "start_date"}
+
+    def test_single_fk_is_detected_once_per_request(self):
+        student = GraduateStudent.objects.create(
+            person=make_person("Hal Single"), start_date=datetime.date(2017, 9, 1)
+        )
+        request = RequestFactory().get("/")
+        request.user = User.objects.create_superuser("single", "s@example.com", "x")
+        model_admin = self.FundingAdmin(Funding, admin.site)
+        with self.assertNumQueries(1):
+            form = model_admin.get_form(request)()
+        self.assertEqual(form.fields["graduate_student"].initial, student)
+        self.assertEqual(form.fields["start_date"].initial, student.start_date)
+
+
+#######################################################################
+
+
+class FundingSummaryTest(TestCase):
+    def setUp(self):
+        self.student = GraduateStudent.objects.create(
+            person=make_person("Ida Summary"), start_date=datetime.date(2017, 9, 1)
+        )
+        self.sources = [
+            FundingSource.objects.create(name=name, ordering=i)
+            for i, name in enumerate(["Scholarship", "Teaching"])
+        ]
+
+    def add_funding(self, source, amount, start_date, end_date=None):
+        return Funding.objects.create(
+            graduate_student=self.student,
+            source=source,
+            amount=Decimal(amount),
+            start_date=start_date,
+            end_date=end_date,
+        )
+
+    def test_summary_is_one_query(self):
+        for i in range(10):
+            self.add_funding(
+                self.sources[i % 2],
+                "1000.00",
+                datetime.date(2018, 1, 1) + datetime.timedelta(days=30 * i),
+                datetime.date(2018, 1, 30) + datetime.timedelta(days=30 * i),
+            )
+        model_admin = GraduateStudentAdmin(GraduateStudent, admin.site)
+        student = GraduateStudent.objects.get(pk=self.student.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(student.total_funding(), Decimal("10000.00"))
+            student.current_funding()
+            student.earliest_funding()
+            student.most_recent_funding()
+            model_admin.funding_by_source(student)
+        sources = student.funding_summary().sources
+        self.assertEqual([name for name, s in sources], ["Scholarship", "Teaching"])
+        self.assertEqual([s.total for name, s in sources], [Decimal("5000.00")] * 2)
+
+    def test_latest_one_time_funding(self):
+        self.add_funding(
+            self.sources[0],
+            "100.00",
+            datetime.date(2018, 1, 1),
+            datetime.date(2018, 3, 31),
+        )
+        self.add_funding(self.sources[1], "50.00", datetime.date(2018, 2, 1))
+        funding_list = self.student.funding_set.active()
+        self.assertEqual(funding_list.latest_end_date(), datetime.date(2018, 3, 31))
+        self.assertEqual(self.student.most_recent_funding(), datetime.date(2018, 3, 31))
+
+    def test_identical_funding_is_not_collapsed(self):
+        for i in range(2):
+            self.add_funding(
+                self.sources[1],
+                "1000.00",
+                datetime.date(2018, 1, 1),
+                datetime.date(2018, 1, 31),
+            )
+        date_range = [datetime.date(2018, 1, 1), datetime.date(2018, 1, 31)]
+        self.assertEqual(
+            Funding.objects.all().sum_for_range(date_range), Decimal("2000.00")
+        )
+        rows = load_funding_rows(Funding.objects.in_range(date_range))
+        self.assertEqual([row.cents for row in rows], [100000, 100000])
+
+    def test_timeseries_matches_sum_for_range(self):
+        for i in range(2):  # identical rows
+            self.add_funding(
+                self.sources[1],
+                "3000.00",
+                datetime.date(2018, 1, 15),
+                datetime.date(2018, 4, 14),
+            )
+        self.add_funding(
+            self.sources[0],
+            "1200.00",
+            datetime.date(2017, 12, 1),
+            datetime.date(2018, 2, 28),
+        )
+        self.add_funding(self.sources[0], "500.00", datetime.date(2018, 3, 10))
+        funding_list = Funding.objects.active()
+        series = funding_list.timeseries(
+            datetime.date(2018, 1, 1),
+            datetime.date(2018, 5, 31),
+            freq="month",
+            group_by=["source__name"],
+        )
+        self.assertEqual(len(series), 5)
+        for bucket_start, bucket_end, totals in series:
+            bucket = [bucket_start, bucket_end]
+            self.assertEqual(
+                sum(totals.values(), Decimal("0.00")),
+                funding_list.sum_for_range(bucket),
+            )
+            self.assertEqual(
+                totals.get(("Teaching",), Decimal("0.00")),
+                funding_list.filter(source=self.sources[1]).sum_for_range(bucket),
+            )
+        one_row = money.from_cents(
+            money.for_range(
+                300000,
+                datetime.date(2018, 1, 15),
+                datetime.date(2018, 4, 14),
+                series[0][:2],
+            )
+        )
+        self.assertGreater(one_row, Decimal("0.00"))
+        self.assertEqual(series[0][2][("Teaching",)], 2 * one_row)
+
+
+#######################################################################
+
+
+class FundingImportTest(TestCase):
+    def setUp(self):
+        self.student = GraduateStudent.objects.create(
+            person=make_person("Una Import"),
+            status="S",
+            start_date=datetime.date(2017, 9, 1),
+        )
+        self.source = FundingSource.objects.create(name="Scholarship")
+
+    def test_import(self):
+        funding_list, errors = FundingImporter().run(
+            read_rows(
+                io.BytesIO(
+                    b"Student,Source,Amount,Start Date,End Date\n"
+                    + b"una import,Scholarship,1000.00,2018-01-01,2018-04-30\n"
+                    + "{},{},250,2018-05-01,\n".format(
+                        self.student.pk, self.source.pk
+                    ).encode("utf-8")
+                ),
+                "funding.csv",
+            )
+        )
+        self.assertEqual(errors, [])
+        self.assertEqual(len(funding_list), 2)
+        self.assertEqual(self.student.funding_set.count(), 2)
+        student = GraduateStudent.objects.get(pk=self.student.pk)
+        self.assertEqual(student.total_funding(), Decimal("1250.00"))
+
+    def test_bad_row_imports_nothing(self):
+        funding_list, errors = FundingImporter().run(
+            read_rows(
+                io.BytesIO(
+                    b"student,source,amount,start_date\n"
+                    + b"Una Import,Scholarship,1000.00,2018-01-01\n"
+                    + b"Nobody,Scholarship,1000.00,2018-01-01\n"
+                    + b"Una Import,Scholarship,lots,2018-01-01\n"
+                ),
+                "funding.csv",
+            )
+        )
+        self.assertEqual([e.row for e in errors], [3, 4])
+        self.assertFalse(Funding.objects.exists())
+
+    def test_spreadsheet_numbers(self):
+        # as read from XLSX cells:
+        rows = [
+            {
+                "student": float(self.student.pk),
+                "source": "Scholarship",
+                "amount": 1234.56,
+                "start_date": datetime.datetime(2018, 1, 1),
+                "end_date": datetime.datetime(2018, 4, 30),
+            },
+            {
+                "student": "Una Import",
+                "source": "Scholarship",
+                "amount": 100,
+                "start_date": datetime.datetime(2018, 5, 1),
+            },
+        ]
+        funding_list, errors = FundingImporter().run(rows)
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            sorted(self.student.funding_set.values_list("amount", flat=True)),
+            [Decimal("100.00"), Decimal("1234.56")],
+        )
+
+    def test_missing_column(self):
+        rows = read_rows(io.BytesIO(b"student,amount\nUna Import,1\n"), "x.csv")
+        funding_list, errors = FundingImporter().run(rows)
+        self.assertEqual(len(errors), 1)
+        self.assertIn("source", errors[0].message)
+
+
+#######################################################################
+
+
+class FundingTotalsTest(TestCase):
+    def setUp(self):
+        self.students = [
+            GraduateStudent.objects.create(
+                person=make_person(name), start_date=datetime.date(2017, 9, 1)
+            )
+            for name in ["Tom Totals", "Uma Totals"]
+        ]
+        self.source = FundingSource.objects.create(name="Scholarship")
+
+    def totals(self, student):
+        student = GraduateStudent.objects.get(pk=student.pk)
+        return [getattr(student, name) for name in funding_totals.FIELDS]
+
+    def assertTotals(self, student, total, count, start, end):
+        self.assertEqual(self.totals(student), [Decimal(total), count, start, end])
+        self.assertEqual(funding_totals.verify(GraduateStudent.objects.all()), [])
+
+    def test_signals(self):
+        tom, uma = self.students
+        self.assertTotals(tom, "0", 0, None, None)
+        funding = Funding.objects.create(
+            graduate_student_id=tom.pk,
+            source=self.source,
+            amount=Decimal("1000.00"),
+            start_date=datetime.date(2018, 1, 1),
+            end_date=datetime.date(2018, 4, 30),
+        )
+        Funding.objects.create(
+            graduate_student_id=tom.pk,
+            source=self.source,
+            amount=Decimal("50.00"),
+            start_date=datetime.date(2018, 6, 1),
+        )
+        june = datetime.date(2018, 6, 1)
+        self.assertTotals(tom, "1050.00", 2, datetime.date(2018, 1, 1), june)
+
+        funding = Funding.objects.get(pk=funding.pk)
+        funding.amount = Decimal("500.00")
+        funding.start_date = datetime.date(2018, 2, 1)
+        funding.save()
+        self.assertTotals(tom, "550.00", 2, datetime.date(2018, 2, 1), june)
+
+        funding.graduate_student = uma
+        funding.save()
+        self.assertTotals(tom, "50.00", 1, june, june)
+        self.assertTotals(
+            uma, "500.00", 1, datetime.date(2018, 2, 1), datetime.date(2018, 4, 30)
+        )
+
+        funding.active = False
+        funding.save()
+        self.assertTotals(uma, "0", 0, None, None)
+
+        Funding.objects.filter(graduate_student=tom).delete()
+        self.assertTotals(tom, "0", 0, None, None)
+
+    def test_saving_a_stale_student_keeps_the_totals(self):
+        tom = GraduateStudent.objects.get(pk=self.students[0].pk)
+        Funding.objects.create(
+            graduate_student_id=tom.pk,
+            source=self.source,
+            amount=Decimal("300.00"),
+            start_date=datetime.date(2018, 1, 1),
+        )
+        tom.status = "S"
+        tom.save()
+        january = datetime.date(2018, 1, 1)
+        self.assertTotals(tom, "300.00", 1, january, january)
+        self.assertEqual(GraduateStudent.objects.get(pk=tom.pk).status, "S")
+
+    def test_save_with_update_fields_and_deferred_fields(self):
+        tom = GraduateStudent.objects.get(pk=self.students[0].pk)
+        Funding.objects.create(
+            graduate_student_id=tom.pk,
+            source=self.source,
+            amount=Decimal("20.00"),
+            start_date=datetime.date(2018, 1, 1),
+        )
+        tom.status = "S"
+        tom.save(update_fields=["status", "funding_total"])
+        january = datetime.date(2018, 1, 1)
+        self.assertTotals(tom, "20.00", 1, january, january)
+
+        tom = (
+            GraduateStudent.objects.select_related(None)
+            .only("pk", "status")
+            .get(pk=tom.pk)
+        )
+        tom.status = "P"
+        with self.assertNumQueries(1):
+            tom.save()
+        self.assertEqual(GraduateStudent.objects.get(pk=tom.pk).status, "P")
+        self.assertTotals(tom, "20.00", 1, january, january)
+
+    def test_save_of_a_deleted_student_inserts_it(self):
+        uma = GraduateStudent.objects.get(pk=self.students[1].pk)
+        GraduateStudent.objects.filter(pk=uma.pk).delete()
+        uma.save()
+        self.assertTrue(GraduateStudent.objects.filter(pk=uma.pk).exists())
+
+    def test_total_funding_uses_the_totals(self):
+        Funding.objects.create(
+            graduate_student=self.students[0],
+            source=self.source,
+            amount=Decimal("75.00"),
+            start_date=datetime.date(2018, 1, 1),
+        )
+        student = GraduateStudent.objects.get(pk=self.students[0].pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(student.total_funding(), Decimal("75.00"))
+            self.assertEqual(student.earliest_funding(), datetime.date(2018, 1, 1))
+
+    def test_verify_and_rebuild(self):
+        Funding.objects.bulk_create(
+            [
+                Funding(
+                    graduate_student=student,
+                    source=self.source,
+                    amount=Decimal("10.00"),
+                    start_date=datetime.date(2018, 1, 1),
+                )
+                for student in self.students
+            ]
+        )
+        errors = funding_totals.verify(GraduateStudent.objects.all())
+        self.assertEqual(
+            sorted(pk for pk, stored, correct in errors),
+            sorted(s.pk for s in self.students),
+        )
+        self.assertEqual(errors[0][2]["funding_total"], Decimal("10.00"))
+        funding_totals.rebuild(GraduateStudent.objects.all())
+        self.assertEqual(funding_totals.verify(GraduateStudent.objects.all()), [])
+
+
+#######################################################################
+
+
+class FundingChecksTest(SimpleTestCase):
+    student = funding_checks.StudentRow(
+        1, "Fay Checks", "M", datetime.date(2018, 1, 1), datetime.date(2019, 12, 31)
+    )
+
+    def funding(self, pk, source, start, end=None):
+        return funding_checks.FundingRow(
+            pk, source, "Source {}".format(source), Decimal("100.00"), start, end
+        )
+
+    def check(self, funding_list, gap_days=30):
+        problems = funding_checks.check_student(self.student, funding_list, gap_days)
+        return [
+            (p.kind, p.start_date, p.end_date, [f.pk for f in p.funding])
+            for p in problems
+        ]
+
+    def test_gaps(self):
+        funding_list = [
+            self.funding(3, 1, datetime.date(2018, 9, 1), datetime.date(2018, 12, 31)),
+            self.funding(1, 1, datetime.date(2018, 1, 1), datetime.date(2018, 4, 30)),
+            # covered by funding 1, with a different source:
+            self.funding(2, 2, datetime.date(2018, 2, 1), datetime.date(2018, 3, 31)),
+            # one-time payments do not fill gaps:
+            self.funding(4, 2, datetime.date(2018, 6, 1)),
+            # 31 days after funding 3:
+            self.funding(5, 1, datetime.date(2019, 2, 1), datetime.date(2019, 4, 30)),
+        ]
+        self.assertEqual(
+            self.check(funding_list),
+            [
+                (
+                    funding_checks.GAP,
+                    datetime.date(2018, 5, 1),
+                    datetime.date(2018, 8, 31),
+                    [1, 3],
+                ),
+                (
+                    funding_checks.GAP,
+                    datetime.date(2019, 1, 1),
+                    datetime.date(2019, 1, 31),
+                    [3, 5],
+                ),
+            ],
+        )
+        self.assertEqual(len(self.check(funding_list, gap_days=31)), 1)
+
+    def test_overlaps(self):
+        funding_list = [
+            self.funding(1, 1, datetime.date(2018, 1, 1), datetime.date(2018, 12, 31)),
+            self.funding(2, 1, datetime.date(2018, 3, 1), datetime.date(2018, 4, 30)),
+            self.funding(3, 1, datetime.date(2018, 12, 1), datetime.date(2019, 2, 28)),
+            # another source:
+            self.funding(4, 2, datetime.date(2018, 3, 1), datetime.date(2018, 4, 30)),
+            # one-time payments only overlap on the same day:
+            self.funding(5, 1, datetime.date(2018, 6, 1)),
+            self.funding(6, 1, datetime.date(2018, 6, 1)),
+            self.funding(7, 1, datetime.date(2018, 6, 2)),
+        ]
+        self.assertEqual(
+            self.check(funding_list),
+            [
+                (
+                    funding_checks.OVERLAP,
+                    datetime.date(2018, 3, 1),
+                    datetime.date(2018, 4, 30),
+                    [1, 2],
+                ),
+                (
+                    funding_checks.OVERLAP,
+                    datetime.date(2018, 6, 1),
+                    datetime.date(2018, 6, 1),
+                    [5, 6],
+                ),
+                (
+                    funding_checks.OVERLAP,
+                    datetime.date(2018, 12, 1),
+                    datetime.date(2018, 12, 31),
+                    [1, 3],
+                ),
+            ],
+        )
+
+    def test_outside_program(self):
+        funding_list = [
+            self.funding(1, 1, datetime.date(2017, 12, 31)),
+            self.funding(2, 1, datetime.date(2018, 1, 1)),
+            self.funding(3, 1, datetime.date(2019, 12, 31)),
+            self.funding(4, 1, datetime.date(2020, 1, 1)),
+            # periods are not checked:
+            self.funding(5, 2, datetime.date(2017, 9, 1), datetime.date(2020, 8, 31)),
+        ]
+        self.assertEqual(
+            self.check(funding_list),
+            [
+                (
+                    funding_checks.OUTSIDE_PROGRAM,
+                    datetime.date(2017, 12, 31),
+                    None,
+                    [1],
+                ),
+                (funding_checks.OUTSIDE_PROGRAM, datetime.date(2020, 1, 1), None, [4]),
+            ],
+        )
+
+
+class FundingChecksQueryTest(TestCase):
+    def test_check_funding(self):
+        source = FundingSource.objects.create(name="Scholarship")
+        for name in ["Gil Checks", "Hal Checks", "Ida Checks"]:
+            student = GraduateStudent.objects.create(
+                person=make_person(name),
+                status="S",
+                start_date=datetime.date(2018, 1, 1),
+            )
+            for start, end in [
+                (datetime.date(2018, 1, 1), datetime.date(2018, 4, 30)),
+                (datetime.date(2018, 9, 1), datetime.date(2018, 12, 31)),
+            ]:
+                Funding.objects.create(
+                    graduate_student=student,
+                    source=source,
+                    amount=Decimal("100.00"),
+                    start_date=start,
+                    end_date=end,
+                )
+        with self.assertNumQueries(2):
+            problems = funding_checks.check_funding(GraduateStudent.objects.active())
+        self.assertEqual(
+            [(p.student.name, p.kind) for p in problems],
+            [
+                ("Gil Checks", funding_checks.GAP),
+                ("Hal Checks", funding_checks.GAP),
+                ("Ida Checks", funding_checks.GAP),
+            ],
+        )
+        self.assertEqual(len(funding_checks.problem_table(problems)), 4)
+
+
+#######################################################################
+
+
+class CohortImportTest(TestCase):
+    def setUp(self):
+        self.advisor = make_person("Ann Advisor")
+        for flag in conf.get("advisor_flags"):
+            self.advisor.add_flag_by_name(flag)
+        self.returning = make_person("Rhea Turning")
+        GraduateStudent.objects.create(
+            person=self.returning,
+            program="M",
+            status="G",
+            start_date=datetime.date(2016, 9, 1),
+        )
+        self.returning.add_flag_by_name("gradstudent")
+
+    def import_cohort(self, lines):
+        text = "name,start_date,program,status,advisors\n" + "\n".join(lines)
+        rows = read_rows(io.BytesIO(text.encode("utf-8")), "cohort.csv")
+        with CaptureQueriesContext(connection) as queries:
+            result = CohortImporter().run(rows)
+        return result, len(queries)
+
+    def test_import(self):
+        (intakes, errors), count = self.import_cohort(
+            [
+                "New Student,2024-09-01,Ph.D.,S,Ann Advisor",
+                "Rhea Turning,2024-09-01,P,S,ann-advisor",
+                "Pat Pending,2024-09-01,,,",
+            ]
+        )
+        self.assertEqual(errors, [])
+        self.assertEqual(len(intakes), 3)
+        # only the new people are created:
+        self.assertEqual(Person.objects.filter(cn="Rhea Turning").count(), 1)
+        returning = self.returning.graduatestudent_set.get(program="P")
+        self.assertEqual(list(returning.advisor.all()), [self.advisor])
+        student = GraduateStudent.objects.get(person__cn="New Student")
+        self.assertEqual(list(student.advisor.all()), [self.advisor])
+        self.assertEqual(
+            GraduateStudent.objects.get(person__cn="Pat Pending").status, "P"
+        )
+        for intake in intakes:
+            self.assertIn(
+                "gradstudent", intake.person.flags.active().slugs(), intake.person
+            )
+        # and no graduate student records were autocreated:
+        self.assertEqual(GraduateStudent.objects.count(), 4)
+
+        # a bigger cohort takes the same number of queries:
+        (intakes, errors), more = self.import_cohort(
+            [
+                "Student {},2024-09-01,M,S,Ann Advisor".format(name)
+                for name in ["Ay", "Bee", "Cee", "Dee", "Ee", "Eff"]
+            ]
+        )
+        self.assertEqual(errors, [])
+        self.assertEqual(more, count)
+
+    def test_bad_row_imports_nothing(self):
+        people = Person.objects.count()
+        (intakes, errors), count = self.import_cohort(
+            [
+                "New Student,2024-09-01,Ph.D.,S,Ann Advisor",
+                "Rhea Turning,2024-09-01,M,S,",
+                "Lone Student,2024-09-01,M,S,Nobody",
+                "Late Student,not a date,M,S,",
+            ]
+        )
+        self.assertEqual([e.row for e in errors], [3, 4, 5])
+        self.assertEqual(Person.objects.count(), people)
+        self.assertEqual(GraduateStudent.objects.count(), 1)
+
+
+#######################################################################
+
+
+@skipIf(
+    not conf.get("autocreate_on_gradstudent_flag"), "graduate student autocreate is off"
+)
+class AutocreateSignalTest(TestCase):
+    def setUp(self):
+        self.people = [
+            make_person("Auto {}".format(name)) for name in ["Ay", "Bee", "Cee"]
+        ]
+        self.people[0].add_flag_by_name("gradstudent")
+
+    def test_add_flag(self):
+        self.assertEqual(self.people[0].graduatestudent_set.count(), 1)
+        self.people[0].remove_flag_by_name("gradstudent")
+        self.people[0].add_flag_by_name("gradstudent")
+        self.assertEqual(self.people[0].graduatestudent_set.count(), 1)
+
+    def test_add_flag_to_many_people(self):
+        _flagged_people(get_flag("gradstudent")).add(*[p.pk for p in self.people])
+        self.assertEqual(
+            sorted(
+                GraduateStudent.objects.filter(person__in=self.people).values_list(
+                    "person_id", flat=True
+                )
+            ),
+            sorted(p.pk for p in self.people),
+        )
+
+    def test_other_flags(self):
+        self.people[1].add_flag_by_name("other")
+        with CaptureQueriesContext(connection) as queries:
+            self.people[2].add_flag_by_name("other")
+        self.assertFalse(
+            [q for q in queries if GraduateStudent._meta.db_table in q["sql"]]
+        )
+        self.assertFalse(GraduateStudent.objects.filter(person=self.people[2]).exists())
+
+    def test_flag_created_elsewhere(self):
+        Flag = Person._meta.get_field("flags").remote_field.model
+        self.assertIsNone(get_flag_pk("elsewhere"))
+        # (as by another process: no signals are sent here)
+        Flag.objects.bulk_create([Flag(name="Elsewhere", slug="elsewhere")])
+        self.assertEqual(get_flag_pk("elsewhere"), get_flag("elsewhere").pk)
+
+
+#######################################################################
+
+
+class DeferredFlagsTest(TransactionTestCase):
+    def make_student(self, name, program="M"):
+        student = GraduateStudent.objects.create(
+            person=make_person(name),
+            program=program,
+            status="S",
+            start_date=datetime.date(2018, 9, 1),
+        )
+        student.person.add_flag_by_name("gradstudent")
+        return student
+
+    def flagged(self, slug):
+        return sorted(
+            Person.objects.filter(flags__slug=slug).values_list("cn", flat=True)
+        )
+
+    def test_flags_change_on_commit(self):
+        students = [self.make_student(name) for name in ["Al Pha", "Be Ta"]]
+        # a master's graduate, continuing in the Ph.D. program:
+        phd = GraduateStudent.objects.create(
+            person=students[1].person,
+            program="P",
+            status="S",
+            start_date=datetime.date(2020, 9, 1),
+        )
+        with transaction.atomic():
+            for student in students:
+                student.status = "G"
+                student.full_clean()
+                student.save()
+            self.assertEqual(self.flagged("alumni"), [])
+        self.assertEqual(self.flagged("alumni"), ["Al Pha", "Be Ta"])
+        self.assertEqual(self.flagged("gradstudent"), ["Be Ta"])
+
+        phd.status = "VW"
+        phd.save()
+        self.assertEqual(self.flagged("gradstudent"), [])
+
+
+#######################################################################
+
+
+class BulkActionsTest(TestCase):
+    class QuietAdmin(GraduateStudentAdmin):
+        def message_user(self, request, message, *args, **kwargs):
+            pass
+
+    def setUp(self):
+        self.model_admin = self.QuietAdmin(GraduateStudent, admin.site)
+        self.request = RequestFactory().post("/")
+        self.request.user = User.objects.create_superuser("bulk", "b@example.com", "x")
+
+    def make_students(self, n, prefix):
+        for i in range(n):
+            GraduateStudent.objects.create(
+                person=make_person("{} Student{}".format(prefix, i)),
+                start_date=datetime.date(2015, 9, 1),
+                status="S",
+            )
+        return GraduateStudent.objects.filter(person__sn__startswith="Student").filter(
+            person__given_name=prefix
+        )
+
+    def count_queries(self, action, queryset):
+        with CaptureQueriesContext(connection) as queries:
+            action(self.request, queryset)
+        return len(queries)
+
+    def test_mark_graduated(self):
+        # the alumni flag exists after the first run:
+        self.model_admin.mark_graduated(self.request, self.make_students(1, "Jo"))
+        small = self.count_queries(
+            self.model_admin.mark_graduated, self.make_students(2, "Kim")
+        )
+        large = self.count_queries(
+            self.model_admin.mark_graduated, self.make_students(6, "Lee")
+        )
+        self.assertEqual(small, large)
+        self.assertEqual(GraduateStudent.objects.filter(status="G").count(), 9)
+        self.assertEqual(Person.objects.filter(flags__slug="alumni").count(), 9)
+
+    def test_add_and_remove_advisor(self):
+        advisor = make_person("Max Advisor")
+        for flag in conf.get("advisor_flags"):
+            advisor.add_flag_by_name(flag)
+        students = self.make_students(4, "Ned")
+        self.request = RequestFactory().post("/", {"advisor": advisor.pk})
+        self.request.user = User.objects.get(username="bulk")
+        self.model_admin.add_advisor(self.request, students)
+        self.assertEqual(advisor.supervisor.count(), 4)
+        self.model_admin.remove_advisor(self.request, students)
+        self.assertEqual(advisor.supervisor.count(), 0)
+
+
+#######################################################################
+
+
+class InstrumentationTest(TestCase):
+    def test_stages_count_queries(self):
+        with instrumentation.Recorder("test") as recorder:
+            for i in range(2):
+                with instrumentation.stage("students"):
+                    list(GraduateStudent.objects.all())
+        stage = recorder.stages["students"]
+        self.assertEqual(stage.calls, 2)
+        self.assertEqual(stage.queries, 2)
+        self.assertEqual(recorder.queries, 2)
+        self.assertIn("students;dur=", recorder.server_timing())
+
+    @override_settings(GRADUATE_STUDENT_CONFIG={})
+    def test_off_by_default(self):
+        self.assertIs(instrumentation.record("test"), instrumentation.NULL_RECORDER)
+        # stages outside of a recorder do nothing:
+        self.assertIs(instrumentation.stage("nothing"), instrumentation.NULL_STAGE)
+        with instrumentation.stage("nothing"):
+            pass
+
+
+#######################################################################
+
+
+# The query budget tests render the real pages, so they need urls and a
+# stand-in for the site's base template.
+urlpatterns = [
+    url(r"^admin/", admin.site.urls),
+    url(r"^graduate-students/", include("graduate_students.urls")),
+]
+
+SITE_BASE_TEMPLATE = """<html><head>{% block html_head %}{% endblock %}
+<title>{% block page_title %}{% endblock %}</title></head><body>
+{% block breadcrumbs %}{% endblock %}
+<h1>{% block page_content_header %}{% endblock %}</h1>
+{% block page_content_body %}{% endblock %}
+</body></html>"""
+
+
+@override_settings(
+    ROOT_URLCONF=__name__,
+    MIDDLEWARE=[
+        "django.contrib.sessions.middleware.SessionMiddleware",
+        "django.middleware.common.CommonMiddleware",
+        "django.middleware.csrf.CsrfViewMiddleware",
+        "django.contrib.auth.middleware.AuthenticationMiddleware",
+        "django.contrib.messages.middleware.MessageMiddleware",
+    ],
+    TEMPLATES=[
+        {
+            "BACKEND": "django.template.backends.django.DjangoTemplates",
+            "OPTIONS": {
+                "context_processors": [
+                    "django.template.context_processors.request",
+                    "django.contrib.auth.context_processors.auth",
+                    "django.contrib.messages.context_processors.messages",
+                ],
+                "loaders": [
+                    (
+                        "django.template.loaders.locmem.Loader",
+                        {"site_base.html": SITE_BASE_TEMPLATE},
+                    ),
+                    "django.template.loaders.app_directories.Loader",
+                ],
+            },
+        }
+    ],
+)
+class FundingDatasetTest(TestCase):
+    date_range = [datetime.date(2018, 1, 1), datetime.date(2018, 12, 31)]
+
+    def test_in_range_matches_the_queryset(self):
+        student = GraduateStudent.objects.create(
+            person=make_person("Dot Dataset"), start_date=datetime.date(2017, 9, 1)
+        )
+        source = FundingSource.objects.create(name="Scholarship")
+        cases = [
+            # starts in the range:
+            (datetime.date(2018, 12, 31), datetime.date(2019, 3, 31)),
+            # ends in the range:
+            (datetime.date(2017, 9, 1), datetime.date(2018, 1, 1)),
+            # spans the range:
+            (datetime.date(2017, 9, 1), datetime.date(2019, 8, 31)),
+            # inside the range:
+            (datetime.date(2018, 3, 1), datetime.date(2018, 4, 30)),
+            # one-time, in and out of the range:
+            (datetime.date(2018, 1, 1), None),
+            (datetime.date(2017, 12, 31), None),
+            # before and after the range:
+            (datetime.date(2017, 1, 1), datetime.date(2017, 12, 31)),
+            (datetime.date(2019, 1, 1), datetime.date(2019, 4, 30)),
+        ]
+        for i, (start_date, end_date) in enumerate(cases):
+            Funding.objects.create(
+                graduate_student=student,
+                source=source,
+                amount=Decimal(100 + i),
+                start_date=start_date,
+                end_date=end_date,
+            )
+        dataset = utils.FundingDataset(
+            [self.date_range, [datetime.date(2017, 1, 1), datetime.date(2019, 12, 31)]]
+        )
+        expected = load_funding_rows(Funding.objects.in_range(self.date_range))
+        self.assertEqual(len(expected), 5)
+        self.assertEqual(sorted(dataset.in_range(self.date_range)), sorted(expected))
+
+    def test_fiscal_year_range(self):
+        self.assertEqual(
+            utils.fiscal_year_range(2017),
+            [datetime.date(2017, 9, 1), datetime.date(2018, 8, 31)],
+        )
+        # consecutive fiscal years meet at the start month:
+        for year in [2018, 2019, 2020]:
+            end_date = utils.fiscal_year_range(year)[1]
+            next_start_date = utils.fiscal_year_range(year + 1)[0]
+            self.assertEqual(end_date + datetime.timedelta(days=1), next_start_date)
+            self.assertEqual(next_start_date.month, utils.FISCAL_YEAR_START_MONTH)
+
+
+#######################################################################
+
+
+class BenchmarkTest(TestCase):
+    def test_percentile(self):
+        values = [5, 1, 4, 2, 3]
+        self.assertEqual(benchmark.percentile(values, 50), 3)
+        self.assertEqual(benchmark.percentile(values, 95), 5)
+        self.assertEqual(benchmark.percentile(values, 0), 1)
+
+    def test_measure(self):
+        result = benchmark.measure(lambda: list(FundingSource.objects.all()), 3)
+        self.assertEqual(result["runs"], 3)
+        self.assertEqual(result["queries"], 1)
+        self.assertLessEqual(result["min"], result["median"])
+        self.assertLessEqual(result["median"], result["p95"])
+
+    def test_operations(self):
+        department = make_department(students=4, start_year=2010, years=4)
+        options = {
+            "fiscal_year": 2012,
+            "engine": None,
+            "format": "csv",
+            "no_views": True,
+        }
+        operations = dict(benchmark.get_operations(options, department))
+        self.assertIn("funding_report_table", operations)
+        self.assertIn("funding_report_form", operations)
+        self.assertIn("sheetWriter:csv", operations)
+        for name, func in operations.items():
+            func()
+
+
+#######################################################################
+
+
+class FundingReportBundleTest(TestCase):
+    start_date = datetime.date(2012, 9, 1)
+    end_date = datetime.date(2013, 8, 31)
+    formats = ["csv", "xls"]
+
+    def setUp(self):
+        make_department(students=6, start_year=2010, years=4)
+
+    def bundle(self, basename="report", max_workers=1):
+        data = make_funding_bundle(
+            self.start_date,
+            self.end_date,
+            self.formats,
+            basename,
+            max_workers=max_workers,
+        )
+        bundle = zipfile.ZipFile(io.BytesIO(data))
+        return OrderedDict((name, bundle.read(name)) for name in bundle.namelist())
+
+    def test_serial_bundle(self):
+        contents = self.bundle()
+        self.assertEqual(list(contents), ["report.csv", "report.xls"])
+        csv_data = make_funding_spreadsheet(self.start_date, self.end_date, "csv")
+        if not isinstance(csv_data, bytes):
+            csv_data = csv_data.encode("utf-8")
+        self.assertEqual(contents["report.csv"], csv_data)
+
+    @skipIf(utils.ProcessPoolExecutor is None, "concurrent.futures is required")
+    def test_pooled_bundle(self):
+        self.assertEqual(
+            self.bundle(max_workers=2)["report.csv"], self.bundle()["report.csv"]
+        )
+        table = [["Name", "Amount"], ["Ann", 1]]
+        serial = utils.render_spreadsheets(table, self.formats, max_workers=1)
+        self.assertEqual(
+            utils.render_spreadsheets(table, self.formats, max_workers=2)["csv"],
+            serial["csv"],
+        )
+        executor = utils.spreadsheet_executor(len(self.formats), max_workers=2)
+        try:
+            for i in range(2):  # one pool, several tables
+                streams = utils.render_spreadsheets(
+                    table, self.formats, executor=executor
+                )
+                self.assertEqual(list(streams), self.formats)
+                self.assertEqual(streams["csv"], serial["csv"])
+        finally:
+            executor.shutdown()
+
+    def test_form_bundle_names(self):
+        form = FundingReportForm(
+            data={
+                "start_date": self.start_date,
+                "end_date": self.end_date,
+                "format_": "csv",
+                "extra_formats": ["xls"],
+            }
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        bundle = zipfile.ZipFile(io.BytesIO(form.get_result_data()))
+        basename = form.get_basename()
+        self.assertEqual(bundle.namelist(), [basename + ".csv", basename + ".xls"])
+
+
+#######################################################################
+
+
+class QueryBudgetTest(TestCase):
+    """
+    The number of queries for each page and report must not grow with
+    the size of the department (i.e., no N+1 queries), and must stay
+    within a budget.  Each check is run at several department sizes.
+    """
+
+    # the (cumulative) number of students at each measurement:
+    sizes = [3, 9, 27]
+
+    def setUp(self):
+        user = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        self.client.force_login(user)
+
+    def assertQueryBudget(self, budget, prepare):
+        """
+        ``prepare(department)`` returns the callable to measure.
+        """
+        counts = []
+        students = 0
+        for i, size in enumerate(self.sizes):
+            department = make_department(
+                students=size - students, advisors=size // 3, seed=i
+            )
+            students = size
+            func = prepare(department)
+            with CaptureQueriesContext(connection) as queries:
+                func()
+            counts.append(len(queries))
+        self.assertEqual(
+            len(set(counts)),
+            1,
+            "The number of queries grows with the department size: {} for {} "
+            "students\n{}".format(
+                counts, self.sizes, "\n".join(q["sql"] for q in queries)
+            ),
+        )
+        self.assertLessEqual(counts[-1], budget)
+
+    def assertPageBudget(self, budget, get_url):
+        """
+        ``get_url(department)`` returns the url of the page to measure.
+        """
+
+        def prepare(department):
+            url = get_url(department)
+
+            def get():
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+            return get
+
+        return self.assertQueryBudget(budget, prepare)
+
+    def test_graduate_student_list(self):
+        self.assertPageBudget(8, lambda d: reverse("gradstudent-list"))
+
+    def test_alumni_list(self):
+        self.assertPageBudget(8, lambda d: reverse("gradstudent-alumni-list"))
+
+    def test_advisor_list(self):
+        self.assertPageBudget(8, lambda d: reverse("gradstudent-advisor-list"))
+
+    def test_graduate_student_detail(self):
+        self.assertPageBudget(
+            10, lambda d: reverse("gradstudent-detail", args=[d.students[0].pk])
+        )
+
+    def test_graduate_student_admin_changelist(self):
+        self.assertPageBudget(
+            15, lambda d: reverse("admin:graduate_students_graduatestudent_changelist")
+        )
+
+    def test_graduate_student_admin_change_form(self):
+        self.assertPageBudget(
+            30,
+            lambda d: reverse(
+                "admin:graduate_students_graduatestudent_change",
+                args=[d.students[0].pk],
+            ),
+        )
+
+    def test_funding_admin_changelist(self):
+        self.assertPageBudget(
+            15, lambda d: reverse("admin:graduate_students_funding_changelist")
+        )
+
+    def test_funding_admin_change_form(self):
+        def get_url(department):
+            funding = Funding.objects.filter(graduate_student=department.students[0])
+            return reverse(
+                "admin:graduate_students_funding_change", args=[funding[0].pk]
+            )
+
+        self.assertPageBudget(15, get_url)
+
+    def test_label_autocomplete(self):
+        self.assertPageBudget(
+            6,
+            lambda d: reverse(
+                "admin:graduate_students_graduatestudent_autocomplete_label"
+            )
+            + "?term=",
+        )
+
+    def test_current_total_funding_report(self):
+        self.assertPageBudget(
+            6, lambda d: reverse("admin:graduatestudent_funding_current_total")
+        )
+
+    def test_make_funding_spreadsheet(self):
+        start_date = datetime.date(2010, 1, 1)
+        end_date = datetime.date(2020, 12, 31)
+        self.assertQueryBudget(
+            6, lambda d: lambda: make_funding_spreadsheet(start_date, end_date, "csv"),
+        )
+
+
+#######################################################################
@@ -1,14 +1,25 @@
 from __future__ import print_function, unicode_literals
 
 import datetime
+import io
+import multiprocessing
 import re
-from decimal import Decimal
+import zipfile
+from collections import OrderedDict, namedtuple
 
 from spreadsheet import sheetWriter
 
 from .. import conf
 from ..cli import resolve_lookup
+from ..instrumentation import instrumented, stage
 from ..models import Funding, FundingSource, GraduateStudent
+from ..money import for_range, from_cents, to_cents
+from ..proration import get_engine
+
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except ImportError:  # Python 2 without the ``futures`` backport.
+    ProcessPoolExecutor = None
 
 """
 Utilities for the Graduate Students app.
@@ -19,26 +30,138 @@ Yo're probably interested in make_funding_spreadsheet()
 
 
 EXTRA_FIELDS = conf.get("spreadsheet_extra_fields")
+FISCAL_YEAR_START_MONTH = 9
+
+# A preloaded Funding row; the amount is in integer cents.
+FundingRow = namedtuple(
+    "FundingRow",
+    ["graduate_student_id", "source_id", "cents", "start_date", "end_date"],
+)
+
+#######################################################################
+
+
+def load_funding_rows(queryset):
+    """
+    Load the given Funding queryset as a list of ``FundingRow``s.
+    """
+    # (the pk keeps identical funding rows distinct)
+    values_list = queryset.values_list(
+        "pk", "graduate_student_id", "source_id", "amount", "start_date", "end_date"
+    )
+    return [
+        FundingRow(gs_id, source_id, to_cents(amount), start_date, end_date)
+        for pk, gs_id, source_id, amount, start_date, end_date in values_list
+    ]
+
+
+#######################################################################
+
+
+class FundingDataset(object):
+    """
+    The active funding (from active sources) over the span of one or
+    more date ranges, loaded with a single query.
+    A dataset can be shared by several reports, e.g., when generating
+    the reports for a number of fiscal years in one go.
+
+    The prorated amounts for all of the dataset's date ranges are computed
+    together, in one pass of the proration ``engine``.
+    """
+
+    def __init__(self, date_ranges, engine=None):
+        date_ranges = list(date_ranges)
+        self.date_ranges = date_ranges
+        self.engine = engine
+        self._amounts = None
+        self.span = [min(r[0] for r in date_ranges), max(r[1] for r in date_ranges)]
+        queryset = Funding.objects.in_range(self.span).filter(source__active=True)
+        with stage("load_funding"):
+            self.funding_list = load_funding_rows(queryset)
+
+    def in_range(self, date_range):
+        """
+        The in-memory equivalent of ``Funding.objects.in_range()``;
+        returns a list of ``FundingRow``s.
+        """
+        start, end = date_range
+        assert self.span[0] <= start and end <= self.span[1], "not preloaded"
+        return [
+            f
+            for f in self.funding_list
+            if f.start_date <= end and (f.end_date or f.start_date) >= start
+        ]
+
+    def graduate_student_ids(self, date_range):
+        """
+        The set of graduate students with funding in the date range.
+        """
+        return set(f.graduate_student_id for f in self.in_range(date_range))
+
+    def _get_engine(self):
+        if self.engine is None:
+            return get_engine()
+        return self.engine
+
+    def amounts(self, date_range):
+        """
+        The prorated funding in the date range, as a dictionary of
+        ``(graduate_student_id, source_id): cents``.
+        """
+        key = tuple(date_range)
+        if self._amounts is None:
+            ranges = [tuple(r) for r in self.date_ranges]
+            with stage("proration"):
+                results = self._get_engine().prorate(self.funding_list, ranges)
+            self._amounts = dict(zip(ranges, results))
+        if key not in self._amounts:
+            with stage("proration"):
+                results = self._get_engine().prorate(self.in_range(date_range), [key])
+            self._amounts[key] = results[0]
+        return self._amounts[key]
+
 
 #######################################################################
 
 
-def funding_table(date_range, graduatestudent_list, source_list):
+def funding_amounts(date_range, funding_list):
+    """
+    Prorate the ``FundingRow``s for the date range; returns a dictionary of
+    ``(graduate_student_id, source_id): cents``.
+    """
+    amounts = {}
+    for row in funding_list:
+        key = (row.graduate_student_id, row.source_id)
+        amounts[key] = amounts.get(key, 0) + for_range(
+            row.cents, row.start_date, row.end_date, date_range
+        )
+    return amounts
+
+
+def _funding_table_cents(amounts, graduatestudent_list, source_list):
+    """
+    The core table of funding, in integer cents.
+    """
+    source_ids = [source.pk for source in source_list]
+    return [
+        [amounts.get((graduate_student.pk, source_id), 0) for source_id in source_ids]
+        for graduate_student in graduatestudent_list
+    ]
+
+
+@instrumented("funding_table")
+def funding_table(date_range, graduatestudent_list, source_list, funding_list=None):
     """
     Construct the core table of funding for the report.
+
+    ``funding_list`` is the list of ``FundingRow``s in the date range
+    (e.g., from a ``FundingDataset``); it is queried for when not given.
     """
-    funding_list = Funding.objects.in_range(date_range)
-    table = []
-    for graduate_student in graduatestudent_list:
-        row = []
-        for source in source_list:
-            funding = funding_list.filter(
-                graduate_student=graduate_student, source=source
-            )
-            amounts = [f.for_range(date_range) for f in funding]
-            row.append(sum(amounts, Decimal("0.00")))
-        table.append(row)
-    return table
+    if funding_list is None:
+        funding_list = load_funding_rows(Funding.objects.in_range(date_range))
+    amounts = funding_amounts(date_range, funding_list)
+    table = _funding_table_cents(amounts, graduatestudent_list, source_list)
+    return [[from_cents(cents) for cents in row] for row in table]
 
 
 #######################################################################
@@ -47,6 +170,7 @@ def funding_table(date_range, graduatestudent_list, source_list):
 def do_augment_table(graduatestudent_list, source_list, table):
     """
     Construct the augmented table for a single group of graduate students.
+    (Totals are computed in the same units as the table.)
     """
     headers = [str(source) for source in source_list]
     student_totals = [sum(row) for row in table]
@@ -57,6 +181,7 @@ def do_augment_table(graduatestudent_list, source_list, table):
 #######################################################################
 
 
+@instrumented("augmented_table")
 def augmented_table(
     date_range,
     gradstudent_groups,
@@ -64,6 +189,8 @@ def augmented_table(
     final_label="",
     source_total_label="",
     student_total_label="",
+    funding_list=None,
+    amounts=None,
 ):
     """
     Construct the augmented table for the report.
@@ -78,6 +205,14 @@ def augmented_table(
 
     The various label inputs decorate the tableau.
 
+    ``funding_list`` is the list of ``FundingRow``s in the date range;
+    when it is not given, it is loaded once for all of the groups.
+    Alternatively, ``amounts`` can be the prorated funding (as returned by
+    ``funding_amounts()`` or ``FundingDataset.amounts()``).
+
+    All of the arithmetic is done in integer cents; amounts are converted
+    to ``Decimal`` as the rows are emitted.
+
     The return result is a list of rows, where each row is a list of cells.
     """
 
@@ -91,6 +226,7 @@ def augmented_table(
 
         return sum([safe_list(e) for e in args if e is not None], [])
 
+    @instrumented("extra_fields")
     def __extra_fields(grad):
         """grad can be None, in which case space for fields."""
         if not EXTRA_FIELDS:
@@ -128,10 +264,17 @@ def augmented_table(
     result.append(__make_row("End Date:", date_range[1]))
     result.append([])
 
+    def __amounts(cents_list):
+        return [from_cents(cents) for cents in cents_list]
+
+    if amounts is None:
+        if funding_list is None:
+            funding_list = load_funding_rows(Funding.objects.in_range(date_range))
+        amounts = funding_amounts(date_range, funding_list)
     grand_totals = []
-    ST = Decimal("0.0")
+    ST = 0
     for group_name, graduatestudent_list in gradstudent_groups:
-        base_table = funding_table(date_range, graduatestudent_list, source_list)
+        base_table = _funding_table_cents(amounts, graduatestudent_list, source_list)
         headers, totals, table = do_augment_table(
             graduatestudent_list, source_list, base_table
         )
@@ -140,11 +283,22 @@ def augmented_table(
             __make_row(group_name, __title_extra_fields(), student_total_label, headers)
         )
 
-        S = Decimal("0.0")
+        S = 0
         for grad, data, total in table:
-            result.append(__make_row(str(grad), __extra_fields(grad), total, data))
+            result.append(
+                __make_row(
+                    str(grad), __extra_fields(grad), from_cents(total), __amounts(data),
+                )
+            )
             S += total
-        result.append(__make_row(source_total_label, __extra_fields(None), S, totals))
+        result.append(
+            __make_row(
+                source_total_label,
+                __extra_fields(None),
+                from_cents(S),
+                __amounts(totals),
+            )
+        )
         result.append([])
         grand_totals.append(totals)
         ST += S
@@ -155,8 +309,8 @@ def augmented_table(
             __make_row(
                 final_label,
                 __extra_fields(None),
-                ST,
-                [sum(col) for col in zip(*grand_totals)],
+                from_cents(ST),
+                __amounts(sum(col) for col in zip(*grand_totals)),
             )
         )
 
@@ -166,21 +320,24 @@ def augmented_table(
 #######################################################################
 
 
-def make_funding_spreadsheet(start_date, end_date, format_, grad_date_adjustment=60):
+@instrumented("funding_report_table")
+def funding_report_table(start_date, end_date, grad_date_adjustment=60, dataset=None):
     """
-    Given a start_date, end_date, and file format, return the data stream
-    for a spreadsheet.
+    Given a start_date and end_date, return the funding report table
+    (a list of rows).  This is where all of the database work happens;
+    the result can be serialized into any number of formats.
+
+    ``dataset`` is an optional ``FundingDataset`` covering the dates.
     """
     date_range = [start_date, end_date]
     source_list = FundingSource.objects.active()
+    if dataset is None:
+        dataset = FundingDataset([date_range])
 
     grad_student_list = GraduateStudent.objects.in_range(
         date_range, grad_date_adjustment=grad_date_adjustment
     )
-    dated_funding_list = (
-        Funding.objects.active().in_range(date_range).filter(source__active=True)
-    )
-    gs_funding_ids = dated_funding_list.values_list("graduate_student_id", flat=True)
+    gs_funding_ids = dataset.graduate_student_ids(date_range)
     grad_student_list |= (
         GraduateStudent.objects.active(status=None)
         .filter(pk__in=gs_funding_ids)
@@ -191,10 +348,163 @@ def make_funding_spreadsheet(start_date, end_date, format_, grad_date_adjustment
         ["MSc Students", grad_student_list.msc_filter(status=None)],
     ]
 
-    table = augmented_table(
-        date_range, student_groups, source_list, "Total", "Sub-total", "Student Total"
+    return augmented_table(
+        date_range,
+        student_groups,
+        source_list,
+        "Total",
+        "Sub-total",
+        "Student Total",
+        amounts=dataset.amounts(date_range),
     )
-    return sheetWriter(table, format_)
+
+
+#######################################################################
+
+
+def _render_spreadsheet(args):
+    """
+    Serialize a single table; this is the process pool worker, so it
+    must remain a module level function.
+    """
+    table, format_ = args
+    return format_, sheetWriter(table, format_)
+
+
+def _spreadsheet_workers(format_count, max_workers=None):
+    if max_workers is None:
+        max_workers = conf.get("spreadsheet_workers")
+    if max_workers is None:
+        max_workers = multiprocessing.cpu_count()
+    return min(max_workers, format_count)
+
+
+def spreadsheet_executor(format_count, max_workers=None):
+    """
+    A process pool for rendering ``format_count`` formats with
+    ``render_spreadsheets()``, or None when they should be rendered
+    in-process.  One pool can serve any number of tables (starting a pool
+    is expensive); the caller shuts it down.
+    ``max_workers`` defaults to the ``spreadsheet_workers`` setting.
+    """
+    max_workers = _spreadsheet_workers(format_count, max_workers)
+    if ProcessPoolExecutor is None or max_workers < 2:
+        return None
+    return ProcessPoolExecutor(max_workers=max_workers)
+
+
+def render_spreadsheets(table, formats, max_workers=None, executor=None):
+    """
+    Serialize ``table`` into each of the given ``formats``.
+    Returns an ordered dictionary of format: data stream.
+
+    The spreadsheet serializers are CPU bound, so when more than one
+    format is requested they are run in parallel in a process pool:
+    ``executor`` (see ``spreadsheet_executor()``), or else a pool for this
+    table alone.  ``max_workers`` defaults to the ``spreadsheet_workers``
+    setting.
+    """
+    formats = list(OrderedDict.fromkeys(formats))
+    jobs = [(table, format_) for format_ in formats]
+    with stage("serialize"):
+        if executor is not None:
+            return OrderedDict(executor.map(_render_spreadsheet, jobs))
+        max_workers = _spreadsheet_workers(len(formats), max_workers)
+        if ProcessPoolExecutor is None or max_workers < 2:
+            return OrderedDict(_render_spreadsheet(job) for job in jobs)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            return OrderedDict(executor.map(_render_spreadsheet, jobs))
+
+
+def make_bundle(streams, basename):
+    """
+    Given a dictionary of format: data stream, return the data stream
+    for a zip file containing ``basename.format`` for each format.
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as bundle:
+        for format_, stream in streams.items():
+            if not isinstance(stream, bytes):
+                stream = stream.encode("utf-8")
+            bundle.writestr("{}.{}".format(basename, format_), stream)
+    return buffer.getvalue()
+
+
+#######################################################################
+
+
+def make_funding_spreadsheet(
+    start_date, end_date, format_, grad_date_adjustment=60, dataset=None
+):
+    """
+    Given a start_date, end_date, and file format, return the data stream
+    for a spreadsheet.
+    """
+    table = funding_report_table(
+        start_date, end_date, grad_date_adjustment, dataset=dataset
+    )
+    with stage("serialize"):
+        return sheetWriter(table, format_)
+
+
+def make_funding_spreadsheets(
+    start_date, end_date, formats, grad_date_adjustment=60, dataset=None, max_workers=1,
+):
+    """
+    Given a start_date, end_date, and a list of file formats, return
+    an ordered dictionary of format: data stream.
+    The report table is only computed once.
+
+    The formats are rendered serially, in-process, by default: this is
+    what the admin funding report (and its multi-format bundle) does, as
+    a process pool would fork the web server's worker.  Pass
+    ``max_workers=None`` to use the ``spreadsheet_workers`` setting.
+    """
+    table = funding_report_table(
+        start_date, end_date, grad_date_adjustment, dataset=dataset
+    )
+    return render_spreadsheets(table, formats, max_workers=max_workers)
+
+
+def make_funding_bundle(
+    start_date,
+    end_date,
+    formats,
+    basename,
+    grad_date_adjustment=60,
+    dataset=None,
+    max_workers=1,
+):
+    """
+    Given a start_date, end_date, and a list of file formats, return the
+    data stream for a zip file containing the report in every format.
+    The formats are rendered serially unless ``max_workers`` is given
+    (see ``make_funding_spreadsheets()``).
+    """
+    streams = make_funding_spreadsheets(
+        start_date,
+        end_date,
+        formats,
+        grad_date_adjustment,
+        dataset=dataset,
+        max_workers=max_workers,
+    )
+    return make_bundle(streams, basename)
+
+
+#######################################################################
+
+
+def fiscal_year_range(year):
+    """
+    Return the [start_date, end_date] of the fiscal year which starts
+    in the given calendar year.
+    """
+    return [
+        datetime.date(year, FISCAL_YEAR_START_MONTH, 1),
+        datetime.date(year + 1, FISCAL_YEAR_START_MONTH, 1)
+        - datetime.timedelta(days=1),
+    ]
 
 
 #######################################################################
@@ -0,0 +1,200 @@
+"""
+Synthetic department data, for query budget tests and benchmarks.
+
+The data is reproducible: the same arguments (and seed) always produce
+the same department.  Repeated calls add to the existing data, so a test
+can measure at one size, grow the department, and measure again.
+"""
+from __future__ import print_function, unicode_literals
+
+import datetime
+import itertools
+import random
+from decimal import Decimal
+
+from django.template.defaultfilters import slugify
+from people.models import Person
+
+from .. import conf, funding_totals
+from ..choices import PROGRAM_CHOICES
+from ..models import (
+    Funding,
+    FundingSource,
+    GraduateStudent,
+    Milestone,
+    MilestoneType,
+)
+
+#######################################################################
+
+_counter = itertools.count()
+
+GIVEN_NAMES = ["Ada", "Bo", "Cy", "Di", "Ed", "Flo", "Gus", "Hal", "Ivy", "Jo"]
+FAMILY_NAMES = ["Adams", "Baker", "Chen", "Diaz", "Evans", "Fox", "Gray", "Hill"]
+MILESTONE_TYPES = ["Candidacy", "Proposal", "Committee meeting"]
+
+#######################################################################
+
+
+class SyntheticDepartment(object):
+    """
+    The records created by ``make_department()``.
+    """
+
+    def __init__(self, students, sources, advisors, funding_count, milestone_count):
+        self.students = students
+        self.sources = sources
+        self.advisors = advisors
+        self.funding_count = funding_count
+        self.milestone_count = milestone_count
+
+
+#######################################################################
+
+
+def make_person(cn, slug=None, **kwargs):
+    """
+    Create a single person record.
+    """
+    given_name, sn = cn.split(" ", 1)
+    return Person.objects.create(
+        cn=cn, given_name=given_name, sn=sn, slug=slug or slugify(cn), **kwargs
+    )
+
+
+def _make_people(names, prefix):
+    """
+    Bulk create people; returns them in the same order as ``names``.
+    """
+    people = []
+    for i, name in enumerate(names):
+        given_name, sn = name.split(" ", 1)
+        slug = "{}-{}".format(prefix, i)
+        people.append(Person(cn=name, given_name=given_name, sn=sn, slug=slug))
+    Person.objects.bulk_create(people)
+    # not every database returns primary keys from bulk_create:
+    by_slug = Person.objects.filter(slug__startswith=prefix + "-").in_bulk(
+        field_name="slug"
+    )
+    return [by_slug[p.slug] for p in people]
+
+
+#######################################################################
+
+
+def make_department(
+    students=10,
+    sources=4,
+    funding_per_student=3,
+    milestones_per_student=2,
+    advisors=3,
+    seed=0,
+    start_year=2010,
+    years=8,
+):
+    """
+    Create a synthetic department: ``students`` graduate students (a mix
+    of programs and statuses), ``funding_per_student`` funding records and
+    ``milestones_per_student`` milestones each, ``advisors`` advisors
+    (each student has one or two), and ``sources`` funding sources.
+    """
+    rng = random.Random(seed)
+    prefix = "synthetic-{}-{}".format(seed, next(_counter))
+    first_day = datetime.date(start_year, 1, 1)
+    span_days = 365 * years
+
+    source_list = []
+    for i in range(sources):
+        source_list.append(
+            FundingSource.objects.create(
+                name="{} source {}".format(prefix, i), ordering=i
+            )
+        )
+    milestone_types = [
+        MilestoneType.objects.get_or_create(
+            slug=slugify(name), defaults={"name": name}
+        )[0]
+        for name in MILESTONE_TYPES
+    ]
+
+    advisor_list = []
+    for i in range(advisors):
+        name = "{} {}{}".format(rng.choice(GIVEN_NAMES), rng.choice(FAMILY_NAMES), i)
+        advisor = make_person(name, slug="{}-advisor-{}".format(prefix, i))
+        for flag in conf.get("advisor_flags"):
+            advisor.add_flag_by_name(flag)
+        advisor_list.append(advisor)
+
+    names = [
+        "{} {}".format(rng.choice(GIVEN_NAMES), rng.choice(FAMILY_NAMES))
+        for i in range(students)
+    ]
+    people = _make_people(names, prefix)
+    student_list = []
+    for person in people:
+        start_date = first_day + datetime.timedelta(days=rng.randrange(span_days))
+        status = rng.choice(["S", "S", "S", "G", "G", "P"])
+        graduation_date = None
+        if status == "G":
+            graduation_date = start_date + datetime.timedelta(
+                days=rng.randrange(700, 1800)
+            )
+        student_list.append(
+            GraduateStudent(
+                person=person,
+                program=rng.choice(PROGRAM_CHOICES)[0],
+                status=status,
+                start_date=start_date,
+                graduation_date=graduation_date,
+                graduation_date_confirmed=graduation_date is not None,
+            )
+        )
+    GraduateStudent.objects.bulk_create(student_list)
+    student_list = list(
+        GraduateStudent.objects.filter(person__in=people).order_by("person__slug")
+    )
+
+    through = GraduateStudent.advisor.through
+    links = []
+    funding_list = []
+    milestone_list = []
+    for student in student_list:
+        if advisor_list:
+            for advisor in rng.sample(
+                advisor_list, min(len(advisor_list), rng.randint(1, 2))
+            ):
+                links.append(through(graduatestudent=student, person=advisor))
+        for i in range(funding_per_student):
+            start_date = student.start_date + datetime.timedelta(
+                days=rng.randrange(0, 1000)
+            )
+            end_date = None
+            if rng.random() > 0.1:
+                end_date = start_date + datetime.timedelta(days=rng.randrange(30, 365))
+            funding_list.append(
+                Funding(
+                    graduate_student=student,
+                    source=rng.choice(source_list),
+                    amount=Decimal(rng.randrange(10000, 2000000)) / 100,
+                    start_date=start_date,
+                    end_date=end_date,
+                )
+            )
+        for i in range(milestones_per_student):
+            milestone_list.append(
+                Milestone(
+                    graduate_student=student,
+                    type=rng.choice(milestone_types),
+                    date=student.start_date + datetime.timedelta(days=180 * (i + 1)),
+                )
+            )
+    through.objects.bulk_create(links)
+    Funding.objects.bulk_create(funding_list)
+    funding_totals.rebuild(GraduateStudent.objects.filter(person__in=people))
+    Milestone.objects.bulk_create(milestone_list)
+    return SyntheticDepartment(
+        student_list, source_list, advisor_list, len(funding_list), len(milestone_list)
+    )
+
+
+#######################################################################
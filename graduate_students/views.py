@@ -5,17 +5,31 @@ import mimetypes
 import os
 
 from django.conf import settings
+from django.contrib import messages
 from django.contrib.auth.decorators import permission_required
-from django.http import Http404, HttpResponse
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Prefetch, Q
+from django.http import Http404, HttpResponse, HttpResponseRedirect
 from django.shortcuts import render
 from django.urls import reverse_lazy
+from django.views.generic.detail import DetailView
 from django.views.generic.edit import CreateView, DeleteView, FormView, UpdateView
 from django.views.generic.list import ListView
+from people.models import Person
 from spreadsheet import sheetWriter
 
-from . import conf
-from .forms import FundingReportForm, GraduateStudentForm
-from .models import Funding, GraduateStudent, Paperwork
+from . import conf, instrumentation
+from .caching import versioned_page
+from .forms import (
+    CohortImportForm,
+    FundingChecksForm,
+    FundingImportForm,
+    FundingReportForm,
+    FundingTimeSeriesForm,
+    GraduateStudentForm,
+)
+from .models import Funding, GraduateStudent, Milestone, Paperwork
+from .utils import FISCAL_YEAR_START_MONTH, fiscal_year_range
 
 """
 Views for Graduate Students app.
@@ -51,13 +65,12 @@ class FundingReportAdminView(FormView):
         Returns initial data for the form (a dictionary).
         """
         today = datetime.date.today()
-        if today.month <= 8:
+        if today.month < FISCAL_YEAR_START_MONTH:
             start_year = today.year - 1
         else:
             start_year = today.year
 
-        start_date = datetime.date(start_year, 9, 1)
-        end_date = datetime.date(start_year + 1, 8, 31)
+        start_date, end_date = fiscal_year_range(start_year)
         return dict(start_date=start_date, end_date=end_date)
 
     def form_valid(self, form):
@@ -65,7 +78,89 @@ class FundingReportAdminView(FormView):
         Define form valid, rather than a success url, because a valid
         form returns the spreadsheet.
         """
-        return form.on_success()
+        with instrumentation.record("funding-report") as recorder:
+            response = form.on_success()
+        return recorder.add_header(response)
+
+
+#######################################################################
+
+
+class FundingTimeSeriesAdminView(FundingReportAdminView):
+    """
+    For viewing (or downloading as CSV) the funding over time, e.g., for
+    budget forecasting.  Like the funding report, this is an admin view.
+    """
+
+    form_class = FundingTimeSeriesForm
+    template_name = "admin/graduate_students/funding/timeseries.html"
+
+    def form_valid(self, form):
+        """
+        Show the time series, or download it.
+        """
+        if "_export" in self.request.POST:
+            return form.on_success()
+        context = self.get_context_data(form=form, table=form.get_table())
+        return self.render_to_response(context)
+
+
+#######################################################################
+
+
+class FundingChecksAdminView(FundingTimeSeriesAdminView):
+    """
+    For finding problems with the funding of the whole department: gaps,
+    overlapping funding from the same source, and one-time payments
+    outside of a student's program.
+    """
+
+    form_class = FundingChecksForm
+    template_name = "admin/graduate_students/funding/checks.html"
+
+    def get_initial(self):
+        return dict(status="S", gap_days=conf.get("funding:gap_days"))
+
+
+#######################################################################
+
+
+class ImportAdminView(FormView):
+    """
+    For importing records from a spreadsheet.
+    Like the funding report, this is an admin view.
+    """
+
+    template_name = "admin/graduate_students/import.html"
+    verbose_name_plural = "records"
+
+    def form_valid(self, form):
+        """
+        Import the records; or show the row errors (or dry run results).
+        """
+        object_list, errors = form.run()
+        if errors or form.cleaned_data["dry_run"]:
+            context = self.get_context_data(
+                form=form, row_errors=errors, row_count=len(object_list)
+            )
+            return self.render_to_response(context)
+        messages.success(
+            self.request,
+            "Imported {} {}.".format(len(object_list), self.verbose_name_plural),
+        )
+        return HttpResponseRedirect(self.get_success_url())
+
+
+class FundingImportAdminView(ImportAdminView):
+    form_class = FundingImportForm
+    success_url = reverse_lazy("admin:graduate_students_funding_changelist")
+    verbose_name_plural = "funding records"
+
+
+class CohortImportAdminView(ImportAdminView):
+    form_class = CohortImportForm
+    success_url = reverse_lazy("admin:graduate_students_graduatestudent_changelist")
+    verbose_name_plural = "graduate students"
 
 
 #######################################################################
@@ -93,23 +188,20 @@ class CurrentTotalFundingReport(ListView):
         grad_student_list = self.get_queryset().in_range(
             date_range, grad_date_adjustment=self.grad_date_adjustment
         )
+        # all of the funding totals, in one query:
+        with instrumentation.stage("funding_summaries"):
+            summaries = (
+                Funding.objects.active()
+                .filter(graduate_student__in=grad_student_list)
+                .summaries(as_of=today)
+            )
         for gs in grad_student_list:
-            try:
-                total = gs.total_funding()
-            except Funding.DoesNotExist:
-                total = 0
-            try:
-                current = gs.current_funding()
-            except Funding.DoesNotExist:
-                current = 0
-            try:
-                earliest = gs.earliest_funding()
-            except Funding.DoesNotExist:
-                earliest = ""
-            try:
-                most_recent = gs.most_recent_funding()
-            except Funding.DoesNotExist:
-                most_recent = ""
+            summary = summaries.get(gs.pk)
+            if summary is None:
+                total, current, earliest, most_recent = 0, 0, "", ""
+            else:
+                total, current = summary.total, summary.current
+                earliest, most_recent = summary.earliest, summary.most_recent
             data.append(
                 [
                     gs.person,
@@ -120,17 +212,297 @@ class CurrentTotalFundingReport(ListView):
                     most_recent,
                 ]
             )
-        return sheetWriter(data, format)
+        with instrumentation.stage("serialize"):
+            return sheetWriter(data, format)
 
     def render_to_response(self, context, **response_kwargs):
         filename = "funding-current-total_%s" % datetime.date.today()
         filename += "." + self.format
         content_type, encoding = mimetypes.guess_type(filename)
-        stream = self.get_result_data(format=self.format)
+        with instrumentation.record("current-total-funding-report") as recorder:
+            stream = self.get_result_data(format=self.format)
         response = HttpResponse(content_type=content_type)
         response["Content-Disposition"] = "attachment; filename=" + filename
         response.write(stream)
-        return response
+        return recorder.add_header(response)
+
+
+#######################################################################
+
+
+def personpage_queryset():
+    """
+    The active person pages, or None when there are no person pages
+    (i.e., ``Person`` has no ``personpage_set``).
+    """
+    try:
+        related = Person._meta.get_field("personpage")
+    except FieldDoesNotExist:
+        return None
+    queryset = related.related_model._default_manager.all()
+    if hasattr(queryset, "active"):
+        return queryset.active()
+    return queryset.filter(active=True)
+
+
+def personpage_url(person):
+    """
+    The url of the person's page, when they have exactly one active page.
+    Requires the ``active_personpages`` prefetch.
+    """
+    page_list = getattr(person, "active_personpages", [])
+    if len(page_list) == 1:
+        return page_list[0].get_absolute_url()
+    return None
+
+
+#######################################################################
+
+
+def _person_modified(prefix=""):
+    """
+    The Person modification time field, if Person has one.
+    """
+    try:
+        Person._meta.get_field("modified")
+    except FieldDoesNotExist:
+        return []
+    return [prefix + "modified"]
+
+
+def _personpage_dependencies(graduate_students):
+    """
+    The person pages of the students and of their advisors, which the
+    pages link to.
+    """
+    page_queryset = personpage_queryset()
+    if page_queryset is None:
+        return []
+    person_field = Person._meta.get_field("personpage").field.name
+    people = Person.objects.filter(
+        Q(graduatestudent__in=graduate_students) | Q(supervisor__in=graduate_students)
+    )
+    page_queryset = page_queryset.filter(**{person_field + "__in": people.values("pk")})
+    try:
+        page_queryset.model._meta.get_field("modified")
+    except FieldDoesNotExist:
+        return [(page_queryset, [])]
+    return [(page_queryset, ["modified"])]
+
+
+def graduate_student_list_dependencies(request):
+    return [
+        (
+            GraduateStudent.objects.active(),
+            ["modified"] + _person_modified("person__") + _person_modified("advisor__"),
+        )
+    ]
+
+
+graduate_student_list = versioned_page(
+    graduate_student_list_dependencies, cache_name="gradstudent-list"
+)(
+    ListView.as_view(
+        queryset=GraduateStudent.objects.active().prefetch_related("advisor")
+    )
+)
+
+
+def graduate_student_advisor_list_dependencies(request):
+    return [
+        (Person.objects.active().filter(flags__slug="advisor"), _person_modified()),
+        (GraduateStudent.objects.active(), ["modified"] + _person_modified("person__")),
+    ]
+
+
+graduate_student_advisor_list = versioned_page(
+    graduate_student_advisor_list_dependencies, cache_name="gradstudent-advisor-list"
+)(
+    ListView.as_view(
+        queryset=Person.objects.active()
+        .filter(flags__slug="advisor")
+        .prefetch_related(
+            Prefetch(
+                "supervisor",
+                queryset=GraduateStudent.objects.active(),
+                to_attr="active_graduatestudents",
+            )
+        ),
+        template_name="graduate_students/advisor_list.html",
+    )
+)
+
+
+def graduate_student_alumni_list_dependencies(request):
+    return [
+        (
+            GraduateStudent.objects.alumni_filter().active(status=None),
+            ["modified"] + _person_modified("person__"),
+        )
+    ]
+
+
+class GraduateStudentAlumniListView(ListView):
+    """
+    The alumni, most recent graduates first.
+
+    The list only grows, so it is keyset (seek) paginated on
+    (-graduation_date, pk): each page starts *after* the last alumnus on
+    the previous page, which is an index range scan no matter how deep the
+    page is (unlike OFFSET pagination).
+    Alumni without a graduation date are listed last, by pk.
+    """
+
+    template_name = "graduate_students/alumni_list.html"
+    cursor_param = "after"
+
+    def get_page_size(self):
+        return conf.get("alumni:paginate_by")
+
+    # the cursor's date for alumni without a graduation date
+    undated = "none"
+
+    def get_cursor(self):
+        """
+        Returns None (for the first page), or (graduation_date, pk);
+        graduation_date is None after an alumnus without one.
+        """
+        cursor = self.request.GET.get(self.cursor_param)
+        if not cursor:
+            return None
+        try:
+            date_string, pk = cursor.split("_")
+            if date_string == self.undated:
+                return None, int(pk)
+            graduation_date = datetime.datetime.strptime(date_string, "%Y-%m-%d")
+            return graduation_date.date(), int(pk)
+        except ValueError:
+            raise Http404("Invalid page")
+
+    def get_queryset(self):
+        queryset = (
+            GraduateStudent.objects.alumni_filter()
+            .active(status=None)
+            .select_related("person")
+            .prefetch_related("advisor")
+            .order_by(F("graduation_date").desc(nulls_last=True), "pk")
+        )
+        cursor = self.get_cursor()
+        if cursor is not None:
+            graduation_date, pk = cursor
+            if graduation_date is None:
+                queryset = queryset.filter(graduation_date__isnull=True, pk__gt=pk)
+            else:
+                queryset = queryset.filter(
+                    Q(graduation_date__lt=graduation_date)
+                    | Q(graduation_date=graduation_date, pk__gt=pk)
+                    | Q(graduation_date__isnull=True)
+                )
+        page_size = self.get_page_size()
+        if not page_size:
+            self.has_next = False
+            return queryset
+        object_list = list(queryset[: page_size + 1])
+        self.has_next = len(object_list) > page_size
+        return object_list[:page_size]
+
+    def get_context_data(self, **kwargs):
+        context = super(GraduateStudentAlumniListView, self).get_context_data(**kwargs)
+        object_list = context["object_list"]
+        if self.has_next:
+            last = object_list[-1]
+            if last.graduation_date is None:
+                date_string = self.undated
+            else:
+                date_string = last.graduation_date.isoformat()
+            context["next_cursor"] = "{}_{}".format(date_string, last.pk)
+        context["cursor_param"] = self.cursor_param
+        context["is_first_page"] = self.get_cursor() is None
+        context["group_by_year"] = (
+            self.request.GET.get("group", conf.get("alumni:group_by")) == "year"
+        )
+        return context
+
+
+graduate_student_alumni_list = versioned_page(
+    graduate_student_alumni_list_dependencies, cache_name="gradstudent-alumni-list"
+)(GraduateStudentAlumniListView.as_view())
+
+
+#######################################################################
+
+
+class GraduateStudentDetailView(DetailView):
+    """
+    The public graduate student page.
+
+    This is linked from every faculty profile, so the student, their
+    person record, advisors, person pages and milestones are all loaded
+    in a fixed number of queries, and the person page urls are resolved
+    for the template.
+    """
+
+    model = GraduateStudent
+
+    def get_queryset(self):
+        queryset = super(GraduateStudentDetailView, self).get_queryset()
+        try:
+            email_is_relation = Person._meta.get_field("email").is_relation
+        except FieldDoesNotExist:
+            email_is_relation = False
+        if email_is_relation:
+            queryset = queryset.select_related("person__email")
+        advisor_queryset = Person.objects.all()
+        page_queryset = personpage_queryset()
+        if page_queryset is not None:
+            page_prefetch = Prefetch(
+                "personpage_set", queryset=page_queryset, to_attr="active_personpages"
+            )
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    "person__personpage_set",
+                    queryset=page_queryset,
+                    to_attr="active_personpages",
+                )
+            )
+            advisor_queryset = advisor_queryset.prefetch_related(page_prefetch)
+        return queryset.prefetch_related(
+            Prefetch("advisor", queryset=advisor_queryset, to_attr="advisor_list"),
+            Prefetch(
+                "milestone_set",
+                queryset=Milestone.objects.active().select_related("type"),
+                to_attr="milestone_list",
+            ),
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super(GraduateStudentDetailView, self).get_context_data(**kwargs)
+        graduatestudent = self.object
+        context["person_url"] = personpage_url(graduatestudent.person)
+        context["advisor_list"] = [
+            (advisor, personpage_url(advisor))
+            for advisor in graduatestudent.advisor_list
+        ]
+        context["milestone_list"] = graduatestudent.milestone_list
+        return context
+
+
+def graduate_student_detail_dependencies(request, pk):
+    students = GraduateStudent.objects.filter(pk=pk)
+    return [
+        (
+            students,
+            ["modified", "milestone__modified"]
+            + _person_modified("person__")
+            + _person_modified("advisor__"),
+            ["milestone", "advisor"],
+        )
+    ] + _personpage_dependencies(students)
+
+
+graduate_student_detail = versioned_page(
+    graduate_student_detail_dependencies, cache_name="gradstudent-detail"
+)(GraduateStudentDetailView.as_view())
 
 
 #######################################################################
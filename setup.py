@@ -32,6 +32,7 @@ setup(
     license="GNU Lesser General Public License (LGPL) 3.0",
     packages=find_packages(),
     install_requires=read_requirements(),
+    extras_require={"numpy": ["numpy"], "xlsx": ["openpyxl"]},
     zip_safe=False,
     include_package_data=True,
 )